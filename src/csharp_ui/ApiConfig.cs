@@ -1,4 +1,7 @@
+using System;
 using System.Configuration;
+using System.Net.Http;
+using System.Net.Http.Headers;
 
 namespace TradeSensei.UI
 {
@@ -22,9 +25,20 @@ namespace TradeSensei.UI
             return _baseUrl;
         }
 
+        // Carries the signed-in user's access token: the server takes the tier (and rate limits) from it
         public static string GetWebSocketUrl()
         {
-            return _baseUrl.Replace("http://", "ws://").Replace("https://", "wss://") + "/ws";
+            var url = _baseUrl.Replace("http://", "ws://").Replace("https://", "wss://") + "/ws";
+            var token = Auth.AuthState.AccessToken;
+            return string.IsNullOrEmpty(token) ? url : url + "?access_token=" + Uri.EscapeDataString(token);
+        }
+
+        // Sends the signed-in user's access token with every request of `client`
+        public static HttpClient Authorize(HttpClient client)
+        {
+            var token = Auth.AuthState.AccessToken;
+            client.DefaultRequestHeaders.Authorization = string.IsNullOrEmpty(token) ? null : new AuthenticationHeaderValue("Bearer", token);
+            return client;
         }
     }
 }
\ No newline at end of file
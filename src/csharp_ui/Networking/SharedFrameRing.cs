@@ -0,0 +1,116 @@
+using System;
+using System.Drawing;
+using System.Drawing.Imaging;
+using System.IO.MemoryMappedFiles;
+using System.Runtime.InteropServices;
+using System.Text.Json;
+using System.Threading;
+
+namespace TradeSensei.UI.Networking
+{
+    // Client side of the backend's shared-memory frame ring (backend/frame_ring.py).
+    // Raw BGR pixels are written into a slot and only {"type":"shm_frame","slot","seq"}
+    // goes over the WebSocket. The backend releases slots cumulatively with
+    // {"type":"shm_release","seq":n}; a slot is only reused once its frame is released.
+    public sealed class SharedFrameRing : IDisposable
+    {
+        private readonly MemoryMappedFile mmf;
+        private readonly MemoryMappedViewAccessor view;
+        private readonly int slots;
+        private readonly long slotBytes;
+        private readonly long ringHeaderBytes;
+        private readonly long slotHeaderBytes;
+        private readonly long[] slotSeq;
+        private long nextSeq = 0;
+        private long releasedSeq = 0;
+        private byte[] rowBuffer = Array.Empty<byte>();
+
+        private SharedFrameRing(string name, int slots, long slotBytes, long ringHeaderBytes, long slotHeaderBytes)
+        {
+            mmf = MemoryMappedFile.OpenExisting(name);
+            view = mmf.CreateViewAccessor();
+            this.slots = slots;
+            this.slotBytes = slotBytes;
+            this.ringHeaderBytes = ringHeaderBytes;
+            this.slotHeaderBytes = slotHeaderBytes;
+            slotSeq = new long[slots];
+        }
+
+        // Opens the ring described by the backend's "shm_attached" message
+        public static SharedFrameRing Open(JsonElement attached)
+        {
+            return new SharedFrameRing(
+                attached.GetProperty("name").GetString() ?? "",
+                attached.GetProperty("slots").GetInt32(),
+                attached.GetProperty("slot_bytes").GetInt64(),
+                attached.GetProperty("ring_header_bytes").GetInt64(),
+                attached.GetProperty("slot_header_bytes").GetInt64());
+        }
+
+        public void Release(long seq)
+        {
+            long current;
+            do
+            {
+                current = Interlocked.Read(ref releasedSeq);
+                if (seq <= current) return;
+            } while (Interlocked.CompareExchange(ref releasedSeq, seq, current) != current);
+        }
+
+        // Whether a frame of this size fits in a slot; larger frames must go over the socket
+        public bool Fits(int width, int height)
+        {
+            return slotHeaderBytes + (long)width * 3 * height <= slotBytes;
+        }
+
+        // Copies the bitmap into a free slot. Returns false when every slot is still in
+        // use by the backend or the frame does not fit.
+        public bool TryWrite(Bitmap bmp, out int slot, out long seq)
+        {
+            slot = -1;
+            seq = 0;
+            int width = bmp.Width, height = bmp.Height, rowBytes = width * 3;
+            if (!Fits(width, height)) return false;
+
+            long released = Interlocked.Read(ref releasedSeq);
+            for (int i = 0; i < slots; i++)
+            {
+                if (slotSeq[i] <= released) { slot = i; break; }
+            }
+            if (slot < 0) return false;
+
+            seq = ++nextSeq;
+            long offset = ringHeaderBytes + slot * slotBytes;
+            // Invalidate the slot, copy the pixels, then publish the new seq
+            view.Write(offset, 0UL);
+            var data = bmp.LockBits(new Rectangle(0, 0, width, height), ImageLockMode.ReadOnly, PixelFormat.Format24bppRgb);
+            try
+            {
+                if (rowBuffer.Length != rowBytes) rowBuffer = new byte[rowBytes];
+                long pixels = offset + slotHeaderBytes;
+                for (int y = 0; y < height; y++)
+                {
+                    Marshal.Copy(data.Scan0 + y * data.Stride, rowBuffer, 0, rowBytes);
+                    view.WriteArray(pixels + (long)y * rowBytes, rowBuffer, 0, rowBytes);
+                }
+            }
+            finally
+            {
+                bmp.UnlockBits(data);
+            }
+            view.Write(offset + 8, (uint)height);
+            view.Write(offset + 12, (uint)width);
+            view.Write(offset + 16, 3u);
+            Thread.MemoryBarrier();
+            view.Write(offset, (ulong)seq);
+            slotSeq[slot] = seq;
+            return true;
+        }
+
+        public void Dispose()
+        {
+            view.Dispose();
+            mmf.Dispose();
+        }
+    }
+}
@@ -7,6 +7,7 @@ using System.Threading.Tasks;
 using System.Text;
 using System.IO;
 using System.Collections.Generic;
+using System.Linq;
 using System.Threading;
 using System.Text.Json;
 using System.Drawing.Imaging;
@@ -50,64 +51,143 @@ namespace TradeSensei.UI
         private WebSocketClient? wsClient;
         private bool capturing = false;
         private int captureFps = 2;
+        private int encodeQuality = 0;
         private TradeSensei.UI.Capture.DesktopDuplicationCapture? duplicator = null;
         private List<(UIElement element, DateTime expiry)> overlayElements = new List<(UIElement, DateTime)>();
+        private Dictionary<string, UIElement> namedElements = new Dictionary<string, UIElement>();
         private Timer? cleanupTimer;
         private ObsStreamingService? obsStreaming;
+        private SharedFrameRing? frameRing;
+        private string? resumeToken;
 
         private void WsClient_OnJsonMessage(JsonElement obj)
         {
-            // Only process overlay commands
-            if (obj.TryGetProperty("type", out var t) && t.GetString() == "overlay")
+            if (!obj.TryGetProperty("type", out var t)) return;
+            var type = t.GetString();
+            if (type == "overlay")
             {
-                if (obj.TryGetProperty("action", out var action))
+                Dispatcher.Invoke(() => ApplyOverlayMessage(obj));
+            }
+            else if (type == "session")
+            {
+                // Reconnecting with this token reattaches the server-side session state
+                if (obj.TryGetProperty("resume_token", out var token)) resumeToken = token.GetString();
+            }
+            else if (type == "shm_attached")
+            {
+                try
                 {
-                    var act = action.GetString();
-                    if (act == "draw_text")
-                    {
-                        int x = obj.GetProperty("x").GetInt32();
-                        int y = obj.GetProperty("y").GetInt32();
-                        string text = obj.GetProperty("text").GetString() ?? "";
-                        int ttl = obj.TryGetProperty("ttl", out var tv) ? tv.GetInt32() : 5;
-                        Dispatcher.Invoke(() => DrawText(x, y, text, ttl));
-                    }
-                    else if (act == "draw_rect")
-                    {
-                        int x = obj.GetProperty("x").GetInt32();
-                        int y = obj.GetProperty("y").GetInt32();
-                        int w = obj.GetProperty("w").GetInt32();
-                        int h = obj.GetProperty("h").GetInt32();
-                        int ttl = obj.TryGetProperty("ttl", out var tv2) ? tv2.GetInt32() : 5;
-                        Dispatcher.Invoke(() => DrawRect(x, y, w, h, ttl));
-                    }
-                    else if (act == "draw_line")
-                    {
-                        int x1 = obj.GetProperty("x1").GetInt32();
-                        int y1 = obj.GetProperty("y1").GetInt32();
-                        int x2 = obj.GetProperty("x2").GetInt32();
-                        int y2 = obj.GetProperty("y2").GetInt32();
-                        int ttl = obj.TryGetProperty("ttl", out var tv3) ? tv3.GetInt32() : 5;
-                        Dispatcher.Invoke(() => DrawLine(x1, y1, x2, y2, ttl));
-                    }
-                    else if (act == "draw_arrow")
-                    {
-                        int x1 = obj.GetProperty("x1").GetInt32();
-                        int y1 = obj.GetProperty("y1").GetInt32();
-                        int x2 = obj.GetProperty("x2").GetInt32();
-                        int y2 = obj.GetProperty("y2").GetInt32();
-                        int ttl = obj.TryGetProperty("ttl", out var tv4) ? tv4.GetInt32() : 5;
-                        Dispatcher.Invoke(() => DrawArrow(x1, y1, x2, y2, ttl));
-                    }
-                    else if (act == "clear")
-                    {
-                        Dispatcher.Invoke(ClearAllOverlay);
-                    }
+                    frameRing = SharedFrameRing.Open(obj);
+                }
+                catch (Exception ex)
+                {
+                    // Keep sending PNG frames over the socket
+                    System.Diagnostics.Debug.WriteLine("Shared frame ring unavailable: " + ex.Message);
+                }
+            }
+            else if (type == "flow_control")
+            {
+                // The backend paces capture and encoding to what it can currently analyse
+                if (obj.TryGetProperty("target_fps", out var fps)) captureFps = Math.Max(1, fps.GetInt32());
+                if (obj.TryGetProperty("quality", out var quality)) encodeQuality = quality.GetInt32();
+            }
+            else if (type == "shm_release")
+            {
+                frameRing?.Release(obj.GetProperty("seq").GetInt64());
+            }
+        }
+
+        private void ApplyOverlayMessage(JsonElement obj)
+        {
+            if (!obj.TryGetProperty("action", out var action)) return;
+            var act = action.GetString();
+            if (act == "snapshot")
+            {
+                // Full overlay state (new connection or resync)
+                ClearAllOverlay();
+                foreach (var item in obj.GetProperty("items").EnumerateArray()) DrawCommand(item);
+            }
+            else if (act == "delta")
+            {
+                // Only what changed since the last message; elements are keyed by id
+                if (obj.TryGetProperty("remove", out var remove))
+                {
+                    foreach (var id in remove.EnumerateArray()) RemoveNamed(id.GetString());
+                }
+                if (obj.TryGetProperty("add", out var add))
+                {
+                    foreach (var item in add.EnumerateArray()) DrawCommand(item);
+                }
+                if (obj.TryGetProperty("update", out var update))
+                {
+                    foreach (var item in update.EnumerateArray()) DrawCommand(item);
+                }
+                if (obj.TryGetProperty("refresh", out var refresh))
+                {
+                    foreach (var entry in refresh.EnumerateObject()) RefreshNamed(entry.Name, entry.Value.GetInt32());
+                }
+            }
+            else
+            {
+                DrawCommand(obj);
+            }
+        }
+
+        private void DrawCommand(JsonElement obj)
+        {
+            var act = obj.GetProperty("action").GetString();
+            string? id = obj.TryGetProperty("id", out var idv) ? idv.GetString() : null;
+            int ttl = obj.TryGetProperty("ttl", out var tv) ? tv.GetInt32() : 5;
+            if (act == "draw_text")
+            {
+                int x = obj.GetProperty("x").GetInt32();
+                int y = obj.GetProperty("y").GetInt32();
+                string text = obj.GetProperty("text").GetString() ?? "";
+                DrawText(x, y, text, ttl, id);
+            }
+            else if (act == "draw_rect")
+            {
+                int x = obj.GetProperty("x").GetInt32();
+                int y = obj.GetProperty("y").GetInt32();
+                int w = obj.GetProperty("w").GetInt32();
+                int h = obj.GetProperty("h").GetInt32();
+                DrawRect(x, y, w, h, ttl, id);
+            }
+            else if (act == "draw_line")
+            {
+                int x1 = obj.GetProperty("x1").GetInt32();
+                int y1 = obj.GetProperty("y1").GetInt32();
+                int x2 = obj.GetProperty("x2").GetInt32();
+                int y2 = obj.GetProperty("y2").GetInt32();
+                DrawLine(x1, y1, x2, y2, ttl, 2, id);
+            }
+            else if (act == "draw_arrow")
+            {
+                int x1 = obj.GetProperty("x1").GetInt32();
+                int y1 = obj.GetProperty("y1").GetInt32();
+                int x2 = obj.GetProperty("x2").GetInt32();
+                int y2 = obj.GetProperty("y2").GetInt32();
+                DrawArrow(x1, y1, x2, y2, ttl);
+            }
+            else if (act == "draw_polyline")
+            {
+                string color = obj.TryGetProperty("color", out var cv) ? cv.GetString() ?? "#00FFFF" : "#00FFFF";
+                var coords = new List<(double x, double y)>();
+                foreach (var p in obj.GetProperty("points").EnumerateArray())
+                {
+                    coords.Add((p[0].GetDouble(), p[1].GetDouble()));
                 }
+                DrawPolyline(id, coords, color, ttl);
+            }
+            else if (act == "clear")
+            {
+                ClearAllOverlay();
             }
         }
 
-        private void DrawText(int x, int y, string text, int ttlSeconds = 5)
+        private void DrawText(int x, int y, string text, int ttlSeconds = 5, string? id = null)
         {
+            RemoveNamed(id);
             var tb = new System.Windows.Controls.TextBlock()
             {
                 Text = text,
@@ -119,10 +199,12 @@ namespace TradeSensei.UI
             Canvas.SetTop(tb, y);
             OverlayCanvas.Children.Add(tb);
             overlayElements.Add((tb, DateTime.UtcNow.AddSeconds(ttlSeconds)));
+            if (!string.IsNullOrEmpty(id)) namedElements[id] = tb;
         }
 
-        private void DrawRect(int x, int y, int w, int h, int ttlSeconds = 5)
+        private void DrawRect(int x, int y, int w, int h, int ttlSeconds = 5, string? id = null)
         {
+            RemoveNamed(id);
             var r = new Rectangle()
             {
                 Width = w,
@@ -135,10 +217,12 @@ namespace TradeSensei.UI
             Canvas.SetTop(r, y);
             OverlayCanvas.Children.Add(r);
             overlayElements.Add((r, DateTime.UtcNow.AddSeconds(ttlSeconds)));
+            if (!string.IsNullOrEmpty(id)) namedElements[id] = r;
         }
 
-        private void DrawLine(int x1, int y1, int x2, int y2, int ttlSeconds = 5, int thickness = 2)
+        private void DrawLine(int x1, int y1, int x2, int y2, int ttlSeconds = 5, int thickness = 2, string? id = null)
         {
+            RemoveNamed(id);
             var line = new System.Windows.Shapes.Line()
             {
                 X1 = x1,
@@ -150,6 +234,7 @@ namespace TradeSensei.UI
             };
             OverlayCanvas.Children.Add(line);
             overlayElements.Add((line, DateTime.UtcNow.AddSeconds(ttlSeconds)));
+            if (!string.IsNullOrEmpty(id)) namedElements[id] = line;
         }
 
         private void DrawArrow(int x1, int y1, int x2, int y2, int ttlSeconds = 5)
@@ -166,6 +251,54 @@ namespace TradeSensei.UI
             DrawLine(x2, y2, bx, by, ttlSeconds, 3);
         }
 
+        private void DrawPolyline(string? id, List<(double x, double y)> coords, string color, int ttlSeconds = 5)
+        {
+            RemoveNamed(id);
+
+            var points = new PointCollection();
+            foreach (var (x, y) in coords)
+            {
+                points.Add(new Point(x, y));
+            }
+
+            Brush stroke = Brushes.Cyan;
+            try
+            {
+                stroke = new SolidColorBrush((Color)ColorConverter.ConvertFromString(color));
+            }
+            catch { }
+
+            var polyline = new Polyline()
+            {
+                Points = points,
+                Stroke = stroke,
+                StrokeThickness = 2
+            };
+            OverlayCanvas.Children.Add(polyline);
+            overlayElements.Add((polyline, DateTime.UtcNow.AddSeconds(ttlSeconds)));
+            if (!string.IsNullOrEmpty(id)) namedElements[id] = polyline;
+        }
+
+        // An element drawn with an id replaces the previous one with that id instead of stacking
+        private void RemoveNamed(string? id)
+        {
+            if (string.IsNullOrEmpty(id) || !namedElements.TryGetValue(id, out var previous)) return;
+            OverlayCanvas.Children.Remove(previous);
+            overlayElements.RemoveAll(e => e.element == previous);
+            namedElements.Remove(id);
+        }
+
+        // Extends the expiry of an element the server says is still valid
+        private void RefreshNamed(string id, int ttlSeconds)
+        {
+            if (!namedElements.TryGetValue(id, out var element)) return;
+            var expiry = DateTime.UtcNow.AddSeconds(ttlSeconds);
+            for (int i = 0; i < overlayElements.Count; i++)
+            {
+                if (overlayElements[i].element == element) overlayElements[i] = (element, expiry);
+            }
+        }
+
         private void CleanupOverlay()
         {
             var now = DateTime.UtcNow;
@@ -182,12 +315,17 @@ namespace TradeSensei.UI
             {
                 if (OverlayCanvas.Children.Contains(el)) OverlayCanvas.Children.Remove(el);
             }
+            foreach (var key in namedElements.Where(kv => toRemove.Contains(kv.Value)).Select(kv => kv.Key).ToList())
+            {
+                namedElements.Remove(key);
+            }
         }
 
         private void ClearAllOverlay()
         {
             OverlayCanvas.Children.Clear();
             overlayElements.Clear();
+            namedElements.Clear();
         }
 
         private void StartCaptureLoop()
@@ -201,14 +339,28 @@ namespace TradeSensei.UI
                     try
                     {
                         using var bmp = CaptureScreenRegion();
-                        using var ms = new MemoryStream();
-                        bmp.Save(ms, ImageFormat.Png);
-                        var bytes = ms.ToArray();
-                        var b64 = Convert.ToBase64String(bytes);
-                        var payload = JsonSerializer.Serialize(new { type = "frame", data = b64, user_id = Auth.AuthState.UserId });
-                        if (wsClient != null)
+                        var ring = frameRing;
+                        if (ring != null && wsClient != null && ring.Fits(bmp.Width, bmp.Height))
                         {
-                            await wsClient.SendStringAsync(payload);
+                            // Same host: raw pixels go through shared memory, only the slot index is sent.
+                            // When every slot is still being analysed this frame is skipped.
+                            // A frame larger than a slot (e.g. the display changed) is encoded instead.
+                            if (ring.TryWrite(bmp, out var slot, out var seq))
+                            {
+                                await wsClient.SendStringAsync(JsonSerializer.Serialize(new { type = "shm_frame", slot, seq, user_id = Auth.AuthState.UserId }));
+                            }
+                        }
+                        else
+                        {
+                            using var ms = new MemoryStream();
+                            EncodeFrame(bmp, ms);
+                            var bytes = ms.ToArray();
+                            var b64 = Convert.ToBase64String(bytes);
+                            var payload = JsonSerializer.Serialize(new { type = "frame", data = b64, user_id = Auth.AuthState.UserId });
+                            if (wsClient != null)
+                            {
+                                await wsClient.SendStringAsync(payload);
+                            }
                         }
                         // Stream to OBS if enabled
                         if (obsStreaming?.IsStreaming == true)
@@ -225,6 +377,21 @@ namespace TradeSensei.UI
             });
         }
 
+        // PNG until the backend advises a codec quality, then JPEG at that quality
+        private void EncodeFrame(System.Drawing.Bitmap bmp, Stream output)
+        {
+            var quality = encodeQuality;
+            if (quality <= 0 || quality >= 100)
+            {
+                bmp.Save(output, ImageFormat.Png);
+                return;
+            }
+            var jpeg = ImageCodecInfo.GetImageEncoders().First(c => c.FormatID == ImageFormat.Jpeg.Guid);
+            using var parameters = new EncoderParameters(1);
+            parameters.Param[0] = new EncoderParameter(System.Drawing.Imaging.Encoder.Quality, (long)quality);
+            bmp.Save(output, jpeg, parameters);
+        }
+
         public void SetObsStreaming(ObsStreamingService? obsService)
         {
             obsStreaming = obsService;
@@ -235,13 +402,17 @@ namespace TradeSensei.UI
             captureFps = Math.Max(1, fps);
             if (wsClient == null)
             {
-                wsClient = new WebSocketClient(ApiConfig.GetWebSocketUrl());
+                var url = ApiConfig.GetWebSocketUrl();
+                if (!string.IsNullOrEmpty(resumeToken)) url += (url.Contains('?') ? "&" : "?") + "resume=" + Uri.EscapeDataString(resumeToken);
+                wsClient = new WebSocketClient(url);
                 wsClient.OnJsonMessage += WsClient_OnJsonMessage;
             }
 
             try
             {
                 await wsClient.ConnectAsync();
+                // Opt into overlay deltas: the server then only sends what changed
+                await wsClient.SendStringAsync(JsonSerializer.Serialize(new { type = "hello", capabilities = new[] { "overlay_delta" } }));
                 // Initialize Desktop Duplication capture implementation and start it.
                 try
                 {
@@ -255,6 +426,12 @@ namespace TradeSensei.UI
                     System.Diagnostics.Debug.WriteLine("Desktop Duplication init failed: " + ex.Message);
                     duplicator = null;
                 }
+                if (IsLocalBackend())
+                {
+                    // Ask for a shared-memory frame ring sized for what is actually captured
+                    var (width, height) = CaptureSize();
+                    await wsClient.SendStringAsync(JsonSerializer.Serialize(new { type = "shm_attach", width, height }));
+                }
             }
             catch (Exception ex)
             {
@@ -269,6 +446,35 @@ namespace TradeSensei.UI
             capturing = false;
             try { wsClient?.Dispose(); } catch { }
             wsClient = null;
+            frameRing?.Dispose();
+            frameRing = null;
+        }
+
+        // Captured frames are in physical pixels, while SystemParameters reports DIPs
+        // (smaller at any display scaling above 100%). Size from a real frame, and at
+        // least the primary screen scaled by its DPI.
+        private (int width, int height) CaptureSize()
+        {
+            var dpi = Dispatcher.Invoke(() => VisualTreeHelper.GetDpi(this));
+            int width = (int)Math.Ceiling(SystemParameters.PrimaryScreenWidth * dpi.DpiScaleX);
+            int height = (int)Math.Ceiling(SystemParameters.PrimaryScreenHeight * dpi.DpiScaleY);
+            try
+            {
+                using var probe = CaptureScreenRegion();
+                width = Math.Max(width, probe.Width);
+                height = Math.Max(height, probe.Height);
+            }
+            catch (Exception ex)
+            {
+                System.Diagnostics.Debug.WriteLine("Capture probe failed: " + ex.Message);
+            }
+            return (width, height);
+        }
+
+        private static bool IsLocalBackend()
+        {
+            var host = new Uri(ApiConfig.GetWebSocketUrl()).Host;
+            return host == "127.0.0.1" || host == "localhost" || host == "[::1]";
         }
 
         private System.Drawing.Bitmap CaptureScreenRegion()
@@ -298,6 +504,7 @@ namespace TradeSensei.UI
             try { (duplicator as IDisposable)?.Dispose(); } catch { }
             duplicator = null;
             wsClient?.Dispose();
+            frameRing?.Dispose();
             base.OnClosed(e);
         }
     }
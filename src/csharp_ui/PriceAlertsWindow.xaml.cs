@@ -1,9 +1,11 @@
 using System;
 using System.Collections.Generic;
+using System.IO;
 using System.Windows;
 using System.Windows.Controls;
 using System.Net.Http;
 using System.Text.Json;
+using System.Threading;
 using System.Threading.Tasks;
 
 namespace TradeSensei.UI
@@ -13,6 +15,7 @@ namespace TradeSensei.UI
         private string _userId = string.Empty;
         private string _apiBaseUrl = string.Empty;
         private List<Dictionary<string, object>> _alerts = new();
+        private CancellationTokenSource? _priceStream;
 
         public PriceAlertsWindow()
         {
@@ -30,7 +33,7 @@ namespace TradeSensei.UI
         {
             try
             {
-                using var client = new HttpClient();
+                using var client = ApiConfig.Authorize(new HttpClient());
                 var response = await client.GetAsync($"{_apiBaseUrl}/alerts/{_userId}");
                 if (response.IsSuccessStatusCode)
                 {
@@ -85,7 +88,7 @@ namespace TradeSensei.UI
                     notification_type = ((ComboBoxItem)CmbNotificationType.SelectedItem).Content.ToString().ToLower()
                 };
 
-                using var client = new HttpClient();
+                using var client = ApiConfig.Authorize(new HttpClient());
                 var json = JsonSerializer.Serialize(payload);
                 var content = new StringContent(json, System.Text.Encoding.UTF8, "application/json");
                 var response = await client.PostAsync($"{_apiBaseUrl}/alerts/create", content);
@@ -121,7 +124,7 @@ namespace TradeSensei.UI
             var selected = AlertsListBox.SelectedItem as dynamic;
             try
             {
-                using var client = new HttpClient();
+                using var client = ApiConfig.Authorize(new HttpClient());
                 var response = await client.DeleteAsync($"{_apiBaseUrl}/alerts/{_userId}/{selected.AlertId}");
 
                 if (response.IsSuccessStatusCode)
@@ -138,30 +141,55 @@ namespace TradeSensei.UI
 
         private async void BtnRefreshPrices_Click(object sender, RoutedEventArgs e)
         {
-            try
+            // One server-sent event stream for all symbols; the backend coalesces ticks
+            _priceStream?.Cancel();
+            var stream = _priceStream = new CancellationTokenSource();
+            var symbols = new[] { "BTC", "ETH", "XRP", "ADA" };
+            var lines = new Dictionary<string, int>();
+            PricesListBox.Items.Clear();
+            foreach (var symbol in symbols)
             {
-                PricesListBox.Items.Clear();
-                var symbols = new[] { "BTC", "ETH", "XRP", "ADA" };
+                lines[symbol] = PricesListBox.Items.Add($"{symbol}: ...");
+            }
 
-                foreach (var symbol in symbols)
+            try
+            {
+                using var client = ApiConfig.Authorize(new HttpClient { Timeout = Timeout.InfiniteTimeSpan });
+                using var response = await client.GetAsync($"{_apiBaseUrl}/prices/stream?symbols={string.Join(",", symbols)}",
+                                                           HttpCompletionOption.ResponseHeadersRead, stream.Token);
+                response.EnsureSuccessStatusCode();
+                using var reader = new StreamReader(await response.Content.ReadAsStreamAsync());
+                while (!stream.IsCancellationRequested)
                 {
-                    using var client = new HttpClient();
-                    var response = await client.GetAsync($"{_apiBaseUrl}/price/{symbol}");
-                    if (response.IsSuccessStatusCode)
+                    var line = await reader.ReadLineAsync();
+                    if (line == null)
+                        break;
+                    if (!line.StartsWith("data: "))
+                        continue;
+                    var tick = JsonDocument.Parse(line.Substring(6)).RootElement;
+                    var symbol = tick.GetProperty("symbol").GetString() ?? string.Empty;
+                    if (lines.TryGetValue(symbol, out var index))
                     {
-                        var json = await response.Content.ReadAsStringAsync();
-                        var doc = JsonDocument.Parse(json);
-                        var price = doc.RootElement.GetProperty("price").GetDouble();
-                        PricesListBox.Items.Add($"{symbol}: ${price:F2}");
+                        PricesListBox.Items[index] = $"{symbol}: ${tick.GetProperty("price").GetDouble():F2}";
                     }
                 }
             }
+            catch (OperationCanceledException)
+            {
+            }
             catch (Exception ex)
             {
-                MessageBox.Show($"Error: {ex.Message}");
+                if (!stream.IsCancellationRequested)
+                    MessageBox.Show($"Error: {ex.Message}");
             }
         }
 
+        protected override void OnClosed(EventArgs e)
+        {
+            _priceStream?.Cancel();
+            base.OnClosed(e);
+        }
+
         private void BtnClose_Click(object sender, RoutedEventArgs e)
         {
             Close();
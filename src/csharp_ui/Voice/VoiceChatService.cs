@@ -76,7 +76,7 @@ namespace TradeSensei.UI.Voice
                 var lastFile = files[^1];
 
                 // Send to backend for transcription
-                var http = new HttpClient();
+                var http = ApiConfig.Authorize(new HttpClient());
                 var audioBytes = File.ReadAllBytes(lastFile);
                 var audioBase64 = Convert.ToBase64String(audioBytes);
                 var payload = new { audio_base64 = audioBase64, api_key = ApiConfig.OpenAiApiKey };
@@ -116,7 +116,7 @@ namespace TradeSensei.UI.Voice
                 if (isPlaying) return;
                 isPlaying = true;
 
-                var http = new HttpClient();
+                var http = ApiConfig.Authorize(new HttpClient());
                 var payload = new { text = text, api_key = ApiConfig.ElevenLabsApiKey };
                 var resp = await http.PostAsJsonAsync(ApiConfig.GetFullUrl("tts"), payload);
                 
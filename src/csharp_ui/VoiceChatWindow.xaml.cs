@@ -70,6 +70,7 @@ namespace TradeSensei.UI
             {
                 TxtStatus.Text = "Getting AI response...";
                 var payload = new { user_input = userInput, context = new { }, openai_key = ApiConfig.OpenAiApiKey, elevenlabs_key = ApiConfig.ElevenLabsApiKey };
+                ApiConfig.Authorize(Http);
                 using var resp = await Http.PostAsJsonAsync(ApiConfig.GetFullUrl("mentor/ask"), payload);
                 if (!resp.IsSuccessStatusCode)
                 {
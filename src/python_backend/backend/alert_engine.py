@@ -0,0 +1,321 @@
+"""Vectorized evaluation of indicator-based price alerts.
+
+'above'/'below' alerts live in the sorted level index (alert_index). Every other
+condition is compiled into typed columns, one set per (symbol, condition kind):
+two float parameters `a` and `b`, an int `period`, and a live mask. A tick
+evaluates each kind's columns with a few NumPy comparisons, so its cost is a
+handful of array operations over the symbol's alerts rather than a Python call
+per alert.
+
+Conditions and their parameters:
+  - pct_move: `percent` (signed; +5 fires on a 5% rise, -5 on a 5% fall) measured
+    from `reference_price` (default: the first price seen after creation)
+  - cross_above_ma / cross_below_ma: the price crosses the simple moving average
+    of the last `period` bar closes
+  - range_breakout: the price leaves [`low`, `high`]
+  - volume_spike: the volume of the current bar reaches `multiplier` times the
+    average of the last `period` bars
+
+Indicators are streamed per symbol: ticks are folded into bars of
+`ALERT_BAR_SECONDS`. The running sums of bar closes and volumes are rebuilt only
+when a bar closes, so a tick reads every moving average with one gather. An
+average needs `period` completed bars before anything crosses it. A symbol's bars
+are dropped together with its last alert.
+
+Tunables (environment):
+  - ALERT_BAR_SECONDS: bar length for moving averages and volume (default 60)
+  - ALERT_MAX_PERIOD: longest moving-average / volume lookback in bars (default 200)
+"""
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+ALERT_BAR_SECONDS = float(os.getenv('ALERT_BAR_SECONDS', '60'))
+ALERT_MAX_PERIOD = int(os.getenv('ALERT_MAX_PERIOD', '200'))
+
+CONDITIONS = ('pct_move', 'cross_above_ma', 'cross_below_ma', 'range_breakout', 'volume_spike')
+# Alert fields that parameterize a condition
+PARAMS = ('percent', 'reference_price', 'period', 'low', 'high', 'multiplier')
+
+_INITIAL_ROWS = 16
+
+
+def compile_condition(alert: Dict) -> Tuple[float, float, int]:
+    """The (a, b, period) columns for an alert; raises ValueError on bad parameters."""
+    try:
+        return _compile(alert['condition'], alert.get('params') or {})
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{alert['condition']} alert needs parameter {e}") from e
+
+
+def _compile(condition: str, params: Dict) -> Tuple[float, float, int]:
+    if condition == 'pct_move':
+        percent = float(params['percent'])
+        if percent == 0:
+            raise ValueError("percent must not be 0")
+        reference = params.get('reference_price')
+        return percent, float(reference) if reference else np.nan, 0
+    if condition in ('cross_above_ma', 'cross_below_ma'):
+        return np.nan, np.nan, _period(params)
+    if condition == 'range_breakout':
+        low, high = float(params['low']), float(params['high'])
+        if not low < high:
+            raise ValueError("low must be below high")
+        return low, high, 0
+    if condition == 'volume_spike':
+        multiplier = float(params['multiplier'])
+        if multiplier <= 0:
+            raise ValueError("multiplier must be positive")
+        return multiplier, np.nan, _period(params)
+    raise ValueError(f"unknown alert condition: {condition}")
+
+
+def _period(params: Dict) -> int:
+    period = int(params['period'])
+    if not 1 <= period <= ALERT_MAX_PERIOD:
+        raise ValueError(f"period must be between 1 and {ALERT_MAX_PERIOD}")
+    return period
+
+
+def describe(alert: Dict) -> str:
+    """Short human-readable form of an alert's condition, for notifications."""
+    condition, params = alert['condition'], alert.get('params') or {}
+    if condition == 'pct_move':
+        return f"moved {float(params['percent']):+g}% from ${params.get('reference_price')}"
+    if condition == 'cross_above_ma':
+        return f"crossed above its {params['period']}-bar average"
+    if condition == 'cross_below_ma':
+        return f"crossed below its {params['period']}-bar average"
+    if condition == 'range_breakout':
+        return f"left ${params['low']}-${params['high']}"
+    if condition == 'volume_spike':
+        return f"volume {params['multiplier']}x its {params['period']}-bar average"
+    return f"{condition} ${alert.get('price')}"
+
+
+class _Columns:
+    """Alerts of one condition kind on one symbol, as parallel arrays."""
+
+    __slots__ = ('a', 'b', 'period', 'live', 'ids', 'rows', 'size', 'dead')
+
+    def __init__(self):
+        self.a = np.empty(_INITIAL_ROWS)
+        self.b = np.empty(_INITIAL_ROWS)
+        self.period = np.empty(_INITIAL_ROWS, dtype=np.int32)
+        self.live = np.zeros(_INITIAL_ROWS, dtype=bool)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.size = 0
+        self.dead = 0
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.a):
+            return
+        capacity = max(needed, 2 * len(self.a))
+        for name in ('a', 'b', 'period', 'live'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def extend(self, ids: List[str], a, b, period):
+        n = len(ids)
+        self._reserve(n)
+        end = self.size + n
+        self.a[self.size:end] = a
+        self.b[self.size:end] = b
+        self.period[self.size:end] = period
+        self.live[self.size:end] = True
+        self.rows.update(zip(ids, range(self.size, end)))
+        self.ids += ids
+        self.size = end
+
+    def kill(self, rows: np.ndarray) -> List[str]:
+        self.live[rows] = False
+        self.dead += len(rows)
+        ids = [self.ids[row] for row in rows]
+        for alert_id in ids:
+            del self.rows[alert_id]
+        if self.dead > max(64, self.size // 2):
+            self._compact()
+        return ids
+
+    def _compact(self):
+        keep = np.flatnonzero(self.live[:self.size])
+        n = len(keep)
+        for name in ('a', 'b', 'period', 'live'):
+            column = getattr(self, name)
+            column[:n] = column[keep]
+        self.live[n:self.size] = False
+        self.ids = [self.ids[row] for row in keep]
+        self.rows = {alert_id: row for row, alert_id in enumerate(self.ids)}
+        self.size = n
+        self.dead = 0
+
+    def view(self):
+        n = self.size
+        return self.a[:n], self.b[:n], self.period[:n], self.live[:n]
+
+
+class _Indicators:
+    """Bars and running sums of one symbol's closes and volumes."""
+
+    __slots__ = ('bar_start', 'bar_volume', 'closes', 'volumes', 'close_sums', 'volume_sums', 'price')
+
+    def __init__(self):
+        self.bar_start: Optional[float] = None
+        self.bar_volume = 0.0
+        self.closes = deque(maxlen=ALERT_MAX_PERIOD)
+        self.volumes = deque(maxlen=ALERT_MAX_PERIOD)
+        self.close_sums = np.zeros(1)
+        self.volume_sums = np.zeros(1)
+        self.price = np.nan
+
+    def tick(self, price: float, volume: float, now: float, bar_seconds: float):
+        if self.bar_start is None:
+            self.bar_start = now
+        elif now - self.bar_start >= bar_seconds:
+            # close the bar at the last price seen in it (gaps collapse into one bar)
+            self.closes.append(self.price)
+            self.volumes.append(self.bar_volume)
+            self.close_sums = np.concatenate(([0.0], np.cumsum(self.closes)))
+            self.volume_sums = np.concatenate(([0.0], np.cumsum(self.volumes)))
+            self.bar_start += (now - self.bar_start) // bar_seconds * bar_seconds
+            self.bar_volume = 0.0
+        self.bar_volume += volume
+
+    @staticmethod
+    def _means(sums: np.ndarray, periods: np.ndarray) -> np.ndarray:
+        """Mean of the last `p` bars for each p; NaN where there are fewer bars."""
+        count = len(sums) - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums[count] - sums[np.clip(count - periods, 0, count)]) / periods
+        return np.where(periods <= count, means, np.nan)
+
+    def moving_average(self, periods: np.ndarray) -> np.ndarray:
+        return self._means(self.close_sums, periods)
+
+    def average_volume(self, periods: np.ndarray) -> np.ndarray:
+        return self._means(self.volume_sums, periods)
+
+
+class AlertEngine:
+    """Indicator-based alerts by symbol, evaluated per tick in bulk."""
+
+    def __init__(self, bar_seconds: float = ALERT_BAR_SECONDS, clock=time.time):
+        self.bar_seconds = bar_seconds
+        self.clock = clock
+        self._books: Dict[str, Dict[str, _Columns]] = {}
+        self._indicators: Dict[str, _Indicators] = {}
+        self._alerts: Dict[str, Dict] = {}
+        self.evaluated = 0
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __contains__(self, alert_id: str) -> bool:
+        return alert_id in self._alerts
+
+    def add(self, alert: Dict):
+        """Index an untriggered alert (re-adding an indexed id replaces it)."""
+        self.add_many([alert])
+
+    def add_many(self, alerts: Iterable[Dict]):
+        """Index many untriggered alerts, one array append per symbol and kind."""
+        batch = {alert['id']: alert for alert in alerts}
+        compiled = {alert_id: compile_condition(alert) for alert_id, alert in batch.items()}  # all valid first
+        fresh: Dict[Tuple[str, str], Tuple[list, list]] = {}
+        for alert in batch.values():
+            columns = compiled[alert['id']]
+            if alert['id'] in self._alerts:
+                self.remove(alert['id'])
+            ids, rows = fresh.setdefault((alert['symbol'], alert['condition']), ([], []))
+            ids.append(alert['id'])
+            rows.append(columns)
+            self._alerts[alert['id']] = alert
+        for (symbol, condition), (ids, rows) in fresh.items():
+            a, b, period = zip(*rows)
+            book = self._books.setdefault(symbol, {})
+            self._indicators.setdefault(symbol, _Indicators())
+            book.setdefault(condition, _Columns()).extend(ids, a, b, period)
+
+    def remove(self, alert_id: str) -> bool:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        columns = self._books[alert['symbol']][alert['condition']]
+        columns.kill(np.array([columns.rows[alert_id]]))
+        self._prune(alert['symbol'])
+        return True
+
+    def _prune(self, symbol: str):
+        book = self._books[symbol]
+        for condition in [c for c, columns in book.items() if not columns.rows]:
+            del book[condition]
+        if not book:
+            del self._books[symbol]
+            self._indicators.pop(symbol, None)
+
+    def symbols(self) -> set:
+        """Symbols with at least one resting alert."""
+        return set(self._books)
+
+    def take(self, symbols: set) -> List[Dict]:
+        """Remove and return every alert on `symbols`, and their bar history."""
+        taken = [alert for alert in self._alerts.values() if alert['symbol'] in symbols]
+        for alert in taken:
+            self.remove(alert['id'])
+        return taken
+
+    def tick(self, symbol: str, price: float, volume: float = 0.0, now: Optional[float] = None) -> List[Dict]:
+        """Feed one tick; remove and return the alerts it triggered."""
+        indicators = self._indicators.get(symbol)
+        if indicators is None:
+            return []
+        indicators.tick(price, volume, self.clock() if now is None else now, self.bar_seconds)
+        previous, indicators.price = indicators.price, price
+        book = self._books.get(symbol)
+        if book is None:
+            return []
+
+        fired: List[str] = []
+        for condition, columns in book.items():
+            a, b, period, live = columns.view()
+            self.evaluated += len(columns.rows)  # live alerts, not rows awaiting compaction
+            if condition == 'pct_move':
+                unset = np.isnan(b) & live  # removed rows stay until compaction
+                if unset.any():
+                    b[unset] = price
+                    for row in np.flatnonzero(unset):
+                        self._alerts[columns.ids[row]]['params']['reference_price'] = price
+                move = (price - b) / b * 100.0
+                hit = np.where(a > 0, move >= a, move <= a)
+            elif condition == 'cross_above_ma':
+                average = indicators.moving_average(period)
+                hit = (previous < average) & (price >= average)
+            elif condition == 'cross_below_ma':
+                average = indicators.moving_average(period)
+                hit = (previous > average) & (price <= average)
+            elif condition == 'range_breakout':
+                hit = (price < a) | (price > b)
+            else:  # volume_spike
+                average = indicators.average_volume(period)
+                hit = (average > 0) & (indicators.bar_volume >= a * average)
+            rows = np.flatnonzero(hit & live)
+            if len(rows):
+                fired += columns.kill(rows)
+        if fired:
+            self._prune(symbol)
+        return [self._alerts.pop(alert_id) for alert_id in fired]
+
+    def clear(self):
+        self._books.clear()
+        self._indicators.clear()
+        self._alerts.clear()
+
+    def stats(self) -> Dict:
+        return {'alerts': len(self._alerts), 'symbols': len(self._books), 'evaluated': self.evaluated}
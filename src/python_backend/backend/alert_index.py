@@ -0,0 +1,141 @@
+"""Sorted price-level index of resting price alerts.
+
+Per symbol, 'above' and 'below' alert thresholds are kept in sorted lists with the
+alert ids in parallel lists. Both are ordered so that the alerts a price crosses
+form a suffix:
+  - 'above' alerts trigger when price >= threshold; they are keyed by -threshold,
+    so the lowest thresholds sit at the end
+  - 'below' alerts trigger when price <= threshold; keyed by threshold, so the
+    highest thresholds sit at the end
+A new price bisects each list once and cuts the triggered suffix off in bulk, so a
+tick costs O(log n + k) for k triggered alerts regardless of how many rest.
+Adding or removing a single alert is a bisect plus a list insert/delete; bulk
+loads go through `add_many`.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+
+
+class _Levels:
+    """One side of one symbol: sorted keys with alert ids in a parallel list."""
+
+    __slots__ = ('keys', 'ids')
+
+    def __init__(self):
+        self.keys: List[float] = []
+        self.ids: List[str] = []
+
+    def add(self, key: float, alert_id: str):
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, key: float, alert_id: str) -> bool:
+        lo, hi = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        for i in range(lo, hi):
+            if self.ids[i] == alert_id:
+                del self.keys[i]
+                del self.ids[i]
+                return True
+        return False
+
+    def pop_from(self, key: float) -> List[str]:
+        """Remove and return the ids of every entry with a key >= `key`."""
+        i = bisect_left(self.keys, key)
+        crossed = self.ids[i:]
+        del self.keys[i:]
+        del self.ids[i:]
+        return crossed
+
+
+class AlertIndex:
+    """Untriggered alerts by symbol and price level."""
+
+    def __init__(self):
+        self._levels: Dict[Tuple[str, str], _Levels] = {}
+        self._alerts: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __contains__(self, alert_id: str) -> bool:
+        return alert_id in self._alerts
+
+    @staticmethod
+    def _key(alert: Dict) -> Tuple[Tuple[str, str], float]:
+        price = float(alert['price'])
+        condition = alert['condition']
+        if condition == 'above':
+            return (alert['symbol'], condition), -price
+        if condition == 'below':
+            return (alert['symbol'], condition), price
+        raise ValueError(f"unknown alert condition: {condition}")
+
+    def add(self, alert: Dict):
+        """Index an untriggered alert (re-adding an indexed id replaces it)."""
+        if alert['id'] in self._alerts:
+            self.remove(alert['id'])
+        side, key = self._key(alert)
+        levels = self._levels.get(side)
+        if levels is None:
+            levels = self._levels[side] = _Levels()
+        levels.add(key, alert['id'])
+        self._alerts[alert['id']] = alert
+
+    def add_many(self, alerts):
+        """Index many untriggered alerts at once (one sort per side, not one insert each)."""
+        batch = {alert['id']: alert for alert in alerts}
+        keys = {alert_id: self._key(alert) for alert_id, alert in batch.items()}  # all valid before any is added
+        fresh: Dict[Tuple[str, str], List[Tuple[float, str]]] = {}
+        for alert_id, alert in batch.items():
+            if alert_id in self._alerts:
+                self.remove(alert_id)
+            side, key = keys[alert_id]
+            fresh.setdefault(side, []).append((key, alert_id))
+            self._alerts[alert_id] = alert
+        for side, entries in fresh.items():
+            levels = self._levels.get(side)
+            if levels is None:
+                levels = self._levels[side] = _Levels()
+            entries += zip(levels.keys, levels.ids)
+            entries.sort(key=lambda entry: entry[0])
+            levels.keys = [key for key, _ in entries]
+            levels.ids = [alert_id for _, alert_id in entries]
+
+    def remove(self, alert_id: str) -> bool:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        side, key = self._key(alert)
+        levels = self._levels[side]
+        levels.remove(key, alert_id)
+        if not levels.keys:
+            del self._levels[side]
+        return True
+
+    def symbols(self) -> set:
+        """Symbols with at least one resting alert."""
+        return {symbol for symbol, _ in self._levels}
+
+    def take(self, symbols: set) -> List[Dict]:
+        """Remove and return every alert on `symbols`."""
+        taken = [alert for alert in self._alerts.values() if alert['symbol'] in symbols]
+        for alert in taken:
+            self.remove(alert['id'])
+        return taken
+
+    def trigger(self, symbol: str, price: float) -> List[Dict]:
+        """Remove and return the alerts on `symbol` that `price` has crossed."""
+        crossed = []
+        for condition, key in (('above', -price), ('below', price)):
+            levels = self._levels.get((symbol, condition))
+            if levels is None:
+                continue
+            crossed += levels.pop_from(key)
+            if not levels.keys:
+                del self._levels[(symbol, condition)]
+        return [self._alerts.pop(alert_id) for alert_id in crossed]
+
+    def clear(self):
+        self._levels.clear()
+        self._alerts.clear()
@@ -0,0 +1,413 @@
+"""Alert evaluation sharded across worker processes.
+
+With `ALERT_SHARDS` > 0 resting alerts do not live in the API process. Every symbol
+belongs to one of N worker processes, picked by rendezvous hashing of the symbol.
+That worker holds the symbol's alerts (level index and condition engine),
+subscribes to its prices on its own exchange stream and evaluates every tick, so
+alert evaluation runs on N cores instead of sharing the API's core and GIL with
+vision and HTTP.
+
+The API process talks to each worker over a duplex pipe:
+  - ('add', alerts) / ('remove', alert_ids): keep the worker's slice in step with
+    created and deleted alerts
+  - ('tick', symbol, price, volume): evaluate a price fetched by the API process
+  - ('call', request_id, name, args) -> ('reply', request_id, result), or
+    ('failed', request_id, error): stats, barriers and rebalancing
+  - ('triggered', triggers) from the worker: alerts a tick fired, for the API
+    process to mark and notify
+
+`resize(n)` changes the shard count while running. With rendezvous hashing only
+symbols whose owner changes move (about 1/n of them when growing by one): current
+workers hand over the alerts of symbols they no longer own, new workers are
+started first and retired ones are stopped last. Moved alerts start a fresh bar
+history on their new worker. A worker that dies is restarted, after an
+exponential backoff, and reloaded from the API process's resting alerts; one
+that keeps dying is given up on after `ALERT_SHARD_MAX_RESTARTS` restarts in a
+row. Inside a worker a message that cannot be handled (e.g. a malformed alert)
+is logged and dropped, so it cannot crash the worker.
+
+Tunables (environment):
+  - ALERT_SHARDS: worker processes evaluating alerts; 0 keeps them in the API
+    process (default 0)
+  - ALERT_SHARD_FEED: whether workers stream their symbols' prices themselves
+    (default: PRICE_FEED_ENABLED)
+  - ALERT_SHARD_MAX_RESTARTS: restarts of a crashing worker before its shard is
+    left down (default 5)
+"""
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+ALERT_SHARDS = int(os.getenv('ALERT_SHARDS', '0'))
+ALERT_SHARD_FEED = os.getenv('ALERT_SHARD_FEED', os.getenv('PRICE_FEED_ENABLED', 'true')).lower() in ('1', 'true', 'yes')
+
+ALERT_SHARD_MAX_RESTARTS = int(os.getenv('ALERT_SHARD_MAX_RESTARTS', '5'))
+
+# Seconds a stopping worker gets before it is terminated
+_STOP_TIMEOUT = 5.0
+# Restart delay doubles per crash in a row, from the base up to the maximum;
+# a worker that ran this long before crashing starts the count again
+_RESTART_BACKOFF = 0.5
+_RESTART_BACKOFF_MAX = 30.0
+_STABLE_SECONDS = 60.0
+
+# Workers are spawned, not forked: the API process runs threads and an event loop
+_context = multiprocessing.get_context('spawn')
+
+
+class ShardError(Exception):
+    """A shard worker went away before answering."""
+
+
+def shard_for(symbol: str, shards: int) -> int:
+    """The shard owning `symbol` out of `shards` (rendezvous hashing)."""
+    key = str(symbol).upper().encode()
+    return max(range(shards), key=lambda shard: hashlib.blake2b(b'%s/%d' % (key, shard), digest_size=8).digest())
+
+
+class _Shard:
+    """A worker process and the API process's end of its pipe."""
+
+    def __init__(self, index: int, feed: bool, on_message: Callable[['_Shard', Optional[tuple]], None]):
+        self.index = index
+        self.stopping = False
+        self.down = False
+        self.started = time.monotonic()
+        self.conn, child = _context.Pipe()
+        self.process = _context.Process(target=_worker_main, args=(index, child, feed),
+                                        name=f'alert-shard-{index}', daemon=True)
+        self.process.start()
+        child.close()
+        threading.Thread(target=self._read, args=(on_message,), name=f'alert-shard-{index}-reader',
+                         daemon=True).start()
+
+    def _read(self, on_message):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                on_message(self, None)
+                return
+            on_message(self, message)
+
+    def send(self, *message):
+        if self.down:
+            return  # crashed: its alerts are reloaded when it is restarted
+        self.conn.send(message)
+
+
+class AlertShards:
+    """Routes alerts and ticks to the worker owning each symbol and collects what fires."""
+
+    def __init__(self, shards: int, on_triggers: Callable[[List[Dict]], Awaitable],
+                 resting: Callable[[], Iterable[Dict]] = lambda: (), feed: bool = ALERT_SHARD_FEED):
+        self.size = max(1, shards)
+        self.on_triggers = on_triggers
+        self.resting = resting
+        self.feed = feed
+        self._shards: List[_Shard] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, tuple] = {}
+        self._ids = itertools.count(1)
+        self._notifying: set = set()
+        self._resizing: Optional[asyncio.Lock] = None
+        # Alerts deleted while a rebalance may have them in flight
+        self._removed: set = set()
+        # Crashes in a row per shard index
+        self._crashes: Dict[int, int] = {}
+        self.triggered = 0
+        self.moved = 0
+        self.restarts = 0
+
+    async def start(self):
+        """Start the workers and hand them the resting alerts."""
+        self._loop = asyncio.get_running_loop()
+        self._resizing = asyncio.Lock()
+        self._shards = [self._spawn(index) for index in range(self.size)]
+        self.add(self.resting())
+
+    async def stop(self):
+        shards, self._shards = self._shards, []
+        await asyncio.gather(*(self._stop_shard(shard) for shard in shards))
+        await self.flush()
+
+    def _spawn(self, index: int) -> _Shard:
+        return _Shard(index, self.feed, self._on_message)
+
+    def _owner(self, symbol: str) -> _Shard:
+        return self._shards[shard_for(symbol, self.size)]
+
+    def add(self, alerts: Iterable[Dict]):
+        by_shard: Dict[int, List[Dict]] = {}
+        for alert in alerts:
+            by_shard.setdefault(shard_for(alert['symbol'], self.size), []).append(alert)
+        for index, batch in by_shard.items():
+            self._shards[index].send('add', batch)
+
+    def remove(self, alert_id: str, symbol: str):
+        if self._resizing.locked():
+            self._removed.add(alert_id)
+        self._owner(symbol).send('remove', [alert_id])
+
+    def tick(self, symbol: str, price: float, volume: float = 0.0):
+        """Evaluate a price; whatever fires reaches `on_triggers` shortly after."""
+        self._owner(symbol).send('tick', symbol, price, volume)
+
+    async def _call(self, shard: _Shard, name: str, *args):
+        if shard.down:
+            raise ShardError(f"alert shard {shard.index} is down")
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (shard, future)
+        try:
+            shard.send('call', request_id, name, args)
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def flush(self):
+        """Wait until every worker has handled what was sent so far and its triggers are notified.
+
+        A worker that is down (or dies meanwhile) is not waited for: what was sent to it
+        is gone, and it reloads its alerts when it is restarted.
+        """
+        await asyncio.gather(*(self._call(shard, 'ping') for shard in self._shards if not shard.down),
+                             return_exceptions=True)
+        while self._notifying:
+            await asyncio.gather(*list(self._notifying))
+
+    async def resize(self, shards: int):
+        """Change the number of workers, moving only the symbols whose owner changes."""
+        shards = max(1, shards)
+        async with self._resizing:
+            current = len(self._shards)
+            if shards == current:
+                return
+            self._shards += [self._spawn(index) for index in range(current, shards)]
+            # From here on new alerts and ticks go to their new owners
+            self.size = shards
+            released = await asyncio.gather(*(self._call(shard, 'release', shards)
+                                              for shard in self._shards[:current]), return_exceptions=True)
+            retired = self._shards[shards:]
+            del self._shards[shards:]
+            moving = [alert for batch in released if not isinstance(batch, BaseException)
+                      for alert in batch if alert['id'] not in self._removed]
+            failed = {index for index, batch in enumerate(released) if isinstance(batch, BaseException)}
+            if failed:
+                # A worker that could not hand over its moving symbols (down, or died meanwhile):
+                # take them from the resting alerts instead. A kept worker that died gets its new
+                # slice back when it is restarted.
+                print(f"Alert shards {sorted(failed)} could not release alerts while resizing; reloading them")
+                moving += [alert for alert in self.resting()
+                           if shard_for(alert['symbol'], current) in failed
+                           and shard_for(alert['symbol'], shards) != shard_for(alert['symbol'], current)]
+            self.add(moving)
+            self.moved += len(moving)
+            self._removed.clear()
+            await asyncio.gather(*(self._stop_shard(shard) for shard in retired))
+            await self.flush()
+
+    async def _stop_shard(self, shard: _Shard):
+        shard.stopping = True
+        try:
+            shard.send('stop')
+        except (OSError, ValueError):
+            pass
+        await self._loop.run_in_executor(None, shard.process.join, _STOP_TIMEOUT)
+        if shard.process.is_alive():
+            shard.process.terminate()
+        shard.conn.close()
+
+    def _on_message(self, shard: _Shard, message: Optional[tuple]):
+        # Called on the shard's reader thread
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, shard, message)
+        except RuntimeError:
+            pass  # the loop has closed
+
+    def _dispatch(self, shard: _Shard, message: Optional[tuple]):
+        if message is None:
+            self._lost(shard)
+        elif message[0] == 'triggered':
+            self.triggered += len(message[1])
+            task = self._loop.create_task(self.on_triggers(message[1]))
+            self._notifying.add(task)
+            task.add_done_callback(self._notifying.discard)
+        elif message[0] in ('reply', 'failed'):
+            _, future = self._pending.get(message[1], (None, None))
+            if future is None or future.done():
+                return
+            if message[0] == 'reply':
+                future.set_result(message[2])
+            else:
+                future.set_exception(ShardError(f"alert shard {shard.index}: {message[2]}"))
+
+    def _lost(self, shard: _Shard):
+        for request_id, (owner, future) in list(self._pending.items()):
+            if owner is shard and not future.done():
+                future.set_exception(ShardError(f"alert shard {shard.index} exited"))
+        if shard.stopping or shard not in self._shards:
+            return
+        shard.down = True
+        shard.conn.close()
+        if time.monotonic() - shard.started >= _STABLE_SECONDS:
+            self._crashes[shard.index] = 0
+        crashes = self._crashes[shard.index] = self._crashes.get(shard.index, 0) + 1
+        if crashes > ALERT_SHARD_MAX_RESTARTS:
+            print(f"Alert shard {shard.index} exited ({shard.process.exitcode}) {crashes} times in a row; "
+                  f"leaving it down")
+            return
+        delay = min(_RESTART_BACKOFF_MAX, _RESTART_BACKOFF * 2 ** (crashes - 1))
+        print(f"Alert shard {shard.index} exited ({shard.process.exitcode}); restarting it in {delay:.1f}s")
+        self._loop.call_later(delay, self._restart, shard)
+
+    def _restart(self, shard: _Shard):
+        if shard not in self._shards:
+            return  # stopped or resized away meanwhile
+        self.restarts += 1
+        replacement = self._spawn(shard.index)
+        self._shards[shard.index] = replacement
+        replacement.send('add', [alert for alert in self.resting()
+                                 if shard_for(alert['symbol'], self.size) == shard.index])
+
+    async def stats(self) -> Dict:
+        workers = await asyncio.gather(*(self._call(shard, 'stats') for shard in self._shards),
+                                       return_exceptions=True)
+        return {
+            'shards': self.size,
+            'triggered': self.triggered,
+            'moved': self.moved,
+            'restarts': self.restarts,
+            'down': [shard.index for shard in self._shards if shard.down],
+            'workers': [w if isinstance(w, dict) else {'error': str(w)} for w in workers],
+        }
+
+
+def _worker_main(index: int, conn, feed: bool):
+    try:
+        asyncio.run(_serve(index, conn, feed))
+    except KeyboardInterrupt:
+        pass
+
+
+def _pump(conn, loop: asyncio.AbstractEventLoop, inbox: asyncio.Queue):
+    """Move messages from the pipe onto the worker's event loop."""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            message = None
+        loop.call_soon_threadsafe(inbox.put_nowait, message)
+        if message is None or message[0] == 'stop':
+            return
+
+
+async def _serve(index: int, conn, feed_enabled: bool):
+    # This process's price_alerts holds only this shard's alerts
+    from . import price_alerts, price_feed, provider_client
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    threading.Thread(target=_pump, args=(conn, loop, inbox), daemon=True).start()
+    ticks = 0
+
+    async def forward(triggered: List[Dict]):
+        conn.send(('triggered', triggered))
+
+    def add(alerts: List[Dict]):
+        try:
+            price_alerts.index_many(alerts)
+        except Exception:
+            # find and drop the bad ones; re-adding the rest is harmless
+            for alert in alerts:
+                try:
+                    price_alerts.index_many([alert])
+                except Exception as e:
+                    print(f"Alert shard {index} dropped alert {alert.get('id') if isinstance(alert, dict) else alert!r}: {e}")
+
+    def release(shards: int) -> List[Dict]:
+        leaving = {s for s in price_alerts.alert_symbols() if shard_for(s, shards) != index}
+        return price_alerts.alert_levels.take(leaving) + price_alerts.alert_conditions.take(leaving)
+
+    def stats() -> Dict:
+        return {
+            'pid': os.getpid(),
+            'alerts': len(price_alerts.alert_levels) + len(price_alerts.alert_conditions),
+            'symbols': len(price_alerts.alert_symbols()),
+            'ticks': ticks,
+            'evaluated': price_alerts.alert_conditions.evaluated,
+            'feed': feed.stats() if feed is not None else None,
+        }
+
+    calls = {'ping': lambda: None, 'release': release, 'stats': stats}
+    feed = None
+    if feed_enabled:
+        await provider_client.start()
+        feed = price_feed.PriceFeed(on_triggers=forward)
+        feed.add_source('alerts', price_alerts.alert_symbols)
+        await feed.start()
+    try:
+        while True:
+            message = await inbox.get()
+            if message is None or message[0] == 'stop':
+                break
+            kind = message[0]
+            try:
+                if kind == 'add':
+                    add(message[1])
+                elif kind == 'remove':
+                    for alert_id in message[1]:
+                        price_alerts.unindex(alert_id)
+                elif kind == 'tick':
+                    ticks += 1
+                    triggered = price_alerts.apply_price(*message[1:])
+                    if triggered:
+                        await forward(triggered)
+                elif kind == 'call':
+                    _, request_id, name, args = message
+                    try:
+                        result = calls[name](*args)
+                    except Exception as e:
+                        conn.send(('failed', request_id, f"{name}: {e}"))
+                    else:
+                        conn.send(('reply', request_id, result))
+            except (EOFError, OSError):
+                break  # the API process went away
+            except Exception as e:
+                print(f"Alert shard {index} dropped a {kind!r} message: {e}")
+            if feed is not None and kind != 'tick':
+                feed.refresh()  # the slice of symbols may have changed
+    finally:
+        if feed is not None:
+            await feed.stop()
+            await provider_client.close()
+        conn.close()
+
+
+_shards: Optional[AlertShards] = None
+
+
+def get_shards() -> Optional[AlertShards]:
+    """The running shard pool; None while alerts are evaluated in this process."""
+    return _shards
+
+
+async def start(shards: int, on_triggers: Callable[[List[Dict]], Awaitable],
+                resting: Callable[[], Iterable[Dict]] = lambda: (), feed: bool = ALERT_SHARD_FEED) -> AlertShards:
+    global _shards
+    pool = AlertShards(shards, on_triggers, resting, feed)
+    await pool.start()
+    _shards = pool
+    return pool
+
+
+async def stop():
+    global _shards
+    pool, _shards = _shards, None
+    if pool is not None:
+        await pool.stop()
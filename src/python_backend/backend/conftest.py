@@ -0,0 +1,14 @@
+import pytest
+
+from . import load_governor, price_fanout, price_providers, rate_limit, upstream_budget
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits(monkeypatch):
+    """Every test starts with full token buckets and upstream budgets, no load shedding,
+    no price subscribers and closed provider breakers."""
+    monkeypatch.setattr(rate_limit, '_limiter', None)
+    monkeypatch.setattr(load_governor, '_governor', None)
+    monkeypatch.setattr(price_fanout, '_fanout', None)
+    monkeypatch.setattr(price_providers, '_fetcher', None)
+    monkeypatch.setattr(upstream_budget, '_budgets', None)
@@ -0,0 +1,112 @@
+"""Server-driven frame rate and analysis quality per chart session.
+
+`FlowController` watches how long each frame of a session takes to process
+(exponentially weighted) and how much work is still waiting behind it. When the
+session runs over its latency budget it steps down one analysis quality level
+(`vision.QUALITY_LEVELS`: coarser pyramid level, fewer detectors) and advises the
+client to capture less often and encode with a lower codec quality. It steps back up
+only after several frames well within budget, so it does not flap.
+
+Advice goes to the client as
+    {"type": "flow_control", "target_fps": n, "quality": q, "level": l}
+whenever it changes. `quality` is a 1-100 codec quality hint for lossy encoders.
+`target_fps` never exceeds the cap set with `cap_fps` (the session's frame rate
+limit), so a client that follows the advice is not rate limited.
+
+Tunables (environment):
+  - WS_LATENCY_BUDGET_MS: per-frame processing budget (default 250)
+  - WS_MAX_FPS / WS_MIN_FPS: bounds for the advised capture rate (default 10 / 1)
+"""
+import math
+import os
+from typing import Any, Dict, Optional
+
+from . import vision
+
+WS_LATENCY_BUDGET_MS = float(os.getenv('WS_LATENCY_BUDGET_MS', '250'))
+WS_MAX_FPS = int(os.getenv('WS_MAX_FPS', '10'))
+WS_MIN_FPS = int(os.getenv('WS_MIN_FPS', '1'))
+
+# Codec quality advised at each analysis quality level
+CODEC_QUALITY = (90, 75, 60)
+
+_EWMA_ALPHA = 0.3
+_DEGRADE_AFTER = 2    # consecutive frames over budget before stepping down
+_RECOVER_AFTER = 10   # consecutive frames under half the budget before stepping up
+
+
+class FlowController:
+    """Adapts one session's analysis quality and advised capture rate to its load."""
+
+    def __init__(self, budget_ms: float = WS_LATENCY_BUDGET_MS, max_fps: int = WS_MAX_FPS, min_fps: int = WS_MIN_FPS):
+        self.budget_ms = budget_ms
+        self.max_fps = max(1, max_fps)
+        self.min_fps = max(1, min(min_fps, self.max_fps))
+        self.fps_cap = float('inf')
+        self.level = 0
+        self.ewma_ms: Optional[float] = None
+        self.queue_depth = 0
+        self._over = 0
+        self._under = 0
+        self._advised: Optional[Dict[str, Any]] = None
+
+    @property
+    def max_level(self) -> int:
+        return len(vision.QUALITY_LEVELS) - 1
+
+    def cap_fps(self, fps: float):
+        """Never advise more than `fps` frames per second (takes effect with the next frame)."""
+        self.fps_cap = fps
+
+    def observe(self, processing_ms: float, queue_depth: int = 0) -> Optional[Dict[str, Any]]:
+        """Record one processed frame; return a flow_control message if the advice changed.
+
+        `queue_depth` counts chart output still waiting for this session (messages
+        from earlier frames not yet written to the socket).
+        """
+        if self.ewma_ms is None:
+            self.ewma_ms = processing_ms
+        else:
+            self.ewma_ms += _EWMA_ALPHA * (processing_ms - self.ewma_ms)
+        self.queue_depth = queue_depth
+
+        if self.ewma_ms > self.budget_ms or queue_depth > 1:
+            self._over += 1
+            self._under = 0
+            if self._over >= _DEGRADE_AFTER and self.level < self.max_level:
+                self.level += 1
+                self._over = 0
+        elif self.ewma_ms < self.budget_ms / 2 and not queue_depth:
+            self._under += 1
+            self._over = 0
+            if self._under >= _RECOVER_AFTER and self.level > 0:
+                self.level -= 1
+                self._under = 0
+        else:
+            self._over = self._under = 0
+
+        advice = self.advice()
+        if advice == self._advised:
+            return None
+        self._advised = advice
+        return {"type": "flow_control", **advice}
+
+    def advice(self) -> Dict[str, Any]:
+        # Leave headroom so a frame normally finishes before the next one arrives
+        per_frame_ms = max(1.0, (self.ewma_ms or 0.0) * 1.25)
+        fps = max(self.min_fps, min(self.max_fps, math.floor(1000.0 / per_frame_ms)))
+        if fps > self.fps_cap:
+            fps = max(1, math.floor(self.fps_cap))
+        return {
+            "target_fps": fps,
+            "quality": CODEC_QUALITY[min(self.level, len(CODEC_QUALITY) - 1)],
+            "level": self.level,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'level': self.level,
+            'ewma_ms': round(self.ewma_ms, 2) if self.ewma_ms is not None else None,
+            'queue_depth': self.queue_depth,
+            **(self._advised or {}),
+        }
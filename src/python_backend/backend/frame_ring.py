@@ -0,0 +1,137 @@
+"""Shared-memory ring of frame slots for clients on the same host.
+
+Instead of PNG-encoding, base64-wrapping and sending every frame over the socket, a
+local client writes raw BGR pixels into a slot of a shared-memory segment and sends
+only `{"type": "shm_frame", "slot": i, "seq": n}` over the existing WebSocket. The
+vision engine reads the pixels straight from shared memory.
+
+Layout (little endian):
+  - ring header (64 bytes): magic b'TSFR', layout version (u32), slot count (u32),
+    slot size in bytes (u64)
+  - `slots` slots, each a 64-byte header (seq u64, height u32, width u32,
+    channels u32) followed by `height * width * channels` bytes of pixels
+
+The writer fills the pixels first and stores the slot's `seq` last. The reader checks
+that `seq` before and after using the pixels, so a slot the client reused in the
+meantime is detected instead of analysed half-written. The server releases slots
+cumulatively: `{"type": "shm_release", "seq": n}` means every frame up to `n` has
+been read or superseded.
+
+On Windows the segment is a named file mapping the WPF client opens with
+`MemoryMappedFile.OpenExisting(name)`; on POSIX it is `/dev/shm/<name>`.
+"""
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+FRAME_RING_ENABLED = os.getenv('FRAME_RING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+FRAME_RING_SLOTS = int(os.getenv('FRAME_RING_SLOTS', '4'))
+FRAME_RING_MAX_PIXELS = int(os.getenv('FRAME_RING_MAX_PIXELS', str(3840 * 2160)))
+
+MAGIC = b'TSFR'
+LAYOUT_VERSION = 1
+RING_HEADER = struct.Struct('<4sIIQ')
+SLOT_HEADER = struct.Struct('<QIII')
+RING_HEADER_BYTES = 64
+SLOT_HEADER_BYTES = 64
+
+
+class FrameRing:
+    """A ring of fixed-size frame slots in one shared-memory segment."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_bytes: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = owner
+
+    @classmethod
+    def create(cls, width: int, height: int, slots: int = FRAME_RING_SLOTS, channels: int = 3) -> 'FrameRing':
+        """Allocate a ring large enough for `width x height` frames (server side)."""
+        if width <= 0 or height <= 0 or width * height > FRAME_RING_MAX_PIXELS:
+            raise ValueError(f"unsupported frame size {width}x{height}")
+        slots = max(2, min(slots, 16))
+        slot_bytes = SLOT_HEADER_BYTES + width * height * channels
+        shm = shared_memory.SharedMemory(create=True, size=RING_HEADER_BYTES + slots * slot_bytes)
+        RING_HEADER.pack_into(shm.buf, 0, MAGIC, LAYOUT_VERSION, slots, slot_bytes)
+        for slot in range(slots):
+            SLOT_HEADER.pack_into(shm.buf, RING_HEADER_BYTES + slot * slot_bytes, 0, 0, 0, 0)
+        return cls(shm, slots, slot_bytes, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'FrameRing':
+        """Open an existing ring by name (client side)."""
+        shm = shared_memory.SharedMemory(name=name)
+        magic, version, slots, slot_bytes = RING_HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            shm.close()
+            raise ValueError(f"not a frame ring: {name}")
+        return cls(shm, slots, slot_bytes, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def describe(self) -> Dict[str, Any]:
+        """What a client needs to open and fill the ring."""
+        return {
+            'name': self.name,
+            'slots': self.slots,
+            'slot_bytes': self.slot_bytes,
+            'ring_header_bytes': RING_HEADER_BYTES,
+            'slot_header_bytes': SLOT_HEADER_BYTES,
+            'layout_version': LAYOUT_VERSION,
+        }
+
+    def _offset(self, slot: int) -> int:
+        if not 0 <= slot < self.slots:
+            raise ValueError(f"slot out of range: {slot}")
+        return RING_HEADER_BYTES + slot * self.slot_bytes
+
+    def slot_seq(self, slot: int) -> int:
+        return SLOT_HEADER.unpack_from(self.shm.buf, self._offset(slot))[0]
+
+    def write(self, slot: int, seq: int, frame: np.ndarray):
+        """Copy a BGR frame into `slot`, publishing it under `seq` (client side)."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        if SLOT_HEADER_BYTES + frame.nbytes > self.slot_bytes:
+            raise ValueError('frame does not fit the ring slot')
+        offset = self._offset(slot)
+        # invalidate first so a reader never pairs the new pixels with the old seq
+        SLOT_HEADER.pack_into(self.shm.buf, offset, 0, 0, 0, 0)
+        pixels = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset + SLOT_HEADER_BYTES)
+        pixels[...] = frame
+        SLOT_HEADER.pack_into(self.shm.buf, offset, seq, height, width, channels)
+
+    def view(self, slot: int, seq: int) -> Optional[np.ndarray]:
+        """Zero-copy view of the frame in `slot` if it still holds `seq`, else None.
+
+        The view aliases shared memory: use it before releasing the slot and check
+        `slot_seq(slot) == seq` afterwards to make sure it was not overwritten.
+        """
+        offset = self._offset(slot)
+        current, height, width, channels = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if current != seq or not height or not width:
+            return None
+        if SLOT_HEADER_BYTES + height * width * channels > self.slot_bytes:
+            return None
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset + SLOT_HEADER_BYTES)
+
+    def close(self):
+        """Detach; the owner also removes the segment."""
+        try:
+            self.shm.close()
+        except BufferError:
+            # a view is still alive somewhere; the mapping goes away with it
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,146 @@
+"""Process-wide load shedding driven by event-loop lag and vision queue depth.
+
+A sampler task sleeps `LOAD_SAMPLE_MS` at a time and measures how late it wakes
+up (event-loop lag); it also reads how many frames are waiting for the vision
+worker pool. Each sample maps to a pressure level, and the governor escalates to it
+once it has seen `_ESCALATE_AFTER` samples in a row at or above it. It steps back
+down one level only after `_RECOVER_AFTER` samples in a row below half of the
+current level's thresholds, so it does not flap around a threshold.
+
+Levels, each including the measures of the levels below it:
+  0 normal
+  1 skip_detectors:  frames are analysed at the cheapest quality level, without
+                     optional detectors
+  2 latest_only:     a frame is dropped when a newer one from the same session is
+                     already waiting
+  3 reject_sessions: new `/ws` sessions are refused with a retry-after
+
+Tunables (environment):
+  - LOAD_SAMPLE_MS: sampling interval (default 100)
+  - LOAD_LAG_MS: event-loop lag thresholds for levels 1,2,3 (default "50,150,400")
+  - LOAD_QUEUE_DEPTH: vision queue thresholds for levels 1,2,3 (default "32,96,192")
+  - LOAD_RETRY_AFTER: seconds rejected clients are told to wait (default 5)
+"""
+import asyncio
+import os
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+def _thresholds(name: str, default: str) -> Tuple[float, ...]:
+    return tuple(float(v) for v in os.getenv(name, default).split(','))
+
+
+LOAD_SAMPLE_MS = float(os.getenv('LOAD_SAMPLE_MS', '100'))
+LOAD_LAG_MS = _thresholds('LOAD_LAG_MS', '50,150,400')
+LOAD_QUEUE_DEPTH = _thresholds('LOAD_QUEUE_DEPTH', '32,96,192')
+LOAD_RETRY_AFTER = int(os.getenv('LOAD_RETRY_AFTER', '5'))
+
+NORMAL, SKIP_DETECTORS, LATEST_ONLY, REJECT_SESSIONS = range(4)
+LEVEL_NAMES = ('normal', 'skip_detectors', 'latest_only', 'reject_sessions')
+
+_ESCALATE_AFTER = 2   # consecutive samples at a higher level before escalating
+_RECOVER_AFTER = 20   # consecutive samples well below the current level before stepping down
+
+
+def _level_for(value: float, thresholds: Sequence[float]) -> int:
+    return sum(value >= t for t in thresholds)
+
+
+class LoadGovernor:
+    """Turns load samples into a shedding level with hysteresis."""
+
+    def __init__(self, lag_ms: Sequence[float] = LOAD_LAG_MS, queue_depth: Sequence[float] = LOAD_QUEUE_DEPTH,
+                 retry_after: int = LOAD_RETRY_AFTER):
+        self.lag_thresholds = tuple(lag_ms)
+        self.queue_thresholds = tuple(queue_depth)
+        self.retry_after = retry_after
+        self.level = NORMAL
+        self.lag_ms = 0.0
+        self.queue_depth = 0
+        self.shed: Dict[str, int] = {name: 0 for name in LEVEL_NAMES[1:]}
+        self._above = 0
+        self._below = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(self, lag_ms: float, queue_depth: int) -> int:
+        """Record one sample and return the (possibly changed) level."""
+        self.lag_ms = lag_ms
+        self.queue_depth = queue_depth
+        target = max(_level_for(lag_ms, self.lag_thresholds), _level_for(queue_depth, self.queue_thresholds))
+        if target > self.level:
+            self._above += 1
+            self._below = 0
+            if self._above >= _ESCALATE_AFTER:
+                self.level = target
+                self._above = 0
+        elif self.level and self._well_below(lag_ms, queue_depth):
+            self._below += 1
+            self._above = 0
+            if self._below >= _RECOVER_AFTER:
+                self.level -= 1
+                self._below = 0
+        else:
+            self._above = self._below = 0
+        return self.level
+
+    def _well_below(self, lag_ms: float, queue_depth: int) -> bool:
+        i = self.level - 1
+        return lag_ms < self.lag_thresholds[i] / 2 and queue_depth < self.queue_thresholds[i] / 2
+
+    @property
+    def skip_detectors(self) -> bool:
+        return self.level >= SKIP_DETECTORS
+
+    @property
+    def latest_only(self) -> bool:
+        return self.level >= LATEST_ONLY
+
+    @property
+    def rejecting_sessions(self) -> bool:
+        return self.level >= REJECT_SESSIONS
+
+    def record_shed(self, kind: str):
+        self.shed[kind] += 1
+
+    def ensure_sampling(self, queue_depth: Callable[[], int], interval_ms: float = LOAD_SAMPLE_MS):
+        """Start the sampler on the running event loop if it is not running there yet."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._sample(queue_depth, interval_ms / 1000.0))
+
+    async def stop_sampling(self):
+        """Cancel the sampler (app shutdown)."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _sample(self, queue_depth: Callable[[], int], interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.observe(lag * 1000.0, queue_depth())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'level': self.level,
+            'state': LEVEL_NAMES[self.level],
+            'lag_ms': round(self.lag_ms, 2),
+            'queue_depth': self.queue_depth,
+            'shed': dict(self.shed),
+        }
+
+
+_governor: Optional[LoadGovernor] = None
+
+
+def get_governor() -> LoadGovernor:
+    global _governor
+    if _governor is None:
+        _governor = LoadGovernor()
+    return _governor
@@ -1,7 +1,15 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
+from fastapi.responses import StreamingResponse
+import asyncio
 import base64
+import functools
 import json
+import math
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
 
 # Set default env vars to prevent import crashes
 os.environ.setdefault('SUPABASE_URL', 'dummy')
@@ -37,6 +45,38 @@ except Exception as e:
     HAS_VISION = False
     print(f"Vision module failed to import: {e}")
 
+try:
+    from . import vision_cache
+    HAS_VISION_CACHE = True
+except Exception as e:
+    vision_cache = None
+    HAS_VISION_CACHE = False
+    print(f"Vision cache module failed to import: {e}")
+
+try:
+    from . import vision_batch
+    HAS_VISION_BATCH = True
+except Exception as e:
+    vision_batch = None
+    HAS_VISION_BATCH = False
+    print(f"Vision batch module failed to import: {e}")
+
+try:
+    from . import snapshot
+    HAS_SNAPSHOT = True
+except Exception as e:
+    snapshot = None
+    HAS_SNAPSHOT = False
+    print(f"Snapshot module failed to import: {e}")
+
+try:
+    from . import frame_ring
+    HAS_FRAME_RING = True
+except Exception as e:
+    frame_ring = None
+    HAS_FRAME_RING = False
+    print(f"Frame ring module failed to import: {e}")
+
 try:
     from . import trading_advisor
     HAS_TRADING_ADVISOR = True
@@ -101,7 +141,85 @@ except Exception as e:
     HAS_PORTFOLIO = False
     print(f"Portfolio module failed to import: {e}")
 
-app = FastAPI()
+try:
+    from . import provider_client
+    HAS_PROVIDER_CLIENT = True
+except Exception as e:
+    provider_client = None
+    HAS_PROVIDER_CLIENT = False
+    print(f"Provider client failed to import: {e}")
+
+try:
+    from . import price_feed
+    HAS_PRICE_FEED = True
+except Exception as e:
+    price_feed = None
+    HAS_PRICE_FEED = False
+    print(f"Price feed failed to import: {e}")
+
+try:
+    from . import price_fanout
+    HAS_PRICE_FANOUT = True
+except Exception as e:
+    price_fanout = None
+    HAS_PRICE_FANOUT = False
+    print(f"Price fan-out failed to import: {e}")
+
+from . import load_governor
+from . import overlays
+from . import rate_limit
+from . import sessions
+from . import ws_channels
+from . import ws_outbound
+
+
+def _refresh_price_feed():
+    """Let the streaming feed pick up changed alerts, positions or viewers."""
+    if HAS_PRICE_FEED:
+        price_feed.get_feed().refresh()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled keep-alive connections to price providers for the life of the app
+    if HAS_PROVIDER_CLIENT:
+        await provider_client.start()
+    # Sample event-loop lag from the start, not from the first /health or /ws
+    governor = _governor()
+    # Evaluate alerts in worker processes, each streaming its own symbols
+    shards = None
+    if HAS_PRICE_ALERTS and price_alerts.alert_shards.ALERT_SHARDS > 0:
+        shards = await price_alerts.start_shards()
+    # Stream prices for everything with alerts, positions or viewers
+    feed = price_feed.get_feed() if HAS_PRICE_FEED and price_feed.PRICE_FEED_ENABLED else None
+    if feed is not None:
+        if shards is None:
+            feed.add_source('alerts', price_alerts.alert_symbols)
+        if HAS_PORTFOLIO:
+            feed.add_source('positions', portfolio.get_open_symbols)
+        if HAS_PRICE_FANOUT:
+            # Live viewers share the stream; the fan-out only polls while it is down
+            fanout = price_fanout.get_fanout()
+            feed.add_source('viewers', fanout.symbols)
+            feed.add_listener(fanout.publish)
+            fanout.upstream_live = lambda: feed.connected
+            fanout.on_change = feed.refresh
+        await feed.start()
+    try:
+        yield
+    finally:
+        if feed is not None:
+            await feed.stop()
+            if HAS_PRICE_FANOUT:
+                feed.remove_listener(price_fanout.get_fanout().publish)
+        if shards is not None:
+            await price_alerts.stop_shards()
+        await governor.stop_sampling()
+        if HAS_PROVIDER_CLIENT:
+            await provider_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get('/')
@@ -109,107 +227,627 @@ async def root():
     return {"status": "TradeSensei AI backend running", "opencv": HAS_OPENCV, "numpy": HAS_NUMPY, "supabase": HAS_SUPABASE}
 
 
+def _vision_queue_depth() -> int:
+    if HAS_VISION_BATCH and vision_batch._batcher is not None:
+        return vision_batch._batcher.queue_depth()
+    return 0
+
+
+def _governor() -> load_governor.LoadGovernor:
+    """The process-wide load governor, sampling on the running event loop.
+
+    The app's lifespan starts the sampler; starting it here as well covers code
+    running without the lifespan (e.g. a TestClient outside a `with` block).
+    """
+    governor = load_governor.get_governor()
+    governor.ensure_sampling(_vision_queue_depth)
+    return governor
+
+
 @app.get('/health')
 async def health():
     """Health check endpoint for Railway."""
-    return {"status": "healthy", "opencv": HAS_OPENCV, "numpy": HAS_NUMPY, "supabase": HAS_SUPABASE}
+    return {"status": "healthy", "opencv": HAS_OPENCV, "numpy": HAS_NUMPY, "supabase": HAS_SUPABASE,
+            "load": _governor().stats()}
+
+
+@app.get('/metrics')
+async def metrics():
+    """Runtime counters for monitoring."""
+    result = {}
+    if HAS_VISION_CACHE:
+        result["vision_cache"] = vision_cache.get_shared_cache().stats()
+    if HAS_VISION_BATCH and vision_batch._batcher is not None:
+        result["vision_batch"] = vision_batch._batcher.stats()
+    if HAS_SNAPSHOT:
+        result["snapshot_cache"] = snapshot.cache_stats()
+    result["sessions"] = len(sessions.active_sessions)
+    result["session_resume"] = sessions.resume_stats()
+    levels = {}
+    for session in sessions.active_sessions.values():
+        levels[session.flow.level] = levels.get(session.flow.level, 0) + 1
+    result["flow_control"] = {"sessions_by_level": levels}
+    result["ws_outbound"] = ws_outbound.stats()
+    result["ws_channels"] = ws_channels.stats()
+    result["rate_limit"] = rate_limit.get_limiter().stats()
+    result["load_governor"] = _governor().stats()
+    if HAS_PRICE_ALERTS:
+        result["price_cache"] = price_alerts.price_cache.stats()
+        result["price_providers"] = price_alerts.price_providers.get_fetcher().stats()
+        result["upstream_budget"] = price_alerts.upstream_budget.get_budgets().stats()
+        result["alert_engine"] = price_alerts.alert_conditions.stats()
+        shards = price_alerts.alert_shards.get_shards()
+        if shards is not None:
+            result["alert_shards"] = await shards.stats()
+    if HAS_PRICE_FEED:
+        result["price_feed"] = price_feed.get_feed().stats()
+    return result
+
+
+# Seconds a checked access token is trusted before it is verified again
+AUTH_TOKEN_CACHE_SECONDS = float(os.getenv('AUTH_TOKEN_CACHE_SECONDS', '60'))
+_AUTH_TOKEN_CACHE_MAX = 10000
+# Rejected tokens are remembered apart, so a flood of bogus ones cannot push out valid ones
+_AUTH_REJECTED_CACHE_MAX = 1000
+# access token -> (user id, expiry)
+_verified_tokens: dict = {}
+# access token -> expiry, oldest first
+_rejected_tokens: OrderedDict = OrderedDict()
+
+
+async def _authenticated_user(conn) -> Optional[str]:
+    """The user whose access token (from /auth/signin) a request or WebSocket carries.
+
+    The token comes from `Authorization: Bearer ...` or, for WebSocket clients that
+    cannot set headers, the `access_token` query parameter. None when it is missing
+    or invalid; a bare `user_id` the client supplies is never trusted.
+
+    A token not seen recently is checked with Supabase, which costs the client one
+    `auth_verify` token; past that limit its unknown tokens count as anonymous.
+    """
+    auth = conn.headers.get('authorization', '')
+    token = auth[7:].strip() if auth.lower().startswith('bearer ') else conn.query_params.get('access_token')
+    if not token or not HAS_SUPABASE:
+        return None
+    now = time.monotonic()
+    cached = _verified_tokens.get(token)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    if _rejected_tokens.get(token, 0.0) > now:
+        return None
+    if rate_limit.check(_client_key(conn.client), 'auth_verify', 'free'):
+        return None
+    user_id = await supabase.verify_access_token(token)
+    expiry = time.monotonic() + AUTH_TOKEN_CACHE_SECONDS
+    if user_id:
+        if len(_verified_tokens) >= _AUTH_TOKEN_CACHE_MAX:
+            _verified_tokens.clear()
+        _verified_tokens[token] = (user_id, expiry)
+    else:
+        _rejected_tokens.pop(token, None)
+        _rejected_tokens[token] = expiry
+        while len(_rejected_tokens) > _AUTH_REJECTED_CACHE_MAX:
+            _rejected_tokens.popitem(last=False)
+    return user_id
+
+
+def _client_key(client, user_id=None) -> str:
+    """Rate-limit identity: the client address, plus the user when authenticated."""
+    key = f"ip:{client.host if client is not None else 'unknown'}"
+    return f"{key}|user:{user_id}" if user_id else key
+
+
+def _user_tier(user_id) -> str:
+    """Subscription tier of an authenticated user; anonymous clients are free."""
+    return subscriptions.get_user_tier(user_id) if user_id and HAS_SUBSCRIPTIONS else 'free'
+
+
+async def _enforce_rate_limit(request: Request, endpoint: str):
+    """Reject the request with 429 if the client is over its tier's limit for `endpoint`."""
+    user_id = await _authenticated_user(request)
+    retry_after = rate_limit.check(_client_key(request.client, user_id), endpoint, _user_tier(user_id))
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+async def _analyze_frame(img, quality=0, session_id=None, tier='free'):
+    """Run the vision pipeline on a decoded frame.
+
+    Goes through the shared content-addressed cache first, then the cross-session
+    micro-batcher on the vision worker pool, which schedules sessions fairly by
+    subscription `tier` (and may raise `vision_batch.LoadShed` under overload).
+    `quality` indexes `vision.QUALITY_LEVELS`; reduced-quality results are cached
+    separately.
+    """
+    variant = f"-q{quality}" if quality else ''
+    if HAS_VISION_BATCH:
+        compute = functools.partial(vision_batch.get_batcher().submit, quality=quality,
+                                    session_id=session_id, tier=tier)
+        if HAS_VISION_CACHE:
+            return await vision_cache.get_features_async(img, compute, vision.VISION_VERSION, variant)
+        return await compute(img)
+    pyramid, detectors = vision.QUALITY_LEVELS[quality]
+    compute = functools.partial(vision.detect_chart_features, pyramid=pyramid, detectors=detectors)
+    if HAS_VISION_CACHE:
+        return vision_cache.get_features(img, compute, vision.VISION_VERSION, variant)
+    return compute(img)
+
+
+# Optional protocol features a client can opt into with {"type": "hello", "capabilities": [...]}
+WS_CAPABILITIES = ('overlay_delta',)
+
+# Multiplexed channels on /ws (see ws_channels)
+WS_AUDIO_MAX_BYTES = int(os.getenv('WS_AUDIO_MAX_BYTES', str(10 * 1024 * 1024)))
+WS_AUDIO_CHUNK_BYTES = int(os.getenv('WS_AUDIO_CHUNK_BYTES', '16384'))
+
+
+def _is_local_client(ws: WebSocket) -> bool:
+    """Shared-memory transport only makes sense for clients on this machine."""
+    return ws.client is not None and ws.client.host in ('127.0.0.1', '::1', 'localhost')
+
+
+# Consecutive rate-limited messages after which a /ws client is disconnected
+WS_RATE_LIMIT_STRIKES = int(os.getenv('WS_RATE_LIMIT_STRIKES', '20'))
+
+# Close codes for clients over their rate limit
+WS_TRY_AGAIN_LATER_CODE = 1013
+WS_POLICY_VIOLATION_CODE = 1008
+
+
+def _ws_rate_limit_endpoint(channel, data):
+    """Rate-limit bucket for an inbound /ws message, or None if it is not limited."""
+    kind = data.get('type')
+    if kind in ('frame', 'shm_frame') and channel in ('chart', 'webcam'):
+        return 'ws_frame'
+    if channel == 'audio':
+        return {'end': 'transcribe', 'tts': 'tts'}.get(kind)
+    if channel == 'mentor' and kind == 'ask':
+        return 'mentor'
+    return None
+
+
+class SlowConsumer(Exception):
+    """The client is not reading its outbound messages fast enough."""
+
+
+class RateLimited(Exception):
+    """The client kept sending after being told it is over its rate limit."""
 
 
 @app.websocket('/ws')
 async def websocket_endpoint(ws: WebSocket):
     await ws.accept()
-    try:
+    # Admission control before any session state is built
+    auth_user = await _authenticated_user(ws)
+    tier = _user_tier(auth_user)
+    retry_after = rate_limit.check(_client_key(ws.client, auth_user), 'ws_connect', tier)
+    if retry_after:
+        await ws.close(code=WS_TRY_AGAIN_LATER_CODE, reason=f"rate limited, retry after {math.ceil(retry_after)}s")
+        return
+    governor = _governor()
+    # Reattach the client's previous session if it reconnects within the resume window
+    session = sessions.resume_session(ws.query_params.get('resume'))
+    resumed = session is not None
+    if resumed:
+        session.overlay_state.request_snapshot()
+        session.keyed_overlays = overlays.KeyedOverlayTracker()
+    elif governor.rejecting_sessions:
+        # Overloaded: existing sessions may resume, new ones come back later
+        governor.record_shed('reject_sessions')
+        await ws.close(code=WS_TRY_AGAIN_LATER_CODE, reason=f"server overloaded, retry after {governor.retry_after}s")
+        return
+    else:
+        session = sessions.open_session()
+    outbound = ws_outbound.OutboundQueue()
+    writer = asyncio.create_task(ws_outbound.run_writer(ws, outbound))
+    loop = asyncio.get_running_loop()
+    price_subscription = None
+    strikes = 0
+
+    def send(msg, key=None, channel=None):
+        """Queue a message; chart messages (no channel) go out without a `ch` field."""
+        priority = ws_outbound.DEFAULT_PRIORITY
+        if channel is not None:
+            msg = {"ch": channel, **msg}
+            priority = ws_channels.CHANNELS[channel].priority
+        if not outbound.put(msg, key, priority):
+            raise SlowConsumer()
+
+    async def send_stream(msg, channel):
+        """Queue one piece of a bulk stream, waiting for room instead of failing."""
+        await outbound.put_wait({"ch": channel, **msg}, ws_channels.CHANNELS[channel].priority)
+
+    def shed_frame(data):
+        """Drop a frame under load; the client just sends its next one."""
+        if data.get('type') == 'shm_frame':
+            # nothing holds the slot any more; let the client reuse it
+            send({"type": "shm_release", "seq": data.get('seq')}, 'shm_release')
+        send({"type": "info", "message": "frame_shed"}, 'frame_shed')
+
+    async def on_chart(data):
+        if not HAS_OPENCV or not HAS_NUMPY:
+            send({"type": "error", "message": "OpenCV or NumPy not available"})
+            return
+        if governor.latest_only and router.pending('chart'):
+            # a newer frame is already waiting
+            governor.record_shed('latest_only')
+            shed_frame(data)
+            return
+        started = loop.time()
+        # Chart messages from earlier frames the client has not read yet; price ticks
+        # and audio queued in the more urgent lanes say nothing about keeping up with frames
+        backlog = outbound.depth(ws_channels.CHANNELS['chart'].priority)
+        shm_seq = None
+        if data.get('type') == 'shm_frame':
+            # Raw pixels in the shared-memory ring; analysed in place without a copy
+            ring = session.frame_ring
+            try:
+                slot, shm_seq = int(data.get('slot')), int(data.get('seq'))
+                img = ring.view(slot, shm_seq) if ring is not None else None
+            except (TypeError, ValueError):
+                img = None
+            if img is None:
+                if shm_seq is not None:
+                    # nothing holds the slot any more; let the client reuse it
+                    send({"type": "shm_release", "seq": shm_seq}, 'shm_release')
+                send({"type": "error", "message": "invalid shared-memory frame"})
+                return
+            frame_key = None
+        else:
+            try:
+                img_bytes = base64.b64decode(data.get('data'))
+                nparr = np.frombuffer(img_bytes, np.uint8)
+                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                if img is None:
+                    raise ValueError('undecodable frame')
+            except Exception:
+                send({"type": "error", "message": "invalid image"})
+                return
+            frame_key = vision_cache.bytes_digest(img_bytes) if HAS_VISION_CACHE else None
+
+        # The frame payload may name the user; the tier comes only from the authenticated one
+        user_id = data.get('user_id') if isinstance(data, dict) else None
+        if user_id:
+            session.user_id = user_id
+
+        quality = session.flow.level
+        if governor.skip_detectors:
+            governor.record_shed('skip_detectors')
+            quality = session.flow.max_level
+        try:
+            features = await _analyze_frame(img, quality, session.session_id, tier)
+        except Exception as e:
+            if not HAS_VISION_BATCH or not isinstance(e, vision_batch.LoadShed):
+                raise
+            shed_frame(data)
+            return
+
+        if shm_seq is not None:
+            # Slots are released cumulatively; the client must not reuse one before that
+            overwritten = ring is not session.frame_ring or ring.slot_seq(slot) != shm_seq
+            if not overwritten:
+                # keep our own copy for snapshots, the slot is about to be reused
+                img = img.copy()
+            send({"type": "shm_release", "seq": shm_seq}, 'shm_release')
+            if overwritten:
+                send({"type": "error", "message": "shared-memory frame overwritten during analysis"})
+                return
+
+        # Track trendlines across frames; the advisor also sees breakouts.
+        # Cached features are shared between sessions, so merge into a copy.
+        trend = session.trendlines.update(features)
+        advisor_features = {**features, **trend}
+
+        # Evaluate trading advisor (prototype)
+        try:
+            signal = trading_advisor.evaluate(advisor_features)
+        except Exception:
+            signal = None
+
+        commands = overlays.build_frame_overlays(features, tier, signal)
+        commands += overlays.build_indicator_polylines(features)
+        commands += overlays.build_trendline_overlays(trend['trendlines'])
+        # Overlay messages still queued for a slow client are stale and get replaced
+        if 'overlay_delta' in session.capabilities:
+            msg = session.overlay_state.diff(commands)
+            if msg and outbound.pending('overlay'):
+                # the queued delta was never sent, so a later delta no longer applies
+                msg = session.overlay_state.snapshot()
+            if msg:
+                send(msg, 'overlay')
+        else:
+            for cmd in session.keyed_overlays.filter(commands):
+                send(cmd, ('overlay', cmd['id']))
+
+        # Keep what the client is showing so snapshots can be rendered server-side
+        session.latest_frame = img
+        session.latest_frame_key = frame_key
+        session.latest_overlays = commands
+
+        # Adapt analysis quality and the client's capture rate to how this session keeps up,
+        # never advising more frames than its tier may send
+        session.flow.cap_fps(rate_limit.sustained_rate('ws_frame', tier))
+        advice = session.flow.observe((loop.time() - started) * 1000.0, backlog)
+        if advice:
+            send(advice, 'flow_control')
+
+        # Heartbeat
+        send({"type": "info", "message": "processed_frame"}, 'processed_frame')
+
+    async def on_webcam(data):
+        if data.get('type') != 'frame':
+            send({"type": "error", "message": "unknown message type"}, channel='webcam')
+            return
+        if not HAS_WEBCAM_VISION:
+            send({"type": "error", "message": "webcam vision not available"}, channel='webcam')
+            return
+        if governor.latest_only and router.pending('webcam'):
+            governor.record_shed('latest_only')
+            send({"type": "info", "message": "frame_shed"}, 'frame_shed', 'webcam')
+            return
+        try:
+            result = await loop.run_in_executor(None, webcam_vision.analyze_base64_image, data.get('data') or '')
+        except Exception as e:
+            send({"type": "result", "ok": False, "error": str(e)}, 'webcam_result', 'webcam')
+            return
+        send({"type": "result", "ok": True, "result": result}, 'webcam_result', 'webcam')
+
+    async def on_audio(data):
+        kind = data.get('type')
+        if kind == 'chunk':
+            try:
+                chunk = base64.b64decode(data.get('data') or '')
+            except Exception:
+                send({"type": "error", "message": "invalid audio chunk"}, channel='audio')
+                return
+            if len(session.audio_buffer) + len(chunk) > WS_AUDIO_MAX_BYTES:
+                session.audio_buffer.clear()
+                send({"type": "error", "message": "audio too large"}, channel='audio')
+                return
+            session.audio_buffer += chunk
+        elif kind == 'end':
+            audio = bytes(session.audio_buffer)
+            session.audio_buffer.clear()
+            if not HAS_SPEECH:
+                send({"type": "error", "message": "speech not available"}, channel='audio')
+                return
+            text = await loop.run_in_executor(None, speech.transcribe_audio_bytes, audio, data.get('api_key'))
+            send({"type": "transcription", "text": text}, channel='audio')
+        elif kind == 'tts':
+            if not HAS_SPEECH:
+                send({"type": "error", "message": "speech not available"}, channel='audio')
+                return
+            synthesize = functools.partial(speech.synthesize_text_to_audio_bytes, data.get('text', ''),
+                                           api_key=data.get('api_key'), **({'voice': data['voice']} if data.get('voice') else {}))
+            audio = await loop.run_in_executor(None, synthesize)
+            chunks = 0
+            for start in range(0, len(audio), WS_AUDIO_CHUNK_BYTES):
+                piece = base64.b64encode(audio[start:start + WS_AUDIO_CHUNK_BYTES]).decode('ascii')
+                await send_stream({"type": "tts_chunk", "seq": chunks, "data": piece}, 'audio')
+                chunks += 1
+            send({"type": "tts_end", "chunks": chunks}, channel='audio')
+        else:
+            send({"type": "error", "message": "unknown message type"}, channel='audio')
+
+    def deliver_ticks(ticks):
+        """Fan-out callback: one coalesced batch of the newest tick per symbol."""
+        try:
+            for tick in ticks:
+                # only the newest tick per symbol is worth sending
+                send({"type": "tick", **_tick_payload(tick)}, ('price', tick['symbol']), 'prices')
+        except SlowConsumer as e:
+            if not router.failed.done():
+                router.failed.set_exception(e)
+
+    async def on_prices(data):
+        kind = data.get('type')
+        normalize = price_fanout.normalize_symbol if HAS_PRICE_FANOUT else (lambda s: str(s).upper())
+        symbols = {normalize(s) for s in data.get('symbols') or []}
+        if kind == 'subscribe':
+            session.price_symbols |= symbols
+        elif kind == 'unsubscribe':
+            session.price_symbols -= symbols
+        else:
+            send({"type": "error", "message": "unknown message type"}, channel='prices')
+            return
+        send({"type": "subscribed", "symbols": sorted(session.price_symbols)}, channel='prices')
+        if price_subscription is not None:
+            price_subscription.update(add=session.price_symbols, remove=price_subscription.symbols - session.price_symbols)
+
+    async def on_mentor(data):
+        if data.get('type') != 'ask':
+            send({"type": "error", "message": "unknown message type"}, channel='mentor')
+            return
+        request_id = data.get('request_id')
+        if not HAS_MENTOR:
+            send({"type": "error", "request_id": request_id, "message": "mentor not available"}, channel='mentor')
+            return
+        pieces = mentor.stream_mentor_response(data.get('user_input', ''), data.get('context'),
+                                               data.get('conversation_history') or [], data.get('vision_context'),
+                                               data.get('language', 'en'), data.get('openai_key'))
+        parts = []
+        while True:
+            piece = await loop.run_in_executor(None, next, pieces, None)
+            if piece is None:
+                break
+            parts.append(piece)
+            await send_stream({"type": "chunk", "request_id": request_id, "text": piece}, 'mentor')
+        send({"type": "done", "request_id": request_id, "response": "".join(parts)}, channel='mentor')
+
+    router = ws_channels.ChannelRouter({
+        'chart': on_chart,
+        'webcam': on_webcam,
+        'audio': on_audio,
+        'prices': on_prices,
+        'mentor': on_mentor,
+    })
+
+    # Ticks come from the shared fan-out, never from a per-connection poller
+    if HAS_PRICE_FANOUT:
+        price_subscription = price_fanout.get_fanout().subscribe(deliver_ticks)
+        price_subscription.update(add=session.price_symbols)
+
+    async def read_loop():
+        nonlocal strikes
         while True:
             data = await ws.receive_json()
-
-            if data.get('type') == 'frame':
-                b64 = data.get('data')
-                if not HAS_OPENCV or not HAS_NUMPY:
-                    await ws.send_json({"type": "error", "message": "OpenCV or NumPy not available"})
+            channel = data.get('ch') or 'chart'
+            if channel not in ws_channels.CHANNELS:
+                send({"type": "error", "message": f"unknown channel: {channel}"})
+                continue
+
+            # Rate limits apply before anything is decoded or queued
+            endpoint = _ws_rate_limit_endpoint(channel, data)
+            if endpoint:
+                retry_after = rate_limit.check(_client_key(ws.client, auth_user), endpoint, tier)
+                if retry_after:
+                    strikes += 1
+                    if strikes > WS_RATE_LIMIT_STRIKES:
+                        raise RateLimited()
+                    if data.get('type') == 'shm_frame':
+                        send({"type": "shm_release", "seq": data.get('seq')}, 'shm_release')
+                    send({"type": "error", "message": "rate_limited", "retry_after": round(retry_after, 3)},
+                         ('rate_limited', channel), None if channel == 'chart' else channel)
+                    continue
+                strikes = 0
+
+            if channel != 'chart' or data.get('type') in ('frame', 'shm_frame'):
+                if router.dispatch(channel, data) == 'rejected':
+                    send({"type": "error", "message": "channel busy"}, channel=channel)
+
+            # Connection-level messages are cheap and handled inline
+            elif data.get('type') == 'hello':
+                requested = data.get('capabilities') or []
+                session.capabilities = {c for c in requested if c in WS_CAPABILITIES}
+                session.overlay_state.request_snapshot()
+                send({"type": "hello", "session_id": session.session_id, "capabilities": sorted(session.capabilities),
+                      "channels": sorted(ws_channels.CHANNELS)})
+
+            elif data.get('type') == 'shm_attach':
+                # Same-host clients can hand frames over in shared memory instead of PNG/base64
+                if not (HAS_FRAME_RING and HAS_NUMPY and frame_ring.FRAME_RING_ENABLED and _is_local_client(ws)):
+                    send({"type": "error", "message": "shared-memory transport not available"})
                     continue
                 try:
-                    img_bytes = base64.b64decode(b64)
-                    nparr = np.frombuffer(img_bytes, np.uint8)
-                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                except Exception:
-                    await ws.send_json({"type": "error", "message": "invalid image"})
+                    ring = frame_ring.FrameRing.create(int(data.get('width', 0)), int(data.get('height', 0)),
+                                                       int(data.get('slots') or frame_ring.FRAME_RING_SLOTS))
+                except (TypeError, ValueError, OSError) as e:
+                    send({"type": "error", "message": f"shm_attach failed: {e}"})
                     continue
+                if session.frame_ring is not None:
+                    session.frame_ring.close()
+                session.frame_ring = ring
+                send({"type": "shm_attached", **ring.describe()})
 
-                # Run vision pipeline
-                features = vision.detect_chart_features(img)
-
-                # If a POI was detected, send a rectangle + label
-                poi = features.get('poi')
-                if poi:
-                    x, y = poi
-                    h, w = img.shape[:2]
-                    rect_w, rect_h = 120, 60
-                    rect_x = max(0, x - rect_w // 2)
-                    rect_y = max(0, y - rect_h // 2)
-                    overlay_rect = {"type": "overlay", "action": "draw_rect", "x": int(rect_x), "y": int(rect_y), "w": int(rect_w), "h": int(rect_h)}
-                    await ws.send_json(overlay_rect)
-
-                    overlay_text = {"type": "overlay", "action": "draw_text", "x": int(rect_x), "y": int(rect_y) - 18, "text": "POI"}
-                    await ws.send_json(overlay_text)
-
-                # Evaluate trading advisor (prototype)
-                try:
-                    signal = trading_advisor.evaluate(features)
-                    if signal:
-                        # Determine user tier (frame payload may include 'user_id')
-                        user_id = data.get('user_id') if isinstance(data, dict) else None
-                        tier = subscriptions.get_user_tier(user_id) if user_id else 'free'
-
-                        # Gate signals by tier: free -> no signals, pro -> limited, master -> full
-                        if tier == 'free':
-                            # Do not send trade signals to free users
-                            pass
-                        else:
-                            side = signal.get('side')
-                            price = signal.get('price')
-                            sl = signal.get('sl')
-                            tp1 = signal.get('tp1')
-
-                            if tier == 'pro':
-                                # Pro: send basic TP1 signal
-                                sig_text = f"{side} @ {price} TP1 {tp1}"
-                            else:
-                                # Master: full details
-                                sig_text = f"{side} @ {price} SL {sl} TP1 {tp1}"
-
-                            sig_cmd = {"type": "overlay", "action": "draw_text", "x": int(x), "y": int(y) - 36, "text": sig_text, "ttl": 8}
-                            await ws.send_json(sig_cmd)
-
-                            sig_rect = {"type": "overlay", "action": "draw_rect", "x": int(x - 60), "y": int(y - 20), "w": 120, "h": 40, "ttl": 8}
-                            await ws.send_json(sig_rect)
-                except Exception:
-                    pass
-
-                # Heartbeat
-                await ws.send_json({"type": "info", "message": "processed_frame"})
+            elif data.get('type') == 'overlay_sync':
+                # Client lost its overlay state; send everything with the next frame
+                session.overlay_state.request_snapshot()
 
             elif data.get('type') == 'ping':
-                await ws.send_json({"type": "pong"})
+                send({"type": "pong"}, 'pong')
             else:
-                await ws.send_json({"type": "error", "message": "unknown message type"})
+                send({"type": "error", "message": "unknown message type"})
+
+    reader = asyncio.create_task(read_loop())
+    try:
+        send({"type": "session", "session_id": session.session_id, "resume_token": session.resume_token, "resumed": resumed})
+        done, _ = await asyncio.wait({reader, router.failed}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
 
     except WebSocketDisconnect:
         print('Client disconnected')
+    except RateLimited:
+        print(f'Closing rate-limited client {session.session_id}')
+        try:
+            await ws.close(code=WS_POLICY_VIOLATION_CODE, reason="rate limit exceeded")
+        except Exception:
+            pass
+    except SlowConsumer:
+        ws_outbound.record_slow_consumer()
+        print(f'Closing slow consumer {session.session_id}')
+        try:
+            await ws.close(code=ws_outbound.SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
     except Exception as e:
         print('WS error', e)
         try:
             await ws.close()
         except Exception:
             pass
+    finally:
+        reader.cancel()
+        router.close()
+        outbound.close()
+        writer.cancel()
+        if HAS_VISION_BATCH and vision_batch._batcher is not None:
+            vision_batch._batcher.forget(session.session_id)
+        sessions.detach_session(session.session_id)
+        if price_subscription is not None:
+            price_subscription.close()
+
+
+@app.post('/snapshot')
+async def render_snapshot(payload: dict, request: Request):
+    """Render an annotated chart snapshot.
+
+    Expects JSON: {"session_id": "..."} to use a live session's latest frame and
+    overlays, or {"image_base64": "...", "overlays": [...]} for an explicit frame.
+    Optional: "format" ("jpeg" | "webp" | "png", default "jpeg"), "quality" (1-100).
+    Returns JSON: {"ok": true, "format": "...", "image_base64": "..."}
+    """
+    await _enforce_rate_limit(request, 'snapshot')
+    if not HAS_SNAPSHOT or not HAS_OPENCV:
+        raise HTTPException(status_code=503, detail="Snapshot rendering not available")
+    fmt = payload.get('format', 'jpeg')
+    if fmt not in snapshot.FORMATS:
+        return {"ok": False, "error": f"unsupported format: {fmt}"}
+    try:
+        quality = int(payload.get('quality', snapshot.SNAPSHOT_DEFAULT_QUALITY))
+    except (TypeError, ValueError):
+        quality = None
+    if quality is None or not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be an integer from 1 to 100")
+
+    session_id = payload.get('session_id')
+    if session_id:
+        session = sessions.get_session(session_id)
+        if session is None or session.latest_frame is None:
+            return {"ok": False, "error": "no frame for session"}
+        frame = session.latest_frame
+        frame_key = session.latest_frame_key
+        commands = payload.get('overlays', session.latest_overlays)
+    else:
+        b64 = payload.get('image_base64')
+        if not b64:
+            return {"ok": False, "error": "session_id or image_base64 required"}
+        try:
+            img_bytes = base64.b64decode(b64)
+            frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError('undecodable frame')
+        except Exception:
+            return {"ok": False, "error": "invalid image"}
+        frame_key = vision_cache.bytes_digest(img_bytes) if HAS_VISION_CACHE else None
+        commands = payload.get('overlays', [])
+
+    try:
+        data = await snapshot.render_snapshot_async(frame, commands, fmt, quality, frame_key)
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "format": fmt, "image_base64": base64.b64encode(data).decode('ascii')}
 
 
 @app.post('/tts')
-async def tts_endpoint(payload: dict):
+async def tts_endpoint(payload: dict, request: Request):
     """Synthesize text to audio (stub).
 
     Expects JSON: {"text": "...", "voice": "alloy", "api_key": "..."}
     Returns JSON: {"audio_base64": "..."}
     """
+    await _enforce_rate_limit(request, 'tts')
     text = payload.get('text', '')
     voice = payload.get('voice', 'alloy')
     api_key = payload.get('api_key')
@@ -220,12 +858,13 @@ async def tts_endpoint(payload: dict):
 
 
 @app.post('/transcribe')
-async def transcribe_endpoint(payload: dict):
+async def transcribe_endpoint(payload: dict, request: Request):
     """Transcribe audio bytes (stub).
 
     Expects JSON: {"audio_base64": "...", "api_key": "..."}
     Returns JSON: {"transcription": "..."}
     """
+    await _enforce_rate_limit(request, 'transcribe')
     import base64
     b64 = payload.get('audio_base64', '')
     api_key = payload.get('api_key')
@@ -344,8 +983,9 @@ async def webcam_analyze(payload: dict):
 
 
 @app.post('/mentor/ask')
-async def mentor_ask(payload: dict):
+async def mentor_ask(payload: dict, request: Request):
     """Get AI mentor response to a trading question."""
+    await _enforce_rate_limit(request, 'mentor')
     user_input = payload.get('user_input', '')
     context = payload.get('context')
     conversation_history = payload.get('conversation_history', [])
@@ -421,6 +1061,10 @@ async def create_price_alert(payload: dict):
     """Create a new price alert.
     
     Expects: {"user_id": "...", "symbol": "BTC", "condition": "above", "price": 50000, "notification_type": "app"}
+    Other conditions take their parameters instead of "price", e.g.
+    {"condition": "pct_move", "percent": -5}, {"condition": "cross_above_ma", "period": 50},
+    {"condition": "range_breakout", "low": 60000, "high": 70000},
+    {"condition": "volume_spike", "multiplier": 3, "period": 20} (see alert_engine).
     """
     try:
         user_id = payload.get('user_id')
@@ -429,7 +1073,9 @@ async def create_price_alert(payload: dict):
         price = payload.get('price')
         notification_type = payload.get('notification_type', 'app')
         
-        alert = price_alerts.create_alert(user_id, symbol, condition, price, notification_type)
+        params = {k: payload[k] for k in price_alerts.alert_engine.PARAMS if k in payload}
+        alert = price_alerts.create_alert(user_id, symbol, condition, price, notification_type, params)
+        _refresh_price_feed()
         return {"success": True, "alert": alert}
     except Exception as e:
         return {"error": str(e)}
@@ -450,23 +1096,120 @@ async def delete_alert(user_id: str, alert_id: str):
     """Delete an alert."""
     try:
         success = price_alerts.delete_alert(user_id, alert_id)
+        _refresh_price_feed()
         return {"success": success}
     except Exception as e:
         return {"error": str(e)}
 
 
+# Most symbols one /prices request may ask for
+PRICES_MAX_SYMBOLS = int(os.getenv('PRICES_MAX_SYMBOLS', '100'))
+
+
+def _price_payload(symbol, entry):
+    return {"symbol": symbol, "price": entry.price, "timestamp": datetime.fromtimestamp(entry.timestamp).isoformat()}
+
+
+def _tick_payload(tick):
+    """A price fan-out tick as sent to clients."""
+    return {"symbol": tick['symbol'], "price": tick['price'], "timestamp": datetime.fromtimestamp(tick['timestamp']).isoformat()}
+
+
+async def _split_known(symbols):
+    """Split symbols into (known, unknown) using the cached exchange info."""
+    known = await price_alerts.known_symbols()
+    if known is None:
+        # exchange info unavailable; let upstream decide
+        return symbols, []
+    return [s for s in symbols if s in known], [s for s in symbols if s not in known]
+
+
 @app.get('/price/{symbol}')
-async def get_price(symbol: str):
-    """Get current price for a symbol."""
+async def get_price(symbol: str, request: Request):
+    """Get current price for a symbol (cached for a few seconds)."""
+    await _enforce_rate_limit(request, 'price')
+    symbol = symbol.upper()
     try:
-        price = await price_alerts.get_binance_price(symbol)
-        if price:
-            return {"symbol": symbol, "price": price, "timestamp": datetime.now().isoformat()}
+        known, _ = await _split_known([symbol])
+        if not known:
+            return {"error": f"Unknown symbol {symbol}"}
+        entry = (await price_alerts.get_cached_prices([symbol])).get(symbol)
+        if entry:
+            return _price_payload(symbol, entry)
         return {"error": f"Could not fetch price for {symbol}"}
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.get('/prices')
+async def get_prices(symbols: str, request: Request):
+    """Get current prices for comma-separated `symbols`, served from the price cache.
+
+    Returns {"prices": {symbol: {...}}, "unknown": [...], "unavailable": [...]}.
+    """
+    await _enforce_rate_limit(request, 'price')
+    wanted = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if len(wanted) > PRICES_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {PRICES_MAX_SYMBOLS} symbols per request")
+    known, unknown = await _split_known(wanted)
+    prices = await price_alerts.get_cached_prices(known)
+    return {
+        "prices": {s: _price_payload(s, entry) for s, entry in prices.items()},
+        "unknown": unknown,
+        "unavailable": [s for s in known if s not in prices],
+    }
+
+
+# Seconds between SSE comments that keep idle /prices/stream connections open
+PRICE_STREAM_KEEPALIVE = float(os.getenv('PRICE_STREAM_KEEPALIVE', '15'))
+
+
+@app.get('/prices/stream')
+async def stream_prices(symbols: str, request: Request, max_rate: Optional[float] = None):
+    """Server-sent events with price ticks for comma-separated `symbols`.
+
+    Each event is {"symbol", "price", "timestamp"}; a client gets at most `max_rate`
+    updates per second per symbol (newest price wins). Ticks come from the shared
+    price fan-out, so many viewers of one symbol cost one upstream subscription.
+    """
+    await _enforce_rate_limit(request, 'price')
+    if not HAS_PRICE_FANOUT:
+        raise HTTPException(status_code=503, detail="Price streaming not available")
+    wanted = list(dict.fromkeys(price_fanout.normalize_symbol(s) for s in symbols.split(',') if s.strip()))
+    if len(wanted) > PRICES_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {PRICES_MAX_SYMBOLS} symbols per request")
+    known, unknown = await _split_known(wanted)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown symbols: {', '.join(unknown)}")
+    rate = min(max_rate or price_fanout.PRICE_STREAM_MAX_RATE, price_fanout.PRICE_STREAM_MAX_RATE)
+
+    async def events():
+        latest, ready = {}, asyncio.Event()
+
+        def deliver(ticks):
+            for tick in ticks:
+                latest[tick['symbol']] = tick
+            ready.set()
+
+        subscription = price_fanout.get_fanout().subscribe(deliver, rate)
+        subscription.update(add=known)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), PRICE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                ready.clear()
+                ticks, latest = list(latest.values()), {}
+                for tick in ticks:
+                    yield f"data: {json.dumps(_tick_payload(tick))}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
 # Portfolio Endpoints
 @app.post('/portfolio/add-position')
 async def add_position(payload: dict):
@@ -477,6 +1220,7 @@ async def add_position(payload: dict):
     try:
         user_id = payload.get('user_id')
         position = portfolio.add_position(user_id, payload)
+        _refresh_price_feed()
         return {"success": True, "position": position}
     except Exception as e:
         return {"error": str(e)}
@@ -504,6 +1248,7 @@ async def close_position(payload: dict):
         exit_price = payload.get('exit_price')
         
         closed_position = portfolio.close_position(user_id, position_id, exit_price)
+        _refresh_price_feed()
         return {"success": True, "position": closed_position}
     except Exception as e:
         return {"error": str(e)}
@@ -20,21 +20,11 @@ def get_client():
         _client = OpenAI(api_key=api_key)
     return _client
 
-def get_mentor_response(user_input: str, trading_context: dict = None, conversation_history: list = None, vision_context: dict = None, language: str = 'en', openai_key: str = None, elevenlabs_key: str = None) -> str:
-    """
-    Generate AI mentor response based on user input, trading context, conversation history, and vision analysis.
-    Supports multiple languages and user-provided API keys.
-    """
-    try:
-        # Use provided key or fallback to env
-        api_key = openai_key or os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            return "OpenAI API key required. Please provide your API key in the app settings."
-        
-        client = OpenAI(api_key=api_key)
-        context_str = ""
-        if trading_context:
-            context_str = f"""
+def _build_messages(user_input: str, trading_context: dict = None, conversation_history: list = None, vision_context: dict = None, language: str = 'en') -> list:
+    """Chat messages for one mentor turn (system prompt, history, analysis, question)."""
+    context_str = ""
+    if trading_context:
+        context_str = f"""
 Current Trading Context:
 - Asset: {trading_context.get('asset', 'Unknown')}
 - Current Price: ${trading_context.get('price', '?')}
@@ -42,20 +32,20 @@ Current Trading Context:
 - Long MA: {trading_context.get('sma_long', '?')}
 - Trend Slope: {trading_context.get('slope', '?')}
 """
-        
-        vision_str = ""
-        if vision_context:
-            patterns = vision_context.get('patterns', [])
-            indicators = vision_context.get('indicators', {})
-            vision_str = f"""
+    
+    vision_str = ""
+    if vision_context:
+        patterns = vision_context.get('patterns', [])
+        indicators = vision_context.get('indicators', {})
+        vision_str = f"""
 Vision Analysis:
 - Detected Patterns: {', '.join(patterns) if patterns else 'None'}
 - Indicators: {indicators if indicators else 'None'}
 """
-        
-        # Language-specific system prompt
-        lang_prompts = {
-            'en': """You are TradeSensei, an expert AI trading mentor. Your role is to:
+    
+    # Language-specific system prompt
+    lang_prompts = {
+        'en': """You are TradeSensei, an expert AI trading mentor. Your role is to:
 1. Provide concise, actionable trading advice
 2. Explain chart patterns and indicators from vision analysis
 3. Help traders manage risk and emotions
@@ -64,7 +54,7 @@ Vision Analysis:
 6. Remember previous conversation context for personalized advice
 
 Be direct, professional, and focus on practical trading wisdom.""",
-            'es': """Eres TradeSensei, un mentor de trading AI experto. Tu rol es:
+        'es': """Eres TradeSensei, un mentor de trading AI experto. Tu rol es:
 1. Proporcionar consejos de trading concisos y accionables
 2. Explicar patrones de gráficos e indicadores del análisis visual
 3. Ayudar a los traders a gestionar riesgos y emociones
@@ -73,7 +63,7 @@ Be direct, professional, and focus on practical trading wisdom.""",
 6. Recordar el contexto de conversación anterior para consejos personalizados
 
 Sé directo, profesional y enfócate en la sabiduría práctica de trading.""",
-            'fr': """Vous êtes TradeSensei, un mentor de trading IA expert. Votre rôle est de:
+        'fr': """Vous êtes TradeSensei, un mentor de trading IA expert. Votre rôle est de:
 1. Fournir des conseils de trading concis et actionnables
 2. Expliquer les patterns de graphique et indicateurs de l'analyse visuelle
 3. Aider les traders à gérer les risques et émotions
@@ -82,24 +72,40 @@ Sé directo, profesional y enfócate en la sabiduría práctica de trading.""",
 6. Se souvenir du contexte de conversation précédent pour des conseils personnalisés
 
 Soyez direct, professionnel et concentrez-vous sur la sagesse pratique du trading."""
-        }
-        
-        system_prompt = lang_prompts.get(language, lang_prompts['en'])
-        
-        # Build conversation history
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history if provided
-        if conversation_history:
-            for msg in conversation_history[-10:]:  # Limit to last 10 messages to avoid token limits
-                messages.append(msg)
-        
-        # Add current context and user input
-        combined_context = context_str + vision_str
-        if combined_context.strip():
-            messages.append({"role": "system", "content": f"Current analysis: {combined_context.strip()}"})
+    }
+    
+    system_prompt = lang_prompts.get(language, lang_prompts['en'])
+    
+    # Build conversation history
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    # Add conversation history if provided
+    if conversation_history:
+        for msg in conversation_history[-10:]:  # Limit to last 10 messages to avoid token limits
+            messages.append(msg)
+    
+    # Add current context and user input
+    combined_context = context_str + vision_str
+    if combined_context.strip():
+        messages.append({"role": "system", "content": f"Current analysis: {combined_context.strip()}"})
+    
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+
+def get_mentor_response(user_input: str, trading_context: dict = None, conversation_history: list = None, vision_context: dict = None, language: str = 'en', openai_key: str = None, elevenlabs_key: str = None) -> str:
+    """
+    Generate AI mentor response based on user input, trading context, conversation history, and vision analysis.
+    Supports multiple languages and user-provided API keys.
+    """
+    try:
+        # Use provided key or fallback to env
+        api_key = openai_key or os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return "OpenAI API key required. Please provide your API key in the app settings."
         
-        messages.append({"role": "user", "content": user_input})
+        client = OpenAI(api_key=api_key)
+        messages = _build_messages(user_input, trading_context, conversation_history, vision_context, language)
 
         # Allow model override via env var to support accounts without gpt-4-mini
         model_name = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
@@ -114,6 +120,33 @@ Soyez direct, professionnel et concentrez-vous sur la sagesse pratique du tradin
     except Exception as e:
         return f"I encountered an error processing your request: {str(e)}"
 
+
+def stream_mentor_response(user_input: str, trading_context: dict = None, conversation_history: list = None, vision_context: dict = None, language: str = 'en', openai_key: str = None):
+    """
+    Like `get_mentor_response`, but yields the reply in pieces as the model produces them.
+    """
+    try:
+        api_key = openai_key or os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            yield "OpenAI API key required. Please provide your API key in the app settings."
+            return
+
+        client = OpenAI(api_key=api_key)
+        messages = _build_messages(user_input, trading_context, conversation_history, vision_context, language)
+        model_name = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            max_tokens=150,
+            temperature=0.7,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        yield f"I encountered an error processing your request: {str(e)}"
+
 def get_quick_advice(signal_type: str) -> str:
     """Get quick pre-canned advice for common signals (BUY/SELL/HOLD)."""
     advice_map = {
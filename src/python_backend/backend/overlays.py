@@ -0,0 +1,249 @@
+"""Overlay command builders and per-session overlay state.
+
+Overlay commands are the JSON messages the WPF OverlayWindow draws
+(`draw_rect`, `draw_text`, `draw_line`, `draw_arrow`, `draw_polyline`, `clear`).
+They are built here so the live WebSocket path and server-side snapshot
+rendering draw exactly the same thing. Every command carries a stable `id`.
+
+Clients that announce the `overlay_delta` capability receive `OverlayState`
+messages instead of raw commands:
+  - {"action": "snapshot", "items": [cmd, ...]}: replace everything on screen
+  - {"action": "delta", "add": [...], "update": [...], "remove": [id, ...],
+     "refresh": {id: ttl, ...}}: only what changed, plus TTL extensions for
+     elements that are still valid
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+OVERLAY_POLYLINE_TOLERANCE = float(os.getenv('OVERLAY_POLYLINE_TOLERANCE', '1.5'))
+OVERLAY_POLYLINE_TTL = int(os.getenv('OVERLAY_POLYLINE_TTL', '10'))
+OVERLAY_TRENDLINE_TTL = int(os.getenv('OVERLAY_TRENDLINE_TTL', '10'))
+
+# TTL the client applies when a command does not carry one (OverlayWindow.xaml.cs)
+DEFAULT_TTL = 5
+
+# Signal elements stay up for their own TTL even when later frames carry no signal
+HELD_IDS = frozenset({'signal_text', 'signal_rect'})
+
+# (feature key, colour) for indicator series drawn as polylines
+INDICATOR_POLYLINES = (
+    ('sma_short', '#FFD700'),
+    ('sma_long', '#FF00FF'),
+)
+
+
+def build_frame_overlays(features: Dict[str, Any], tier: str, signal: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Return the overlay commands for one analysed frame.
+
+    A POI rectangle + label is drawn when the vision pipeline found one. Trade
+    signals are gated by tier: free -> no signals, pro -> TP1 only, master -> full.
+    """
+    commands = []
+    poi = features.get('poi')
+    if not poi:
+        return commands
+
+    x, y = poi
+    rect_w, rect_h = 120, 60
+    rect_x = max(0, x - rect_w // 2)
+    rect_y = max(0, y - rect_h // 2)
+    commands.append({"type": "overlay", "action": "draw_rect", "id": "poi_rect", "x": int(rect_x), "y": int(rect_y), "w": int(rect_w), "h": int(rect_h)})
+    commands.append({"type": "overlay", "action": "draw_text", "id": "poi_label", "x": int(rect_x), "y": int(rect_y) - 18, "text": "POI"})
+
+    if signal and tier != 'free':
+        side = signal.get('side')
+        price = signal.get('price')
+        sl = signal.get('sl')
+        tp1 = signal.get('tp1')
+
+        if tier == 'pro':
+            # Pro: send basic TP1 signal
+            sig_text = f"{side} @ {price} TP1 {tp1}"
+        else:
+            # Master: full details
+            sig_text = f"{side} @ {price} SL {sl} TP1 {tp1}"
+
+        commands.append({"type": "overlay", "action": "draw_text", "id": "signal_text", "x": int(x), "y": int(y) - 36, "text": sig_text, "ttl": 8})
+        commands.append({"type": "overlay", "action": "draw_rect", "id": "signal_rect", "x": int(x - 60), "y": int(y - 20), "w": 120, "h": 40, "ttl": 8})
+
+    return commands
+
+
+def simplify_polyline(points, tolerance: float) -> np.ndarray:
+    """Ramer-Douglas-Peucker simplification of an (N, 2) polyline.
+
+    Keeps the end points and every vertex needed so that no dropped point is more
+    than `tolerance` pixels from the simplified line. Distances for each split
+    are computed for the whole sub-range at once.
+    """
+    pts = np.asarray(points, dtype=np.float64)
+    n = len(pts)
+    if n < 3 or tolerance <= 0:
+        return pts
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = pts[end] - pts[start]
+        rel = pts[start + 1:end] - pts[start]
+        length = np.hypot(seg[0], seg[1])
+        if length == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        idx = int(np.argmax(dist))
+        if dist[idx] > tolerance:
+            split = start + 1 + idx
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return pts[keep]
+
+
+def build_indicator_polylines(features: Dict[str, Any], tolerance: float = OVERLAY_POLYLINE_TOLERANCE,
+                              ttl: int = OVERLAY_POLYLINE_TTL) -> List[Dict[str, Any]]:
+    """Return one simplified `draw_polyline` command per indicator series.
+
+    Indicator values are screen y positions aligned to the end of `price_series`;
+    series index i is drawn at x = i * `series_step`.
+    """
+    commands = []
+    series_len = len(features.get('price_series') or [])
+    step = features.get('series_step', 2)
+    for name, color in INDICATOR_POLYLINES:
+        values = features.get(name) or []
+        if len(values) < 2:
+            continue
+        xs = (np.arange(len(values)) + (series_len - len(values))) * step
+        pts = simplify_polyline(np.column_stack([xs, values]), tolerance)
+        commands.append({
+            "type": "overlay",
+            "action": "draw_polyline",
+            "id": name,
+            "points": np.rint(pts).astype(int).tolist(),
+            "color": color,
+            "ttl": ttl,
+        })
+    return commands
+
+
+def build_trendline_overlays(lines: List[Dict[str, Any]], ttl: int = OVERLAY_TRENDLINE_TTL) -> List[Dict[str, Any]]:
+    """Return one `draw_line` per tracked trendline, with ids stable by rank."""
+    return [
+        {"type": "overlay", "action": "draw_line", "id": f"trend_{i}",
+         "x1": line['x1'], "y1": line['y1'], "x2": line['x2'], "y2": line['y2'], "ttl": ttl}
+        for i, line in enumerate(lines)
+    ]
+
+
+class KeyedOverlayTracker:
+    """Drops overlay commands with an `id` whose content has not changed since last sent.
+
+    Used for clients without the `overlay_delta` capability. An unchanged command
+    is re-sent once half of its TTL has elapsed so the client keeps showing it.
+    """
+
+    def __init__(self):
+        self._sent: Dict[str, tuple] = {}
+
+    def filter(self, commands: List[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.monotonic() if now is None else now
+        out = []
+        for cmd in commands:
+            key = cmd.get('id')
+            if key is None:
+                out.append(cmd)
+                continue
+            shape = _content(cmd)
+            last = self._sent.get(key)
+            if last is not None and last[0] == shape and now - last[1] < cmd.get('ttl', DEFAULT_TTL) / 2:
+                continue
+            self._sent[key] = (shape, now)
+            out.append(cmd)
+        return out
+
+
+def _content(cmd: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in cmd.items() if k != 'ttl'}
+
+
+class OverlayState:
+    """Last overlay set sent to one client, diffed against each new frame's commands."""
+
+    def __init__(self, refresh_fraction: float = 0.5):
+        self.refresh_fraction = refresh_fraction
+        # id -> [command, expires_at, last_sent_or_refreshed_at]
+        self._items: Dict[str, list] = {}
+        self._need_snapshot = True
+
+    def request_snapshot(self):
+        """Send the full overlay set with the next diff (new client, resync request)."""
+        self._need_snapshot = True
+
+    def items(self) -> List[Dict[str, Any]]:
+        return [item[0] for item in self._items.values()]
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Full-state message for the current overlay set.
+
+        Also used to replace queued deltas the client has not received yet.
+        """
+        now = time.monotonic() if now is None else now
+        self._need_snapshot = False
+        for item in self._items.values():
+            item[2] = now
+        return {"type": "overlay", "action": "snapshot", "items": self.items()}
+
+    def diff(self, commands: List[Dict[str, Any]], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Fold in this frame's commands; return the message to send, or None."""
+        now = time.monotonic() if now is None else now
+        desired = {cmd['id']: cmd for cmd in commands}
+        add, update, remove, refresh = [], [], [], {}
+
+        for key in list(self._items):
+            if key in desired:
+                continue
+            _, expires_at, _ = self._items[key]
+            if key in HELD_IDS:
+                if now >= expires_at:
+                    # the client has expired it on its own
+                    del self._items[key]
+                continue
+            remove.append(key)
+            del self._items[key]
+
+        for key, cmd in desired.items():
+            ttl = cmd.get('ttl', DEFAULT_TTL)
+            prev = self._items.get(key)
+            if prev is None:
+                add.append(cmd)
+            elif _content(prev[0]) != _content(cmd):
+                update.append(cmd)
+            elif now - prev[2] >= ttl * self.refresh_fraction:
+                refresh[key] = ttl
+            else:
+                continue
+            self._items[key] = [cmd, now + ttl, now]
+
+        if self._need_snapshot:
+            return self.snapshot(now)
+
+        if not (add or update or remove or refresh):
+            return None
+        msg = {"type": "overlay", "action": "delta"}
+        if add:
+            msg["add"] = add
+        if update:
+            msg["update"] = update
+        if remove:
+            msg["remove"] = remove
+        if refresh:
+            msg["refresh"] = refresh
+        return msg
@@ -107,6 +107,11 @@ def close_position(user_id: str, position_id: str, exit_price: float) -> Dict:
     return position
 
 
+def get_open_symbols() -> set:
+    """Symbols with at least one open position across all users."""
+    return {p['symbol'] for positions in portfolios.values() for p in positions if p.get('status') == 'open'}
+
+
 def get_portfolio(user_id: str) -> Tuple[List[Dict], Dict]:
     """
     Get complete portfolio for a user.
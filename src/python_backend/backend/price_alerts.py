@@ -1,33 +1,112 @@
 """Real-time price alerts and price feed management."""
 import asyncio
-import json
+import os
+import time
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-import aiohttp
+from . import alert_engine
+from . import alert_shards
+from .alert_engine import AlertEngine
+from .alert_index import AlertIndex
+from .price_cache import CachedPrice, PriceCache
+from . import price_providers
+from . import provider_client
 from . import supabase
+from . import upstream_budget
 
 # In-memory price cache and active alerts
-price_cache: Dict[str, float] = {}
+price_cache = PriceCache()
 active_alerts: Dict[str, List[Dict]] = {}
-price_feed_tasks = {}
+# Untriggered alerts, kept in step with active_alerts: 'above'/'below' by symbol and
+# price level, every other condition in the vectorized engine. While alert shards
+# run (alert_shards), these hold nothing here and each worker process has its slice.
+alert_levels = AlertIndex()
+alert_conditions = AlertEngine()
+_LEVEL_CONDITIONS = ('above', 'below')
+
+# Symbols tradable on the exchange, so unknown ones fail without an upstream call
+EXCHANGE_INFO_TTL = float(os.getenv('EXCHANGE_INFO_TTL', '3600'))
+_EXCHANGE_INFO_RETRY = 60.0
+_exchange_symbols: Optional[set] = None
+_exchange_checked = float('-inf')
+_exchange_load: Optional[asyncio.Task] = None
+
+
+def _recent_price(symbol: str) -> Optional[float]:
+    """Fallback when upstream fails: the cached price, unless it is too old to trust."""
+    entry = price_cache.get(symbol)
+    return entry.price if entry is not None else None
+
+
+async def get_cached_prices(symbols) -> Dict[str, CachedPrice]:
+    """Prices for `symbols` from the cache, refreshed upstream only when expired.
+
+    Concurrent requests for the same symbol share one upstream call.
+    """
+    return await price_cache.get_many(symbols, fetch_prices)
+
+
+async def known_symbols() -> Optional[set]:
+    """Base assets tradable against USDT, from exchange info cached for
+    `EXCHANGE_INFO_TTL` seconds; None while exchange info is unavailable."""
+    global _exchange_load
+    retry = EXCHANGE_INFO_TTL if _exchange_symbols is not None else _EXCHANGE_INFO_RETRY
+    if time.monotonic() - _exchange_checked >= retry:
+        loop = asyncio.get_running_loop()
+        # single flight: concurrent callers wait for the same load
+        if _exchange_load is None or _exchange_load.done() or _exchange_load.get_loop() is not loop:
+            _exchange_load = loop.create_task(_load_exchange_info())
+        await asyncio.shield(_exchange_load)
+    return _exchange_symbols
+
+
+async def _load_exchange_info():
+    global _exchange_symbols, _exchange_checked
+    try:
+        session = provider_client.get_session()
+        await upstream_budget.spend('binance', 'exchange_info', upstream_budget.BACKGROUND)
+        async with session.get(f"{provider_client.BINANCE_API_URL}/api/v3/exchangeInfo") as resp:
+            upstream_budget.observe('binance', resp.status, resp.headers)
+            if resp.status == 200:
+                data = await resp.json()
+                _exchange_symbols = {s['baseAsset'] for s in data['symbols']
+                                     if s.get('quoteAsset') == 'USDT' and s.get('status', 'TRADING') == 'TRADING'}
+    except Exception as e:
+        print(f"Error fetching exchange info: {e}")
+    _exchange_checked = time.monotonic()
 
 
 async def get_binance_price(symbol: str) -> Optional[float]:
     """Fetch current price from Binance."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}USDT",
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    price = float(data['price'])
-                    price_cache[symbol] = price
-                    return price
+        session = provider_client.get_session()
+        await upstream_budget.spend('binance', 'ticker_price')
+        async with session.get(
+            f"{provider_client.BINANCE_API_URL}/api/v3/ticker/price",
+            params={'symbol': f"{symbol}USDT"},
+        ) as resp:
+            upstream_budget.observe('binance', resp.status, resp.headers)
+            if resp.status == 200:
+                data = await resp.json()
+                price = float(data['price'])
+                price_cache.put(symbol, price)
+                return price
     except Exception as e:
         print(f"Error fetching {symbol} price: {e}")
-    return price_cache.get(symbol)
+    return _recent_price(symbol)
+
+
+async def fetch_prices(symbols) -> Dict[str, float]:
+    """Fetch current prices for many symbols from the fastest healthy provider.
+
+    The primary provider is hedged with the next one when it is slower than usual,
+    and providers that keep failing are skipped (see price_providers).
+    Symbols without a price are left out.
+    """
+    prices = await price_providers.get_fetcher().fetch(symbols)
+    for symbol, price in prices.items():
+        price_cache.put(symbol, price)
+    return prices
 
 
 async def get_coinmarketcap_price(symbol: str, api_key: str) -> Optional[float]:
@@ -37,33 +116,36 @@ async def get_coinmarketcap_price(symbol: str, api_key: str) -> Optional[float]:
             'Accepts': 'application/json',
             'X-CMC_PRO_API_KEY': api_key,
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest",
-                params={'symbol': symbol, 'convert': 'USD'},
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    price = data['data'][symbol]['quote']['USD']['price']
-                    price_cache[symbol] = price
-                    return price
+        session = provider_client.get_session()
+        await upstream_budget.spend('coinmarketcap', 'quotes')
+        async with session.get(
+            "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest",
+            params={'symbol': symbol, 'convert': 'USD'},
+            headers=headers,
+        ) as resp:
+            upstream_budget.observe('coinmarketcap', resp.status, resp.headers)
+            if resp.status == 200:
+                data = await resp.json()
+                price = data['data'][symbol]['quote']['USD']['price']
+                price_cache.put(symbol, price)
+                return price
     except Exception as e:
         print(f"Error fetching {symbol} price from CMC: {e}")
-    return price_cache.get(symbol)
+    return _recent_price(symbol)
 
 
-def create_alert(user_id: str, symbol: str, condition: str, price: float, notification_type: str = "email") -> Dict:
+def create_alert(user_id: str, symbol: str, condition: str, price: float, notification_type: str = "email",
+                 params: Optional[Dict] = None) -> Dict:
     """
     Create a new price alert.
     
     Args:
         user_id: User identifier
         symbol: Trading pair (e.g., 'BTC', 'ETH')
-        condition: 'above' or 'below'
-        price: Trigger price level
+        condition: 'above', 'below', or one of alert_engine.CONDITIONS
+        price: Trigger price level ('above'/'below')
         notification_type: 'email', 'sms', 'app'
+        params: Condition parameters for alert_engine conditions (e.g. {'percent': 5})
     
     Returns:
         Alert ID and metadata
@@ -81,11 +163,23 @@ def create_alert(user_id: str, symbol: str, condition: str, price: float, notifi
         'triggered_at': None,
         'triggered_price': None,
     }
+    # Reject bad parameters before storing
+    if condition in _LEVEL_CONDITIONS:
+        try:
+            alert['price'] = float(price)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{condition} alert needs a numeric price") from e
+    else:
+        alert['params'] = {k: v for k, v in (params or {}).items() if k in alert_engine.PARAMS}
+        if condition == 'pct_move' and not alert['params'].get('reference_price'):
+            alert['params']['reference_price'] = _recent_price(symbol)
+        alert_engine.compile_condition(alert)
     
     # Store in memory
     if user_id not in active_alerts:
         active_alerts[user_id] = []
     active_alerts[user_id].append(alert)
+    _index(alert)
     
     # Persist to database
     try:
@@ -99,6 +193,9 @@ def create_alert(user_id: str, symbol: str, condition: str, price: float, notifi
 def delete_alert(user_id: str, alert_id: str) -> bool:
     """Delete an alert."""
     if user_id in active_alerts:
+        for alert in active_alerts[user_id]:
+            if alert['id'] == alert_id:
+                _unindex(alert)
         active_alerts[user_id] = [a for a in active_alerts[user_id] if a['id'] != alert_id]
         try:
             supabase.delete_alert(alert_id)
@@ -109,55 +206,132 @@ def delete_alert(user_id: str, alert_id: str) -> bool:
 
 
 async def check_alerts() -> List[Dict]:
-    """Check all active alerts and return triggered ones."""
+    """Check all active alerts and return triggered ones.
+
+    Prices for all symbols with resting alerts are fetched once per cycle; the
+    price-level index then yields exactly the alerts each price has crossed.
+    With alert shards running, the prices go to the workers owning their symbols
+    and what they trigger is notified as it comes back (see settle_shard_triggers).
+    """
     triggered = []
-    
-    for user_id, alerts in active_alerts.items():
-        for alert in alerts:
-            if alert['triggered']:
-                continue
-            
-            symbol = alert['symbol']
-            current_price = await get_binance_price(symbol)
-            
-            if current_price is None:
-                continue
-            
-            target_price = alert['price']
-            condition = alert['condition']
-            
-            # Check if condition is met
-            if (condition == 'above' and current_price >= target_price) or \
-               (condition == 'below' and current_price <= target_price):
-                alert['triggered'] = True
-                alert['triggered_at'] = datetime.now().isoformat()
-                alert['triggered_price'] = current_price
-                triggered.append({
-                    'user_id': user_id,
-                    'alert_id': alert['id'],
-                    'symbol': symbol,
-                    'condition': condition,
-                    'target_price': target_price,
-                    'current_price': current_price,
-                    'notification_type': alert['notification_type'],
-                })
-    
+    with upstream_budget.prioritized(upstream_budget.ALERTS):
+        prices = await fetch_prices(alert_symbols())
+    shards = alert_shards.get_shards()
+    for symbol, current_price in prices.items():
+        if shards is not None:
+            price_cache.put(symbol, current_price)
+            shards.tick(symbol, current_price)
+        else:
+            triggered += apply_price(symbol, current_price)
     return triggered
 
 
+def _index(alert: Dict):
+    shards = alert_shards.get_shards()
+    if shards is not None:
+        shards.add([alert])
+    else:
+        index_many([alert])
+
+
+def _unindex(alert: Dict):
+    shards = alert_shards.get_shards()
+    if shards is not None:
+        shards.remove(alert['id'], alert['symbol'])
+    else:
+        unindex(alert['id'])
+
+
+def index_many(alerts: List[Dict]):
+    """Add untriggered alerts to this process's level index and condition engine."""
+    alert_levels.add_many(a for a in alerts if a['condition'] in _LEVEL_CONDITIONS)
+    alert_conditions.add_many(a for a in alerts if a['condition'] not in _LEVEL_CONDITIONS)
+
+
+def unindex(alert_id: str) -> bool:
+    return alert_levels.remove(alert_id) or alert_conditions.remove(alert_id)
+
+
+def resting_alerts() -> List[Dict]:
+    """Untriggered alerts of all users."""
+    return [a for alerts in active_alerts.values() for a in alerts if not a.get('triggered')]
+
+
+def alert_symbols() -> set:
+    """Symbols with at least one untriggered alert."""
+    if alert_shards.get_shards() is not None:
+        return {a['symbol'] for a in resting_alerts()}
+    return alert_levels.symbols() | alert_conditions.symbols()
+
+
+def _mark_triggered(alert: Dict, current_price: float):
+    alert['triggered'] = True
+    alert['triggered_at'] = datetime.now().isoformat()
+    alert['triggered_price'] = current_price
+
+
+def apply_price(symbol: str, current_price: float, volume: float = 0.0) -> List[Dict]:
+    """Record a new price (and traded volume since the last one) for `symbol` and
+    return the alerts it triggered."""
+    price_cache.put(symbol, current_price)
+    triggered = []
+    for alert in alert_levels.trigger(symbol, current_price) + alert_conditions.tick(symbol, current_price, volume):
+        _mark_triggered(alert, current_price)
+        triggered.append({
+            'user_id': alert['user_id'],
+            'alert_id': alert['id'],
+            'symbol': symbol,
+            'condition': alert['condition'],
+            'target_price': alert['price'],
+            'params': alert.get('params'),
+            'current_price': current_price,
+            'notification_type': alert['notification_type'],
+        })
+    return triggered
+
+
+async def start_shards(count: int = alert_shards.ALERT_SHARDS, feed: bool = alert_shards.ALERT_SHARD_FEED):
+    """Move alert evaluation into `count` worker processes, partitioned by symbol."""
+    pool = await alert_shards.start(count, settle_shard_triggers, resting_alerts, feed)
+    alert_levels.clear()
+    alert_conditions.clear()
+    return pool
+
+
+async def stop_shards():
+    """Stop the alert shards and evaluate alerts in this process again."""
+    if alert_shards.get_shards() is not None:
+        await alert_shards.stop()
+        index_many(resting_alerts())
+
+
+async def settle_shard_triggers(triggered: List[Dict]):
+    """Mark alerts fired in a shard worker as triggered here, then notify their owners."""
+    for trigger in triggered:
+        for alert in active_alerts.get(trigger['user_id'], []):
+            if alert['id'] == trigger['alert_id'] and not alert.get('triggered'):
+                _mark_triggered(alert, trigger['current_price'])
+                if trigger.get('params') is not None:
+                    alert['params'] = trigger['params']  # e.g. a pct_move reference set by the worker
+    await send_notifications(triggered)
+
+
 async def start_price_monitor(check_interval: int = 60):
     """Start background price monitoring task."""
     while True:
         try:
-            triggered = await check_alerts()
-            for trigger in triggered:
-                await send_notification(trigger)
+            await send_notifications(await check_alerts())
         except Exception as e:
             print(f"Error in price monitor: {e}")
         
         await asyncio.sleep(check_interval)
 
 
+async def send_notifications(triggered: List[Dict]):
+    for trigger in triggered:
+        await send_notification(trigger)
+
+
 async def send_notification(trigger: Dict):
     """Send notification for triggered alert."""
     notification_type = trigger.get('notification_type', 'app')
@@ -170,19 +344,25 @@ async def send_notification(trigger: Dict):
         await send_app_notification(trigger)
 
 
+def _describe(trigger: Dict) -> str:
+    if trigger['condition'] in _LEVEL_CONDITIONS:
+        return f"{trigger['condition']} ${trigger['target_price']}"
+    return alert_engine.describe(trigger)
+
+
 async def send_email_notification(trigger: Dict):
     """Send email notification (stub - integrate with email service)."""
-    print(f"📧 Email: {trigger['symbol']} hit ${trigger['current_price']} ({trigger['condition']} ${trigger['target_price']})")
+    print(f"📧 Email: {trigger['symbol']} hit ${trigger['current_price']} ({_describe(trigger)})")
 
 
 async def send_sms_notification(trigger: Dict):
     """Send SMS notification (stub - integrate with SMS service)."""
-    print(f"📱 SMS: {trigger['symbol']} hit ${trigger['current_price']} ({trigger['condition']} ${trigger['target_price']})")
+    print(f"📱 SMS: {trigger['symbol']} hit ${trigger['current_price']} ({_describe(trigger)})")
 
 
 async def send_app_notification(trigger: Dict):
     """Send in-app notification."""
-    print(f"🔔 App: {trigger['symbol']} hit ${trigger['current_price']} ({trigger['condition']} ${trigger['target_price']})")
+    print(f"🔔 App: {trigger['symbol']} hit ${trigger['current_price']} ({_describe(trigger)})")
 
 
 def get_user_alerts(user_id: str) -> List[Dict]:
@@ -199,5 +379,11 @@ async def initialize_alerts_from_db():
             if user_id not in active_alerts:
                 active_alerts[user_id] = []
             active_alerts[user_id].append(alert)
+        resting = [a for a in alerts if not a.get('triggered')]
+        shards = alert_shards.get_shards()
+        if shards is not None:
+            shards.add(resting)
+        else:
+            index_many(resting)
     except Exception as e:
         print(f"Error loading alerts from database: {e}")
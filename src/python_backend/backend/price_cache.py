@@ -0,0 +1,143 @@
+"""Timestamped price cache with stale-while-revalidate and single-flight loads.
+
+Every price carries the time it was fetched:
+  - younger than `ttl`: served as is
+  - younger than `max_stale`: served as is while one background refresh runs
+  - older (or missing): the caller waits for a fresh load
+Concurrent loads of the same symbol are coalesced: N callers asking for BTC share
+one upstream request. Prices older than `max_stale` are never served, so a dead
+upstream surfaces as a missing price instead of a silently hours-old one.
+
+Tunables (environment):
+  - PRICE_CACHE_TTL: seconds a price counts as fresh (default 2)
+  - PRICE_CACHE_MAX_STALE: seconds a price may be served while refreshing (default 30)
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', '2'))
+PRICE_CACHE_MAX_STALE = float(os.getenv('PRICE_CACHE_MAX_STALE', '30'))
+
+FetchMany = Callable[[List[str]], Awaitable[Dict[str, float]]]
+
+
+class CachedPrice(NamedTuple):
+    price: float
+    updated: float    # monotonic clock, for ages
+    timestamp: float  # wall clock, for clients
+
+
+class PriceCache:
+    """Latest known price per symbol, with load coalescing."""
+
+    def __init__(self, ttl: float = PRICE_CACHE_TTL, max_stale: float = PRICE_CACHE_MAX_STALE,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.max_stale = max(ttl, max_stale)
+        self.clock = clock
+        self._prices: Dict[str, CachedPrice] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._prices
+
+    def put(self, symbol: str, price: float):
+        self._prices[symbol] = CachedPrice(price, self.clock(), time.time())
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[CachedPrice]:
+        """The cached entry if it is at most `max_age` (default `max_stale`) seconds old."""
+        entry = self._prices.get(symbol)
+        if entry is None or self.age(entry) > (self.max_stale if max_age is None else max_age):
+            return None
+        return entry
+
+    def age(self, entry: CachedPrice) -> float:
+        return self.clock() - entry.updated
+
+    async def get_many(self, symbols: Iterable[str], fetch_many: FetchMany) -> Dict[str, CachedPrice]:
+        """Cached prices for `symbols`, loading missing or expired ones through `fetch_many`.
+
+        Symbols that cannot be loaded are left out.
+        """
+        result: Dict[str, CachedPrice] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        load, revalidate = [], []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._prices.get(symbol)
+            age = self.age(entry) if entry is not None else None
+            if age is not None and age <= self.ttl:
+                self.hits += 1
+                result[symbol] = entry
+            elif age is not None and age <= self.max_stale:
+                self.stale_hits += 1
+                result[symbol] = entry
+                if self._pending(symbol) is None:
+                    revalidate.append(symbol)
+            elif self._pending(symbol) is not None:
+                self.coalesced += 1
+                waiting[symbol] = self._pending(symbol)
+            else:
+                self.misses += 1
+                load.append(symbol)
+
+        if revalidate:
+            self._start_load(revalidate, fetch_many)
+        if load:
+            waiting.update(self._start_load(load, fetch_many))
+        for symbol, future in waiting.items():
+            # shield: one caller going away must not cancel the shared load
+            entry = await asyncio.shield(future)
+            if entry is not None:
+                result[symbol] = entry
+        return result
+
+    def _pending(self, symbol: str) -> Optional[asyncio.Future]:
+        """The load in flight for `symbol` on this event loop, if any."""
+        future = self._inflight.get(symbol)
+        if future is not None and future.get_loop() is asyncio.get_running_loop():
+            return future
+        return None
+
+    def _start_load(self, symbols: List[str], fetch_many: FetchMany) -> Dict[str, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures = {symbol: loop.create_future() for symbol in symbols}
+        self._inflight.update(futures)
+        task = loop.create_task(self._load(futures, fetch_many))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return futures
+
+    async def _load(self, futures: Dict[str, asyncio.Future], fetch_many: FetchMany):
+        self.upstream_calls += 1
+        try:
+            prices = await fetch_many(list(futures))
+        except Exception as e:
+            print(f"Error loading prices: {e}")
+            prices = {}
+        for symbol, future in futures.items():
+            if symbol in prices:
+                self.put(symbol, prices[symbol])
+            if self._inflight.get(symbol) is future:
+                del self._inflight[symbol]
+            # a failed refresh may still leave a usable stale price
+            future.set_result(self.get(symbol))
+
+    def stats(self) -> Dict:
+        return {
+            'symbols': len(self._prices),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls,
+            'ttl': self.ttl,
+            'max_stale': self.max_stale,
+        }
@@ -0,0 +1,171 @@
+"""Fan-out of price ticks from one shared upstream to many subscribed clients.
+
+Clients (`/ws` price channel, `/prices/stream` SSE) hold a `Subscription` to a set
+of symbols. Ticks are published once per symbol and handed to that symbol's
+subscriber set, so the upstream cost is O(symbols) no matter how many clients watch.
+
+Each subscription coalesces: ticks arriving faster than its `max_rate` overwrite
+the pending price of their symbol, and the client gets at most one batch (latest
+price per symbol) per 1/max_rate seconds.
+
+Ticks come from the streaming exchange feed when it is connected (`publish` is a
+feed listener). Otherwise one poller refreshes every watched symbol from the price
+cache each `WS_PRICE_INTERVAL` seconds, in one bulk request.
+
+Tunables (environment):
+  - WS_PRICE_INTERVAL: poll interval while the streaming feed is down (default 2)
+  - PRICE_STREAM_MAX_RATE: most batches per second sent to one client (default 4)
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from . import price_alerts
+from . import upstream_budget
+
+WS_PRICE_INTERVAL = float(os.getenv('WS_PRICE_INTERVAL', '2'))
+PRICE_STREAM_MAX_RATE = float(os.getenv('PRICE_STREAM_MAX_RATE', '4'))
+
+_QUOTE = 'USDT'
+
+
+def normalize_symbol(symbol) -> str:
+    """'btc', 'BTCUSDT' -> 'BTC' (prices are quoted against USDT throughout)."""
+    symbol = str(symbol).strip().upper()
+    if symbol.endswith(_QUOTE) and len(symbol) > len(_QUOTE):
+        symbol = symbol[:-len(_QUOTE)]
+    return symbol
+
+
+class Subscription:
+    """One client's symbols and its rate-limited delivery of tick batches."""
+
+    def __init__(self, fanout: 'PriceFanout', deliver: Callable[[List[Dict]], None], max_rate: float):
+        self.fanout = fanout
+        self.deliver = deliver
+        self.interval = 1.0 / max(0.01, max_rate)
+        self.symbols: Set[str] = set()
+        self._pending: Dict[str, Dict] = {}
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._last_flush = float('-inf')
+        self.delivered = 0
+        self.coalesced = 0
+
+    def update(self, add: Iterable[str] = (), remove: Iterable[str] = ()):
+        add, remove = set(add) - self.symbols, set(remove) & self.symbols
+        for symbol in remove:
+            self._pending.pop(symbol, None)
+        self.symbols = (self.symbols | add) - remove
+        self.fanout._changed(self, add, remove)
+
+    def offer(self, tick: Dict):
+        if tick['symbol'] in self._pending:
+            self.coalesced += 1
+        self._pending[tick['symbol']] = tick
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_at(max(loop.time(), self._last_flush + self.interval), self._flush)
+
+    def _flush(self):
+        self._handle = None
+        self._last_flush = asyncio.get_running_loop().time()
+        ticks, self._pending = list(self._pending.values()), {}
+        if ticks:
+            self.delivered += len(ticks)
+            self.deliver(ticks)
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.update(remove=set(self.symbols))
+
+
+class PriceFanout:
+    """Per-symbol subscriber sets fed from one upstream."""
+
+    def __init__(self, poll_interval: float = WS_PRICE_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._poller: Optional[asyncio.Task] = None
+        # Set by the app: whether streamed ticks are flowing, and who to tell when
+        # the watched symbols change
+        self.upstream_live: Callable[[], bool] = lambda: False
+        self.on_change: Callable[[], None] = lambda: None
+        self.published = 0
+
+    def symbols(self) -> set:
+        """Symbols with at least one subscriber."""
+        return set(self._subscribers)
+
+    def subscribe(self, deliver: Callable[[List[Dict]], None], max_rate: float = PRICE_STREAM_MAX_RATE) -> Subscription:
+        return Subscription(self, deliver, max_rate)
+
+    def publish(self, symbol: str, price: float, timestamp: Optional[float] = None):
+        subscribers = self._subscribers.get(symbol)
+        if not subscribers:
+            return
+        self.published += 1
+        tick = {'symbol': symbol, 'price': price, 'timestamp': timestamp if timestamp is not None else time.time()}
+        for subscription in list(subscribers):
+            subscription.offer(tick)
+
+    def _changed(self, subscription: Subscription, add: set, remove: set):
+        before = len(self._subscribers)
+        for symbol in add:
+            self._subscribers.setdefault(symbol, set()).add(subscription)
+        for symbol in remove:
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[symbol]
+        if add:
+            self._ensure_poller()
+            self._publish_cached(subscription, add)
+        if len(self._subscribers) != before:
+            self.on_change()
+
+    def _publish_cached(self, subscription: Subscription, symbols: set):
+        # New subscribers see the last known price right away
+        for symbol in symbols:
+            entry = price_alerts.price_cache.get(symbol)
+            if entry is not None:
+                subscription.offer({'symbol': symbol, 'price': entry.price, 'timestamp': entry.timestamp})
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        while self._subscribers:
+            if not self.upstream_live():
+                # Refreshing viewers yields upstream budget to alert checks and direct lookups
+                with upstream_budget.prioritized(upstream_budget.BACKGROUND):
+                    prices = await price_alerts.get_cached_prices(sorted(self._subscribers))
+                for symbol, entry in prices.items():
+                    self.publish(symbol, entry.price, entry.timestamp)
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        subscriptions = set()
+        for subscribers in self._subscribers.values():
+            subscriptions |= subscribers
+        return {
+            'symbols': len(self._subscribers),
+            'subscriptions': len(subscriptions),
+            'published': self.published,
+            'polling': self._poller is not None and not self._poller.done() and not self.upstream_live(),
+        }
+
+
+_fanout: Optional[PriceFanout] = None
+
+
+def get_fanout() -> PriceFanout:
+    global _fanout
+    if _fanout is None:
+        _fanout = PriceFanout()
+    return _fanout
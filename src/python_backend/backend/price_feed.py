@@ -0,0 +1,208 @@
+"""Streaming market-data feed from the exchange's WebSocket API.
+
+One persistent WebSocket subscription covers every symbol somebody currently cares
+about. Interest comes from registered sources (open alerts, open positions, live
+viewers); the feed resubscribes whenever `refresh()` is called and at least every
+`PRICE_FEED_RESYNC` seconds, sending SUBSCRIBE/UNSUBSCRIBE only for the difference.
+Each tick goes straight into the alert index and condition engine
+(`price_alerts.apply_price`, with the volume traded since the previous tick),
+the alerts it triggered go to `on_triggers` (by default their notifications are
+sent) in a task of their own, and the tick is handed to listeners. A message that
+cannot be read, or a listener that raises, is logged and skipped; it never costs the
+connection.
+
+A dropped connection is retried with full-jitter exponential backoff; the backoff
+resets once the new connection delivers data, so a server that accepts and then
+drops connections is not hammered.
+
+Tunables (environment):
+  - PRICE_FEED_ENABLED: stream prices while the app runs (default true)
+  - PRICE_FEED_URL: exchange stream endpoint (default wss://stream.binance.com:9443/ws)
+  - PRICE_FEED_STREAM: stream per symbol: miniTicker, trade or aggTrade (default miniTicker)
+  - PRICE_FEED_RESYNC: seconds between subscription resyncs (default 5)
+  - PRICE_FEED_BACKOFF_MAX: longest reconnect delay in seconds (default 30)
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from . import price_alerts
+from . import provider_client
+
+PRICE_FEED_ENABLED = os.getenv('PRICE_FEED_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PRICE_FEED_URL = os.getenv('PRICE_FEED_URL', 'wss://stream.binance.com:9443/ws')
+PRICE_FEED_STREAM = os.getenv('PRICE_FEED_STREAM', 'miniTicker')
+PRICE_FEED_RESYNC = float(os.getenv('PRICE_FEED_RESYNC', '5'))
+PRICE_FEED_BACKOFF_MAX = float(os.getenv('PRICE_FEED_BACKOFF_MAX', '30'))
+
+_BACKOFF_BASE = 0.5
+# Streams per SUBSCRIBE/UNSUBSCRIBE message
+_MAX_PARAMS = 200
+_QUOTE = 'USDT'
+
+
+class PriceFeed:
+    """Keeps one exchange stream subscribed to the symbols its sources want."""
+
+    def __init__(self, url: str = PRICE_FEED_URL, stream: str = PRICE_FEED_STREAM,
+                 on_triggers: Optional[Callable[[List[Dict]], Awaitable]] = None):
+        self.url = url
+        self.stream = stream
+        self.on_triggers = on_triggers or price_alerts.send_notifications
+        self._sources: Dict[str, Callable[[], Iterable[str]]] = {}
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._subscribed: set = set()
+        # Last 24h volume per symbol from miniTicker events, to derive traded volume
+        self._volumes: Dict[str, float] = {}
+        self._changed = asyncio.Event()
+        self._ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self._notifying: set = set()
+        self.connected = False
+        self.connections = 0
+        self.ticks = 0
+        self.dropped = 0
+
+    def add_source(self, name: str, symbols: Callable[[], Iterable[str]]):
+        """Register a callable returning symbols that should be streamed."""
+        self._sources[name] = symbols
+        self.refresh()
+
+    def add_listener(self, listener: Callable[[str, float], None]):
+        """Call `listener(symbol, price)` on every tick."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def wanted(self) -> set:
+        symbols = set()
+        for source in self._sources.values():
+            symbols.update(str(s).upper() for s in source())
+        return symbols
+
+    def refresh(self):
+        """Resubscribe soon because interest may have changed."""
+        self._changed.set()
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                async with provider_client.get_session().ws_connect(self.url, heartbeat=30) as ws:
+                    self.connected = True
+                    self.connections += 1
+                    self._subscribed = set()
+                    syncer = asyncio.get_running_loop().create_task(self._keep_synced(ws))
+                    try:
+                        async for msg in ws:
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                continue
+                            attempt = 0
+                            try:
+                                self._handle(json.loads(msg.data))
+                            except Exception as e:
+                                self.dropped += 1
+                                print(f"Price feed dropped a message: {e}")
+                    finally:
+                        syncer.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Price feed error: {e}")
+            finally:
+                self.connected = False
+            await asyncio.sleep(random.uniform(0, min(PRICE_FEED_BACKOFF_MAX, _BACKOFF_BASE * 2 ** attempt)))
+            attempt += 1
+
+    async def _keep_synced(self, ws):
+        while True:
+            self._changed.clear()
+            await self._sync(ws)
+            try:
+                await asyncio.wait_for(self._changed.wait(), PRICE_FEED_RESYNC)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _sync(self, ws):
+        wanted = self.wanted()
+        for method, symbols in (('SUBSCRIBE', wanted - self._subscribed), ('UNSUBSCRIBE', self._subscribed - wanted)):
+            params = [f"{s.lower()}{_QUOTE.lower()}@{self.stream}" for s in sorted(symbols)]
+            for i in range(0, len(params), _MAX_PARAMS):
+                await ws.send_json({'method': method, 'params': params[i:i + _MAX_PARAMS], 'id': next(self._ids)})
+        self._subscribed = wanted
+
+    def _handle(self, event: Dict):
+        event = event.get('data', event)  # combined-stream envelope
+        pair = event.get('s')
+        price = event.get('c', event.get('p'))
+        if not pair or price is None or not pair.endswith(_QUOTE):
+            return  # subscription acks and other control messages
+        symbol, price = pair[:-len(_QUOTE)], float(price)
+        self.ticks += 1
+        triggered = price_alerts.apply_price(symbol, price, self._traded_volume(symbol, event))
+        if triggered:
+            # Notifying may be slow; the next tick should not wait for it
+            task = asyncio.get_running_loop().create_task(self.on_triggers(triggered))
+            self._notifying.add(task)
+            task.add_done_callback(self._notified)
+        for listener in list(self._listeners):
+            try:
+                listener(symbol, price)
+            except Exception as e:
+                print(f"Price feed listener failed: {e}")
+
+    def _notified(self, task: asyncio.Task):
+        self._notifying.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Price feed trigger notification failed: {task.exception()}")
+
+    def _traded_volume(self, symbol: str, event: Dict) -> float:
+        if 'q' in event:
+            return float(event['q'])  # trade / aggTrade quantity
+        if 'v' not in event:
+            return 0.0
+        # miniTicker carries rolling 24h volume; its growth approximates what traded
+        total = float(event['v'])
+        previous = self._volumes.get(symbol, total)
+        self._volumes[symbol] = total
+        return max(0.0, total - previous)
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': PRICE_FEED_ENABLED,
+            'connected': self.connected,
+            'connections': self.connections,
+            'subscribed': len(self._subscribed),
+            'ticks': self.ticks,
+            'dropped': self.dropped,
+        }
+
+
+_feed: Optional[PriceFeed] = None
+
+
+def get_feed() -> PriceFeed:
+    global _feed
+    if _feed is None:
+        _feed = PriceFeed()
+    return _feed
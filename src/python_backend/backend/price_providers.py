@@ -0,0 +1,323 @@
+"""Hedged price fetching across several providers, with per-provider circuit breakers.
+
+A fetch goes to the first healthy provider. If it has not answered within its own
+recent `PRICE_HEDGE_QUANTILE` latency (p95 by default), the same request also goes
+to the next provider, and the first answer wins; the slower request is cancelled.
+A provider that fails hands over to the next one at once instead of being waited out.
+An empty or partial answer counts as a miss too: what it did return is kept and the
+symbols still missing are asked of the next provider right away.
+
+Each provider keeps a window of recent latencies and its error counts. After
+`PROVIDER_BREAKER_FAILURES` consecutive failures its breaker opens and the provider
+is skipped for `PROVIDER_BREAKER_COOLDOWN` seconds; then a single trial request
+(half-open) decides whether it is used again.
+
+Providers, in order of preference:
+  - binance: BINANCE_API_URL
+  - binance_mirror: BINANCE_MIRROR_URL, if set (e.g. https://api1.binance.com)
+  - coinmarketcap: if COINMARKETCAP_API_KEY is set
+With neither of the last two configured there is nothing to hedge or fail over to:
+every fetch goes to binance alone, and the fetcher's stats report `hedging: false`.
+
+Tunables (environment):
+  - PRICE_HEDGE_QUANTILE: latency quantile after which a hedge is sent (default 0.95)
+  - PRICE_HEDGE_MIN_MS / PRICE_HEDGE_MAX_MS: bounds of the hedge delay; a provider
+    without enough history is hedged after the maximum (default 20 / 500)
+  - PROVIDER_BREAKER_FAILURES: consecutive failures that open a breaker (default 5)
+  - PROVIDER_BREAKER_COOLDOWN: seconds a breaker stays open (default 30)
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from . import provider_client
+from . import upstream_budget
+
+PRICE_HEDGE_QUANTILE = float(os.getenv('PRICE_HEDGE_QUANTILE', '0.95'))
+PRICE_HEDGE_MIN_MS = float(os.getenv('PRICE_HEDGE_MIN_MS', '20'))
+PRICE_HEDGE_MAX_MS = float(os.getenv('PRICE_HEDGE_MAX_MS', '500'))
+PROVIDER_BREAKER_FAILURES = int(os.getenv('PROVIDER_BREAKER_FAILURES', '5'))
+PROVIDER_BREAKER_COOLDOWN = float(os.getenv('PROVIDER_BREAKER_COOLDOWN', '30'))
+BINANCE_MIRROR_URL = os.getenv('BINANCE_MIRROR_URL', '').rstrip('/')
+COINMARKETCAP_API_KEY = os.getenv('COINMARKETCAP_API_KEY', '')
+COINMARKETCAP_API_URL = 'https://pro-api.coinmarketcap.com'
+
+# Per-symbol requests in flight when a bulk ticker request is not possible
+PRICE_FETCH_CONCURRENCY = int(os.getenv('PRICE_FETCH_CONCURRENCY', '8'))
+
+# Latency samples kept per provider, and how many are needed before they are trusted
+_LATENCY_WINDOW = 200
+_MIN_SAMPLES = 20
+_QUOTE = 'USDT'
+
+FetchMany = Callable[[List[str]], Awaitable[Dict[str, float]]]
+
+
+class ProviderError(Exception):
+    """A provider could not answer."""
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial after a cooldown."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failures: int = PROVIDER_BREAKER_FAILURES, cooldown: float = PROVIDER_BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        self.threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opens = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may go out now (claims the trial when half-open)."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self):
+        """A request ended without a verdict (e.g. it was cancelled)."""
+        self._trial = False
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            if self._opened_at is None or self._trial:
+                self.opens += 1
+            self._opened_at = self.clock()
+        self._trial = False
+
+
+class Provider:
+    """One price source with its latency window, error counts and breaker."""
+
+    def __init__(self, name: str, fetch_many: FetchMany, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.fetch_many = fetch_many
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=_LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Seconds within which fraction `q` of recent requests answered; None without enough history."""
+        if len(self.latencies) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    async def fetch(self, symbols: List[str]) -> Dict[str, float]:
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            prices = await self.fetch_many(symbols)
+        except asyncio.CancelledError:
+            # Lost the race: the time it took so far still says something about its latency
+            self.latencies.append(time.perf_counter() - started)
+            self.breaker.release()
+            raise
+        except upstream_budget.BudgetExhausted as e:
+            # Our own request budget, not the provider's health
+            self.errors += 1
+            self.breaker.release()
+            raise ProviderError(f"{self.name}: {e}") from e
+        except Exception as e:
+            self.errors += 1
+            self.breaker.record_failure()
+            raise ProviderError(f"{self.name}: {e}") from e
+        self.latencies.append(time.perf_counter() - started)
+        self.breaker.record_success()
+        return prices
+
+    def stats(self) -> Dict:
+        p50, p95 = self.latency_quantile(0.5), self.latency_quantile(0.95)
+        return {
+            'state': self.breaker.state,
+            'requests': self.requests,
+            'errors': self.errors,
+            'wins': self.wins,
+            'breaker_opens': self.breaker.opens,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class HedgedFetcher:
+    """Fetches from the preferred provider, hedging to the next one when it is slow or failing."""
+
+    def __init__(self, providers: Sequence[Provider], quantile: float = PRICE_HEDGE_QUANTILE,
+                 min_delay_ms: float = PRICE_HEDGE_MIN_MS, max_delay_ms: float = PRICE_HEDGE_MAX_MS):
+        self.providers = list(providers)
+        self.quantile = quantile
+        self.min_delay = min_delay_ms / 1000.0
+        self.max_delay = max(min_delay_ms, max_delay_ms) / 1000.0
+        self.fetches = 0
+        self.hedges = 0
+        self.partials = 0
+        self.failures = 0
+
+    def hedge_delay(self, provider: Provider) -> float:
+        latency = provider.latency_quantile(self.quantile)
+        if latency is None:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, latency))
+
+    async def fetch(self, symbols) -> Dict[str, float]:
+        """Prices for `symbols` from whichever providers answer first; {} if none can.
+
+        Symbols no provider knows are left out, as a single provider would leave them out.
+        """
+        symbols = sorted(set(symbols))
+        if not symbols:
+            return {}
+        self.fetches += 1
+        loop = asyncio.get_running_loop()
+        candidates = iter(self.providers)
+        racing: Dict[asyncio.Task, Provider] = {}
+        merged: Dict[str, float] = {}
+
+        def missing() -> List[str]:
+            return [s for s in symbols if s not in merged]
+
+        def launch() -> Optional[Provider]:
+            for provider in candidates:
+                if provider.breaker.allow():
+                    racing[loop.create_task(provider.fetch(missing()))] = provider
+                    return provider
+            return None
+
+        latest = launch()
+        try:
+            while racing:
+                timeout = self.hedge_delay(latest) if latest is not None else None
+                done, _ = await asyncio.wait(racing, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The newest request is slower than it usually is: race the next provider
+                    latest = launch()
+                    if latest is not None:
+                        self.hedges += 1
+                    continue
+                for task in done:
+                    provider = racing.pop(task)
+                    if task.exception() is not None:
+                        print(f"Price provider failed: {task.exception()}")
+                        continue
+                    for symbol, price in task.result().items():
+                        merged.setdefault(symbol, price)
+                    if not missing():
+                        provider.wins += 1
+                        return merged
+                    self.partials += 1
+                # A failure or an incomplete answer hands over at once
+                latest = launch() or (latest if racing else None)
+        finally:
+            for task in racing:
+                task.cancel()
+        if not merged:
+            self.failures += 1
+        return merged
+
+    def stats(self) -> Dict:
+        return {
+            'fetches': self.fetches,
+            'hedges': self.hedges,
+            'partials': self.partials,
+            'failures': self.failures,
+            'hedging': len(self.providers) > 1,
+            'providers': {p.name: p.stats() for p in self.providers},
+        }
+
+
+async def binance_prices(base_url: str, symbols: List[str]) -> Dict[str, float]:
+    """USDT prices from a Binance-compatible REST API, in one bulk ticker request if possible.
+
+    Falls back to per-symbol requests, at most `PRICE_FETCH_CONCURRENCY` at a time, when
+    the bulk request is rejected (one unknown symbol rejects the whole batch). Unknown
+    symbols are left out; anything else that goes wrong raises. Every request is
+    charged to the shared Binance weight budget.
+    """
+    session = provider_client.get_session()
+    url = f"{base_url}/api/v3/ticker/price"
+    await upstream_budget.spend('binance', 'ticker_price_bulk')
+    async with session.get(url, params={'symbols': json.dumps([f"{s}{_QUOTE}" for s in symbols], separators=(',', ':'))}) as resp:
+        upstream_budget.observe('binance', resp.status, resp.headers)
+        if resp.status == 200:
+            return {item['symbol'][:-len(_QUOTE)]: float(item['price']) for item in await resp.json()}
+        if resp.status != 400:
+            raise ProviderError(f"HTTP {resp.status}")
+
+    semaphore = asyncio.Semaphore(PRICE_FETCH_CONCURRENCY)
+
+    async def fetch(symbol):
+        async with semaphore:
+            await upstream_budget.spend('binance', 'ticker_price')
+            async with session.get(url, params={'symbol': f"{symbol}{_QUOTE}"}) as resp:
+                upstream_budget.observe('binance', resp.status, resp.headers)
+                if resp.status == 200:
+                    return float((await resp.json())['price'])
+                if resp.status != 400:
+                    raise ProviderError(f"HTTP {resp.status}")
+                return None
+
+    fetched = await asyncio.gather(*(fetch(s) for s in symbols))
+    return {s: p for s, p in zip(symbols, fetched) if p is not None}
+
+
+async def coinmarketcap_prices(symbols: List[str], api_key: str = None) -> Dict[str, float]:
+    """USD prices from CoinMarketCap in one quotes request."""
+    session = provider_client.get_session()
+    await upstream_budget.spend('coinmarketcap', 'quotes')
+    async with session.get(
+        f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/quotes/latest",
+        params={'symbol': ','.join(symbols), 'convert': 'USD'},
+        headers={'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key or COINMARKETCAP_API_KEY},
+    ) as resp:
+        upstream_budget.observe('coinmarketcap', resp.status, resp.headers)
+        if resp.status != 200:
+            raise ProviderError(f"HTTP {resp.status}")
+        data = (await resp.json()).get('data') or {}
+    return {s: float(data[s]['quote']['USD']['price']) for s in symbols if s in data}
+
+
+def default_providers() -> List[Provider]:
+    # Base URLs are read per call so they can be repointed (stand-in, tests)
+    providers = [Provider('binance', lambda symbols: binance_prices(provider_client.BINANCE_API_URL, symbols))]
+    if BINANCE_MIRROR_URL:
+        providers.append(Provider('binance_mirror', lambda symbols: binance_prices(BINANCE_MIRROR_URL, symbols)))
+    if COINMARKETCAP_API_KEY:
+        providers.append(Provider('coinmarketcap', coinmarketcap_prices))
+    return providers
+
+
+_fetcher: Optional[HedgedFetcher] = None
+
+
+def get_fetcher() -> HedgedFetcher:
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = HedgedFetcher(default_providers())
+    return _fetcher
@@ -0,0 +1,70 @@
+"""Shared HTTP client for price-provider calls.
+
+One `aiohttp.ClientSession` serves every call to Binance, CoinMarketCap and other
+providers, so connections are kept alive and reused instead of paying for a new
+pool, DNS lookup and TLS handshake per price. The session is created and closed by
+the app's lifespan hook (`start` / `close`); code running outside the app (scripts,
+tests) gets one created lazily on its event loop.
+
+Tunables (environment):
+  - PROVIDER_HTTP_LIMIT: maximum open connections in total (default 100)
+  - PROVIDER_HTTP_LIMIT_PER_HOST: maximum open connections per provider host (default 20)
+  - PROVIDER_DNS_TTL: seconds resolved provider addresses are cached (default 300)
+  - PROVIDER_KEEPALIVE: seconds an idle connection is kept open (default 30)
+  - PROVIDER_CONNECT_TIMEOUT / PROVIDER_READ_TIMEOUT / PROVIDER_TOTAL_TIMEOUT:
+    request timeouts in seconds (default 3 / 5 / 5)
+  - BINANCE_API_URL: Binance REST base URL (default https://api.binance.com)
+"""
+import asyncio
+import os
+from typing import Optional
+
+import aiohttp
+
+PROVIDER_HTTP_LIMIT = int(os.getenv('PROVIDER_HTTP_LIMIT', '100'))
+PROVIDER_HTTP_LIMIT_PER_HOST = int(os.getenv('PROVIDER_HTTP_LIMIT_PER_HOST', '20'))
+PROVIDER_DNS_TTL = int(os.getenv('PROVIDER_DNS_TTL', '300'))
+PROVIDER_KEEPALIVE = float(os.getenv('PROVIDER_KEEPALIVE', '30'))
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', '3'))
+PROVIDER_READ_TIMEOUT = float(os.getenv('PROVIDER_READ_TIMEOUT', '5'))
+PROVIDER_TOTAL_TIMEOUT = float(os.getenv('PROVIDER_TOTAL_TIMEOUT', '5'))
+
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://api.binance.com').rstrip('/')
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=PROVIDER_HTTP_LIMIT,
+        limit_per_host=PROVIDER_HTTP_LIMIT_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=PROVIDER_DNS_TTL,
+        keepalive_timeout=PROVIDER_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(total=PROVIDER_TOTAL_TIMEOUT, sock_connect=PROVIDER_CONNECT_TIMEOUT,
+                                    sock_read=PROVIDER_READ_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def start():
+    """Create the shared session (app startup)."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+
+
+async def close():
+    """Close the shared session and its pooled connections (app shutdown)."""
+    global _session
+    session, _session = _session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The shared session, created on the running loop if the app has not started one."""
+    global _session
+    if _session is None or _session.closed or _session._loop is not asyncio.get_running_loop():
+        _session = _create_session()
+    return _session
@@ -0,0 +1,141 @@
+"""Per-user, per-endpoint token buckets sized by subscription tier.
+
+Every (client, endpoint) pair has a token bucket. A request takes one token; the
+bucket refills lazily at the endpoint's rate when it is next touched, so an update
+is O(1) and idle buckets cost nothing until they are evicted. Rates and burst sizes
+come from `LIMITS` scaled by the client's tier (`TIER_MULTIPLIERS`).
+
+Buckets live in an OrderedDict kept in least-recently-used order. Every check
+evicts buckets from the cold end that have been idle longer than
+`RATE_LIMIT_IDLE_SECONDS` (an idle bucket is full again, so forgetting it changes
+nothing), and the dict is capped at `RATE_LIMIT_MAX_BUCKETS`.
+
+`check` returns 0 when the request may proceed, otherwise the seconds until a token
+is available; HTTP endpoints turn that into 429 with `Retry-After`, `/ws` into an
+error message or a close with a reason.
+
+Tunables (environment):
+  - RATE_LIMIT_ENABLED: set to false to disable limiting (default true)
+  - RATE_LIMIT_IDLE_SECONDS: idle time before a bucket is evicted (default 600)
+  - RATE_LIMIT_MAX_BUCKETS: maximum buckets kept (default 100000)
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv('RATE_LIMIT_IDLE_SECONDS', '600'))
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', '100000'))
+
+
+class Limit(NamedTuple):
+    rate: float   # tokens per second
+    burst: float  # bucket capacity
+
+
+# Free-tier limits per endpoint
+LIMITS: Dict[str, Limit] = {
+    'ws_connect': Limit(rate=0.5, burst=5),
+    'ws_frame': Limit(rate=5, burst=10),
+    'mentor': Limit(rate=0.2, burst=3),
+    'tts': Limit(rate=0.5, burst=5),
+    'transcribe': Limit(rate=0.5, burst=5),
+    'price': Limit(rate=2, burst=10),
+    'snapshot': Limit(rate=0.5, burst=5),
+    # access tokens checked with Supabase (cache misses only), per client address
+    'auth_verify': Limit(rate=0.2, burst=5),
+}
+
+TIER_MULTIPLIERS = {'free': 1.0, 'pro': 3.0, 'master': 10.0}
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets keyed by (client, endpoint)."""
+
+    def __init__(self, limits: Optional[Dict[str, Limit]] = None, idle_seconds: float = RATE_LIMIT_IDLE_SECONDS,
+                 max_buckets: int = RATE_LIMIT_MAX_BUCKETS, clock=time.monotonic):
+        self.limits = dict(limits or LIMITS)
+        self.idle_seconds = idle_seconds
+        self.max_buckets = max(1, max_buckets)
+        self.clock = clock
+        self._buckets: 'OrderedDict[tuple, _Bucket]' = OrderedDict()
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {}
+        self.evicted = 0
+
+    def limit_for(self, endpoint: str, tier: str = 'free') -> Limit:
+        base = self.limits[endpoint]
+        factor = TIER_MULTIPLIERS.get(tier, 1.0)
+        return Limit(base.rate * factor, base.burst * factor)
+
+    def check(self, client: Hashable, endpoint: str, tier: str = 'free', cost: float = 1.0) -> float:
+        """Take `cost` tokens for `client` on `endpoint`; return 0 or seconds to wait."""
+        now = self.clock()
+        rate, burst = self.limit_for(endpoint, tier)
+        key = (client, endpoint)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(burst, now)
+        else:
+            self._buckets.move_to_end(key)
+            # Lazy refill; a tier change takes effect on the next refill
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        self._evict(now)
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            self.allowed += 1
+            return 0.0
+        self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+        return (cost - bucket.tokens) / rate if rate > 0 else float('inf')
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) <= self.max_buckets and now - bucket.updated < self.idle_seconds:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': RATE_LIMIT_ENABLED,
+            'buckets': len(self._buckets),
+            'allowed': self.allowed,
+            'rejected': dict(self.rejected),
+            'evicted': self.evicted,
+        }
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def sustained_rate(endpoint: str, tier: str = 'free') -> float:
+    """Requests per second `tier` may keep sending to `endpoint`; infinite when disabled."""
+    if not RATE_LIMIT_ENABLED:
+        return float('inf')
+    return get_limiter().limit_for(endpoint, tier).rate
+
+
+def check(client: Hashable, endpoint: str, tier: str = 'free', cost: float = 1.0) -> float:
+    """`RateLimiter.check` on the process-wide limiter; always 0 when disabled."""
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+    return get_limiter().check(client, endpoint, tier, cost)
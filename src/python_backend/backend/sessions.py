@@ -0,0 +1,149 @@
+"""Per-connection state for chart streaming sessions on `/ws`.
+
+Every connection is issued a resume token. When the socket drops, its session is
+detached rather than discarded and kept in a bounded cache for
+`SESSION_RESUME_TTL` seconds, so a client that reconnects with
+`/ws?resume=<token>` gets its trackers, overlay state, subscriptions and frame ring
+back instead of rebuilding them from cold. The cache is capped by entry count and by
+the estimated memory of the detached sessions; the least recently detached are
+evicted first. Tokens are single use: a resumed session gets a fresh one.
+"""
+import os
+import secrets
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from . import flow_control
+from . import overlays
+from . import trendlines
+
+SESSION_RESUME_TTL = float(os.getenv('SESSION_RESUME_TTL', '120'))
+SESSION_RESUME_MAX = int(os.getenv('SESSION_RESUME_MAX', '256'))
+SESSION_RESUME_MAX_BYTES = int(os.getenv('SESSION_RESUME_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Rough fixed cost of a session's trackers and overlay state
+_SESSION_BASE_BYTES = 16 * 1024
+
+
+class Session:
+    """State kept for one connected overlay client."""
+
+    def __init__(self, session_id: str, user_id: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.created_at = time.time()
+        self.resume_token = secrets.token_urlsafe(24)
+        self.detached_at: Optional[float] = None
+        # Latest decoded frame, a digest of its encoded bytes and the overlays sent for it
+        self.latest_frame = None
+        self.latest_frame_key: Optional[str] = None
+        self.latest_overlays: List[Dict[str, Any]] = []
+        # Capabilities the client announced in its `hello` message
+        self.capabilities = set()
+        # What the client is showing: diffed state for `overlay_delta` clients,
+        # change filter for plain command clients
+        self.overlay_state = overlays.OverlayState()
+        self.keyed_overlays = overlays.KeyedOverlayTracker()
+        self.trendlines = trendlines.TrendlineTracker()
+        # Load-adaptive analysis quality and advised capture rate
+        self.flow = flow_control.FlowController()
+        # Multiplexed channels: price symbols to stream, audio received so far
+        self.price_symbols = set()
+        self.audio_buffer = bytearray()
+        # Shared-memory frame ring for same-host clients (frame_ring.FrameRing)
+        self.frame_ring = None
+
+    def memory_bytes(self) -> int:
+        """Estimated memory held by this session while it waits to be resumed."""
+        size = _SESSION_BASE_BYTES + len(self.audio_buffer)
+        if self.latest_frame is not None:
+            size += self.latest_frame.nbytes
+        if self.frame_ring is not None:
+            size += self.frame_ring.shm.size
+        return size
+
+    def release(self):
+        """Free resources that outlive the Python object (shared memory)."""
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
+
+
+active_sessions: Dict[str, Session] = {}
+
+# resume token -> detached session, least recently detached first
+_detached: "OrderedDict[str, Session]" = OrderedDict()
+_detached_bytes = 0
+_resume_stats = {'detached': 0, 'resumed': 0, 'expired': 0, 'evicted': 0}
+
+
+def open_session(user_id: Optional[str] = None) -> Session:
+    session = Session(uuid.uuid4().hex, user_id)
+    active_sessions[session.session_id] = session
+    return session
+
+
+def get_session(session_id: str) -> Optional[Session]:
+    return active_sessions.get(session_id)
+
+
+def close_session(session_id: str):
+    session = active_sessions.pop(session_id, None)
+    if session is not None:
+        session.release()
+
+
+def detach_session(session_id: str):
+    """Keep a disconnected session around so the client can resume it."""
+    global _detached_bytes
+    session = active_sessions.pop(session_id, None)
+    if session is None:
+        return
+    if SESSION_RESUME_TTL <= 0 or SESSION_RESUME_MAX <= 0:
+        session.release()
+        return
+    session.detached_at = time.monotonic()
+    _detached[session.resume_token] = session
+    _detached_bytes += session.memory_bytes()
+    _resume_stats['detached'] += 1
+    _purge()
+
+
+def resume_session(token: Optional[str]) -> Optional[Session]:
+    """Reattach the detached session for `token`, or None if it expired or is unknown."""
+    global _detached_bytes
+    _purge()
+    session = _detached.pop(token, None) if token else None
+    if session is None:
+        return None
+    _detached_bytes -= session.memory_bytes()
+    session.detached_at = None
+    session.resume_token = secrets.token_urlsafe(24)
+    active_sessions[session.session_id] = session
+    _resume_stats['resumed'] += 1
+    return session
+
+
+def resume_stats() -> Dict[str, Any]:
+    return {**_resume_stats, 'waiting': len(_detached), 'bytes': _detached_bytes,
+            'max_bytes': SESSION_RESUME_MAX_BYTES, 'ttl': SESSION_RESUME_TTL}
+
+
+def _purge(now: Optional[float] = None):
+    """Drop expired detached sessions, then the oldest until within the caps."""
+    global _detached_bytes
+    now = time.monotonic() if now is None else now
+    while _detached:
+        token, session = next(iter(_detached.items()))
+        if now - session.detached_at >= SESSION_RESUME_TTL:
+            outcome = 'expired'
+        elif len(_detached) > SESSION_RESUME_MAX or _detached_bytes > SESSION_RESUME_MAX_BYTES:
+            outcome = 'evicted'
+        else:
+            break
+        del _detached[token]
+        _detached_bytes -= session.memory_bytes()
+        _resume_stats[outcome] += 1
+        session.release()
@@ -0,0 +1,153 @@
+"""Server-side rendering of annotated chart snapshots.
+
+Draws the same overlay commands the advisor sends to the WPF OverlayWindow onto
+a frame and encodes the result (JPEG/WebP/PNG) for sharing, journaling and stream
+thumbnails. Encoding runs on a small worker pool and the encoded bytes are cached
+by (frame digest, overlay digest, format, quality), so asking again for the same
+snapshot is a cache lookup.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .vision_cache import ContentCache, bytes_digest
+
+SNAPSHOT_WORKERS = int(os.getenv('SNAPSHOT_WORKERS', '2'))
+SNAPSHOT_CACHE_MAX_ENTRIES = int(os.getenv('SNAPSHOT_CACHE_MAX_ENTRIES', '256'))
+SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv('SNAPSHOT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+SNAPSHOT_DEFAULT_QUALITY = int(os.getenv('SNAPSHOT_DEFAULT_QUALITY', '85'))
+
+FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+    'png': ('.png', None),
+}
+
+# Colours mirror OverlayWindow.xaml.cs (BGR)
+RECT_STROKE = (50, 100, 255)
+RECT_FILL_ALPHA = 40 / 255.0
+TEXT_COLOR = (0, 255, 0)
+LINE_COLOR = (255, 255, 0)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_cache = ContentCache(max_entries=SNAPSHOT_CACHE_MAX_ENTRIES, max_bytes=SNAPSHOT_CACHE_MAX_BYTES)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS, thread_name_prefix='snapshot')
+    return _executor
+
+
+def overlay_digest(commands: List[Dict[str, Any]]) -> str:
+    """Digest of an overlay command list (order matters, TTLs do not)."""
+    drawable = [{k: v for k, v in cmd.items() if k != 'ttl'} for cmd in commands]
+    return bytes_digest(json.dumps(drawable, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+
+def _hex_to_bgr(color: Optional[str], default):
+    if not color or not color.startswith('#') or len(color) != 7:
+        return default
+    try:
+        r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    except ValueError:
+        return default
+    return (b, g, r)
+
+
+def render_overlays(frame: np.ndarray, commands: List[Dict[str, Any]]) -> np.ndarray:
+    """Return a copy of `frame` with the overlay commands drawn on it."""
+    img = frame.copy()
+    for cmd in commands:
+        action = cmd.get('action')
+        if action == 'draw_rect':
+            x, y, w, h = int(cmd['x']), int(cmd['y']), int(cmd['w']), int(cmd['h'])
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(img.shape[1], x + w), min(img.shape[0], y + h)
+            if x1 > x0 and y1 > y0:
+                roi = img[y0:y1, x0:x1]
+                fill = np.empty_like(roi)
+                fill[:] = RECT_STROKE
+                cv2.addWeighted(fill, RECT_FILL_ALPHA, roi, 1.0 - RECT_FILL_ALPHA, 0, dst=roi)
+            cv2.rectangle(img, (x, y), (x + w, y + h), RECT_STROKE, 2)
+        elif action == 'draw_text':
+            # OverlayWindow positions text by its top-left corner, putText by the baseline
+            x, y = int(cmd['x']), int(cmd['y'])
+            cv2.putText(img, str(cmd.get('text', '')), (x, y + 16), cv2.FONT_HERSHEY_SIMPLEX, 0.5, TEXT_COLOR, 2, cv2.LINE_AA)
+        elif action in ('draw_line', 'draw_arrow'):
+            p1 = (int(cmd['x1']), int(cmd['y1']))
+            p2 = (int(cmd['x2']), int(cmd['y2']))
+            if action == 'draw_arrow':
+                cv2.arrowedLine(img, p1, p2, LINE_COLOR, 3, cv2.LINE_AA)
+            else:
+                cv2.line(img, p1, p2, LINE_COLOR, 2, cv2.LINE_AA)
+        elif action == 'draw_polyline':
+            pts = np.asarray(cmd.get('points') or [], dtype=np.int32).reshape(-1, 1, 2)
+            if len(pts) >= 2:
+                cv2.polylines(img, [pts], False, _hex_to_bgr(cmd.get('color'), LINE_COLOR), 2, cv2.LINE_AA)
+        elif action == 'clear':
+            img = frame.copy()
+    return img
+
+
+def encode_image(img: np.ndarray, fmt: str = 'jpeg', quality: int = SNAPSHOT_DEFAULT_QUALITY) -> bytes:
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format: {fmt}")
+    ext, quality_flag = FORMATS[fmt]
+    params = [quality_flag, int(max(1, min(100, quality)))] if quality_flag is not None else []
+    ok, buf = cv2.imencode(ext, img, params)
+    if not ok:
+        raise ValueError(f"failed to encode {fmt}")
+    return buf.tobytes()
+
+
+def _snapshot_key(frame_key: str, commands: List[Dict[str, Any]], fmt: str, quality: int) -> str:
+    return f"{frame_key}:{overlay_digest(commands)}:{fmt}:{quality}"
+
+
+def _render_and_store(key: str, frame: np.ndarray, commands: List[Dict[str, Any]], fmt: str, quality: int) -> bytes:
+    data = encode_image(render_overlays(frame, commands), fmt, quality)
+    _cache.put(key, data)
+    return data
+
+
+def render_snapshot(frame: np.ndarray, commands: List[Dict[str, Any]], fmt: str = 'jpeg',
+                    quality: int = SNAPSHOT_DEFAULT_QUALITY, frame_key: Optional[str] = None) -> bytes:
+    """Render and encode an annotated snapshot, reusing cached bytes when possible.
+
+    `frame_key` should be an exact digest of the frame (see `vision_cache.bytes_digest`);
+    it is computed from the pixels when not given.
+    """
+    if frame_key is None:
+        frame_key = bytes_digest(np.ascontiguousarray(frame).tobytes())
+    key = _snapshot_key(frame_key, commands, fmt, quality)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    return _render_and_store(key, frame, commands, fmt, quality)
+
+
+async def render_snapshot_async(frame: np.ndarray, commands: List[Dict[str, Any]], fmt: str = 'jpeg',
+                                quality: int = SNAPSHOT_DEFAULT_QUALITY, frame_key: Optional[str] = None) -> bytes:
+    """`render_snapshot` with drawing and encoding on the snapshot worker pool.
+
+    Cache hits return without leaving the event loop.
+    """
+    if frame_key is None:
+        frame_key = bytes_digest(np.ascontiguousarray(frame).tobytes())
+    key = _snapshot_key(frame_key, commands, fmt, quality)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), _render_and_store, key, frame, commands, fmt, quality)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
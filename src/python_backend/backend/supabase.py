@@ -39,6 +39,31 @@ def sign_in(email: str, password: str) -> Optional[dict]:
     return None
 
 
+async def verify_access_token(token: str) -> Optional[str]:
+    """Return the user id an access token (from `sign_in`) belongs to, or None if it is not valid.
+
+    Asynchronous, on the shared HTTP client: it runs on request paths and must not
+    hold up the event loop while Supabase answers.
+    """
+    if SUPABASE_URL and SUPABASE_KEY:
+        try:
+            from . import provider_client
+            url = f"{SUPABASE_URL}/auth/v1/user"
+            headers = {"apikey": SUPABASE_KEY, "Authorization": f"Bearer {token}"}
+            async with provider_client.get_session().get(url, headers=headers) as r:
+                if r.status == 200:
+                    return (await r.json()).get('id')
+        except Exception:
+            pass
+        return None
+
+    # Mock tokens
+    for u in MOCK_USERS.values():
+        if token == f"mock-token-{u['id']}":
+            return u['id']
+    return None
+
+
 def get_user_profile(user_id: str) -> Optional[dict]:
     if SUPABASE_URL and SUPABASE_KEY:
         try:
@@ -0,0 +1,136 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from . import price_alerts
+from .alert_engine import AlertEngine, compile_condition
+from .alert_index import AlertIndex
+from .main import app
+
+
+def alert(alert_id, condition, symbol='BTC', **params):
+    return {'id': alert_id, 'symbol': symbol, 'condition': condition, 'price': None, 'params': params}
+
+
+def ids(alerts):
+    return sorted(a['id'] for a in alerts)
+
+
+def test_pct_move_measures_from_first_price_or_given_reference():
+    engine = AlertEngine()
+    engine.add_many([alert('up', 'pct_move', percent=5), alert('down', 'pct_move', percent=-5),
+                     alert('fixed', 'pct_move', percent=5, reference_price=100)])
+    assert engine.tick('BTC', 100.0) == []
+    assert engine.tick('BTC', 104.9) == []
+    assert ids(engine.tick('BTC', 105.0)) == ['fixed', 'up']
+    assert ids(engine.tick('BTC', 95.0)) == ['down']
+    assert len(engine) == 0 and engine.symbols() == set()
+
+
+def test_deleting_an_unreferenced_pct_move_before_the_first_tick():
+    engine = AlertEngine()
+    engine.add_many([alert('kept', 'pct_move', percent=5), alert('gone', 'pct_move', percent=5)])
+    assert engine.remove('gone')
+    assert engine.tick('BTC', 100.0) == []
+    assert ids(engine.tick('BTC', 105.0)) == ['kept']
+
+
+def test_only_live_alerts_are_counted_and_idle_symbols_are_forgotten():
+    engine = AlertEngine()
+    engine.add_many([alert('near', 'range_breakout', low=90, high=110),
+                     alert('far', 'range_breakout', low=10, high=1000),
+                     alert('eth', 'range_breakout', symbol='ETH', low=1, high=2)])
+    engine.tick('BTC', 100.0)
+    assert engine.evaluated == 2
+    assert ids(engine.tick('BTC', 120.0)) == ['near']
+    engine.tick('BTC', 120.0)  # the triggered row is still in the columns
+    assert engine.evaluated == 2 + 2 + 1
+    engine.take({'BTC'})
+    assert engine.remove('eth')
+    assert engine._indicators == {}
+
+
+def test_range_breakout_fires_on_either_side():
+    engine = AlertEngine()
+    engine.add_many([alert('a', 'range_breakout', low=90, high=110), alert('b', 'range_breakout', low=80, high=120)])
+    assert engine.tick('BTC', 100.0) == [] and engine.tick('ETH', 1.0) == []
+    assert ids(engine.tick('BTC', 85.0)) == ['a']
+    assert ids(engine.tick('BTC', 121.0)) == ['b']
+
+
+def test_moving_average_crosses_use_completed_bars():
+    engine = AlertEngine(bar_seconds=1)
+    engine.add_many([alert('up', 'cross_above_ma', period=3), alert('down', 'cross_below_ma', period=3)])
+    # three bars closing at 10, 10, 10
+    for second in range(4):
+        assert engine.tick('BTC', 10.0, now=second) == []
+    assert engine.tick('BTC', 9.0, now=3.5) == []  # below the average without crossing down from above
+    assert ids(engine.tick('BTC', 10.5, now=3.6)) == ['up']
+    assert ids(engine.tick('BTC', 9.5, now=3.7)) == ['down']
+
+
+def test_volume_spike_compares_the_current_bar_with_the_average():
+    engine = AlertEngine(bar_seconds=1)
+    engine.add(alert('spike', 'volume_spike', multiplier=3, period=2))
+    for second in range(3):
+        assert engine.tick('BTC', 10.0, volume=1.0, now=second) == []
+    assert engine.tick('BTC', 10.0, volume=1.5, now=2.5) == []
+    assert ids(engine.tick('BTC', 10.0, volume=0.5, now=2.6)) == ['spike']
+
+
+def test_bad_parameters_are_rejected():
+    for bad in (alert('x', 'pct_move', percent=0), alert('x', 'range_breakout', low=5, high=1),
+                alert('x', 'cross_above_ma', period=0), alert('x', 'volume_spike', period=5),
+                alert('x', 'sideways')):
+        with pytest.raises(ValueError):
+            compile_condition(bad)
+
+
+def test_vectorized_evaluation_matches_a_scalar_loop():
+    rng = random.Random(5)
+    alerts = []
+    for i in range(3000):
+        if i % 2:
+            low = rng.uniform(50, 100)
+            alerts.append(alert(str(i), 'range_breakout', low=low, high=low + rng.uniform(1, 50)))
+        else:
+            alerts.append(alert(str(i), 'pct_move', percent=rng.choice((-1, 1)) * rng.uniform(1, 20),
+                                reference_price=100.0))
+    engine = AlertEngine()
+    engine.add_many(alerts)
+    for a in alerts[::7]:
+        engine.remove(a['id'])
+    resting = [a for i, a in enumerate(alerts) if i % 7]
+
+    def fires(a, price):
+        p = a['params']
+        if a['condition'] == 'range_breakout':
+            return price < p['low'] or price > p['high']
+        move = (price - 100.0) / 100.0 * 100.0
+        return move >= p['percent'] if p['percent'] > 0 else move <= p['percent']
+
+    for price in (rng.uniform(60, 140) for _ in range(30)):
+        expected = {a['id'] for a in resting if fires(a, price)}
+        assert set(ids(engine.tick('BTC', price))) == expected
+        resting = [a for a in resting if a['id'] not in expected]
+
+
+def test_alerts_api_routes_conditions_to_the_engine(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'active_alerts', {})
+    monkeypatch.setattr(price_alerts, 'alert_levels', AlertIndex())
+    monkeypatch.setattr(price_alerts, 'alert_conditions', AlertEngine())
+    monkeypatch.setattr(price_alerts.supabase, 'save_alert', lambda alert: None)
+    client = TestClient(app)
+
+    created = client.post('/alerts/create', json={'user_id': 'u1', 'symbol': 'ETH', 'condition': 'pct_move',
+                                                  'percent': -10, 'reference_price': 2000}).json()
+    assert created['success'] and created['alert']['params'] == {'percent': -10, 'reference_price': 2000}
+    assert 'error' in client.post('/alerts/create', json={'user_id': 'u1', 'symbol': 'ETH',
+                                                          'condition': 'volume_spike', 'multiplier': 2}).json()
+    assert price_alerts.alert_symbols() == {'ETH'}
+
+    assert price_alerts.apply_price('ETH', 1900.0) == []
+    [trigger] = price_alerts.apply_price('ETH', 1799.0)
+    assert trigger['condition'] == 'pct_move' and trigger['params']['percent'] == -10
+    assert price_alerts._describe(trigger) == 'moved -10% from $2000'
@@ -0,0 +1,204 @@
+import asyncio
+
+from . import alert_shards, price_alerts
+from .alert_engine import AlertEngine
+from .alert_index import AlertIndex
+from .alert_shards import AlertShards, shard_for
+
+SYMBOLS = [f"S{i}" for i in range(40)]
+
+
+def level(alert_id, symbol, price, condition='above'):
+    return {'id': alert_id, 'user_id': 'u', 'symbol': symbol, 'condition': condition, 'price': price,
+            'notification_type': 'app', 'triggered': False}
+
+
+def test_growing_by_one_shard_moves_only_symbols_to_the_new_one():
+    symbols = [f"C{i}" for i in range(2000)]
+    before = {s: shard_for(s, 4) for s in symbols}
+    after = {s: shard_for(s, 5) for s in symbols}
+    moved = [s for s in symbols if before[s] != after[s]]
+    assert all(after[s] == 4 for s in moved)
+    assert 0.15 < len(moved) / len(symbols) < 0.25
+    assert sorted(set(before.values())) == [0, 1, 2, 3]
+
+
+def test_workers_evaluate_their_slice_and_survive_rebalancing():
+    fired = []
+
+    async def on_triggers(triggered):
+        fired.extend(t['alert_id'] for t in triggered)
+
+    async def run():
+        pool = AlertShards(2, on_triggers, feed=False)
+        await pool.start()
+        try:
+            pool.add(level(f"{s}-up", s, 100.0) for s in SYMBOLS)
+            pool.add(level(f"{s}-down", s, 50.0, 'below') for s in SYMBOLS)
+            await pool.flush()
+            workers = (await pool.stats())['workers']
+            assert sorted(w['alerts'] for w in workers) == sorted(
+                2 * sum(shard_for(s, 2) == i for s in SYMBOLS) for i in range(2))
+            assert len({w['pid'] for w in workers}) == 2
+
+            pool.tick('S0', 101.0)
+            await pool.flush()
+            assert fired == ['S0-up']
+
+            pool.remove('S1-up', 'S1')
+            await pool.resize(3)
+            stats = await pool.stats()
+            assert stats['shards'] == 3 and stats['moved'] > 0
+            assert sum(w['alerts'] for w in stats['workers']) == 2 * len(SYMBOLS) - 2
+
+            for symbol in SYMBOLS:
+                pool.tick(symbol, 101.0)
+            await pool.resize(1)
+            assert (await pool.stats())['workers'][0]['alerts'] == len(SYMBOLS)
+            for symbol in SYMBOLS:
+                pool.tick(symbol, 49.0)
+            await pool.flush()
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+    assert sorted(fired) == sorted([f"{s}-up" for s in SYMBOLS if s != 'S1'] + [f"{s}-down" for s in SYMBOLS])
+
+
+def test_a_worker_that_dies_is_restarted_with_its_alerts():
+    resting = [level(f"{s}-up", s, 100.0) for s in SYMBOLS]
+
+    async def run():
+        pool = AlertShards(2, lambda triggered: asyncio.sleep(0), lambda: resting, feed=False)
+        await pool.start()
+        try:
+            await pool.flush()
+            pool._shards[0].process.kill()
+            for _ in range(100):
+                if pool.restarts:
+                    break
+                await asyncio.sleep(0.05)
+            await pool.flush()
+            return await pool.stats()
+        finally:
+            await pool.stop()
+
+    stats = asyncio.run(run())
+    assert stats['restarts'] == 1
+    assert sum(w['alerts'] for w in stats['workers']) == len(SYMBOLS)
+
+
+def test_a_malformed_alert_is_dropped_without_crashing_the_worker():
+    fired = []
+
+    async def on_triggers(triggered):
+        fired.extend(t['alert_id'] for t in triggered)
+
+    async def run():
+        pool = AlertShards(1, on_triggers, feed=False)
+        await pool.start()
+        try:
+            pool.add([level('good', 'BTC', 100.0), level('bad', 'BTC', None),
+                      {'id': 'odd', 'symbol': 'BTC', 'condition': 'sideways', 'price': 1.0}])
+            pool.tick('BTC', 'not a price')
+            pool.tick('BTC', 101.0)
+            await pool.flush()
+            return await pool.stats()
+        finally:
+            await pool.stop()
+
+    stats = asyncio.run(run())
+    assert stats['restarts'] == 0 and stats['workers'][0]['alerts'] == 0
+    assert fired == ['good']
+
+
+def test_a_worker_that_keeps_dying_is_left_down(monkeypatch):
+    monkeypatch.setattr(alert_shards, '_RESTART_BACKOFF', 0.01)
+    monkeypatch.setattr(alert_shards, 'ALERT_SHARD_MAX_RESTARTS', 2)
+
+    async def run():
+        pool = AlertShards(1, lambda triggered: asyncio.sleep(0), feed=False)
+        await pool.start()
+        try:
+            for restarts in range(3):
+                await pool.flush()
+                pool._shards[0].process.kill()
+                for _ in range(200):
+                    if pool.restarts > restarts or pool._crashes.get(0, 0) > 2:
+                        break
+                    await asyncio.sleep(0.02)
+            await asyncio.sleep(0.1)
+            pool.tick('BTC', 1.0)  # dropped, not raised
+            return await pool.stats()
+        finally:
+            await pool.stop()
+
+    stats = asyncio.run(run())
+    assert stats['restarts'] == 2 and stats['down'] == [0]
+    assert 'down' in stats['workers'][0]['error']
+
+
+def test_resizing_with_a_dead_worker_keeps_every_alert(monkeypatch):
+    monkeypatch.setattr(alert_shards, '_RESTART_BACKOFF', 0.01)
+    symbols = [f"R{i}" for i in range(100)]
+    resting = [level(f"{s}-{side}", s, 100.0) for s in symbols for side in ('a', 'b')]
+
+    async def run():
+        pool = AlertShards(2, lambda triggered: asyncio.sleep(0), lambda: resting, feed=False)
+        await pool.start()
+        try:
+            await pool.flush()
+            pool._shards[0].process.kill()
+            await pool.resize(3)
+            for _ in range(200):
+                if pool.restarts and not any(shard.down for shard in pool._shards):
+                    break
+                await asyncio.sleep(0.02)
+            await pool.flush()
+            return await pool.stats()
+        finally:
+            await pool.stop()
+
+    stats = asyncio.run(run())
+    assert stats['shards'] == 3 and stats['restarts'] == 1
+    assert sorted(w['alerts'] for w in stats['workers']) == sorted(
+        2 * sum(shard_for(s, 3) == i for s in symbols) for i in range(3))
+
+
+def test_price_alerts_route_through_the_shards(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'active_alerts', {})
+    monkeypatch.setattr(price_alerts, 'alert_levels', AlertIndex())
+    monkeypatch.setattr(price_alerts, 'alert_conditions', AlertEngine())
+    monkeypatch.setattr(price_alerts.supabase, 'save_alert', lambda alert: None)
+    monkeypatch.setattr(price_alerts.supabase, 'delete_alert', lambda alert_id: None)
+    notified = []
+
+    async def send_notification(trigger):
+        notified.append(trigger['alert_id'])
+
+    async def fetch_prices(symbols):
+        return {s: 1900.0 for s in symbols}
+
+    monkeypatch.setattr(price_alerts, 'send_notification', send_notification)
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fetch_prices)
+
+    async def run():
+        created = price_alerts.create_alert('u1', 'ETH', 'below', 2000.0)
+        kept = price_alerts.create_alert('u1', 'BTC', 'pct_move', None, params={'percent': 5, 'reference_price': 1900})
+        await price_alerts.start_shards(2, feed=False)
+        try:
+            assert len(price_alerts.alert_levels) == 0 and price_alerts.alert_symbols() == {'ETH', 'BTC'}
+            doomed = price_alerts.create_alert('u1', 'SOL', 'above', 1.0)
+            price_alerts.delete_alert('u1', doomed['id'])
+            assert await price_alerts.check_alerts() == []
+            await alert_shards.get_shards().flush()
+        finally:
+            await price_alerts.stop_shards()
+        return created, kept
+
+    created, kept = asyncio.run(run())
+    assert notified == [created['id']]
+    assert created['triggered'] and created['triggered_price'] == 1900.0 and not kept['triggered']
+    # back in this process: the alerts still resting are indexed here again
+    assert alert_shards.get_shards() is None
+    assert price_alerts.alert_symbols() == {'BTC'} and kept['id'] in price_alerts.alert_conditions
@@ -0,0 +1,72 @@
+from .flow_control import FlowController
+from .test_vision_cache import make_chart_frame
+from . import rate_limit, vision, vision_cache
+
+
+def test_degrades_over_budget_and_recovers_with_hysteresis():
+    flow = FlowController(budget_ms=100, max_fps=10, min_fps=1)
+    first = flow.observe(20)
+    assert first == {'type': 'flow_control', 'target_fps': 10, 'quality': 90, 'level': 0}
+    assert flow.observe(20) is None
+
+    for _ in range(12):
+        flow.observe(400)
+    assert flow.level == flow.max_level
+    assert flow.advice()['target_fps'] < 10
+
+    # a couple of fast frames are not enough to step back up
+    for _ in range(3):
+        flow.observe(10)
+    assert flow.level == flow.max_level
+    for _ in range(60):
+        flow.observe(10)
+    assert flow.level == 0
+    assert flow.advice() == {'target_fps': 10, 'quality': 90, 'level': 0}
+
+
+def test_advice_never_exceeds_the_tier_frame_rate_limit():
+    for tier in rate_limit.TIER_MULTIPLIERS:
+        limit = rate_limit.RateLimiter().limit_for('ws_frame', tier)
+        flow = FlowController(budget_ms=100, max_fps=60, min_fps=1)
+        flow.cap_fps(limit.rate)
+        for ms in (1, 5, 20, 400, 1, 1):
+            flow.observe(ms)
+            assert flow.advice()['target_fps'] <= limit.rate
+    free = FlowController(max_fps=10)
+    free.cap_fps(rate_limit.LIMITS['ws_frame'].rate)
+    assert free.observe(1)['target_fps'] == 5
+
+
+def test_queued_work_counts_as_overload():
+    flow = FlowController(budget_ms=100)
+    for _ in range(2):
+        flow.observe(10, queue_depth=5)
+    assert flow.level == 1
+
+
+def test_reduced_quality_features_are_in_full_frame_coordinates():
+    frame = make_chart_frame()
+    full = vision.detect_chart_features(frame)
+    pyramid, detectors = vision.QUALITY_LEVELS[-1]
+    coarse = vision.detect_chart_features(frame, pyramid, detectors)
+    assert coarse['trendlines'] == [] and coarse['channel'] is None
+    assert coarse['series_step'] == full['series_step'] * 2 ** pyramid
+    assert abs(coarse['poi'][0] - full['poi'][0]) <= 2 ** pyramid * vision.SERIES_STEP
+    assert abs(coarse['poi'][1] - full['poi'][1]) <= 4 * 2 ** pyramid
+
+
+def test_quality_levels_are_cached_separately():
+    frame = make_chart_frame(shift=7)
+    vision_cache.get_shared_cache().invalidate()
+    calls = []
+
+    def compute(tag):
+        def run(f):
+            calls.append(tag)
+            return {'tag': tag}
+        return run
+
+    assert vision_cache.get_features(frame, compute('full'), vision.VISION_VERSION)['tag'] == 'full'
+    assert vision_cache.get_features(frame, compute('coarse'), vision.VISION_VERSION, '-q3')['tag'] == 'coarse'
+    assert vision_cache.get_features(frame, compute('again'), vision.VISION_VERSION, '-q3')['tag'] == 'coarse'
+    assert calls == ['full', 'coarse']
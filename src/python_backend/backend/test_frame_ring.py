@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from . import main
+from .frame_ring import FrameRing
+from .main import app
+
+
+def _chart(h=240, w=320):
+    img = np.full((h, w, 3), 255, dtype=np.uint8)
+    xs = np.arange(w)
+    ys = (h / 2 + 40 * np.sin(xs / 25.0)).astype(int)
+    img[ys, xs] = 0
+    return img
+
+
+def test_write_and_view_round_trip():
+    ring = FrameRing.create(320, 240, slots=3)
+    try:
+        client = FrameRing.attach(ring.name)
+        frame = _chart()
+        client.write(1, 7, frame)
+        view = ring.view(1, 7)
+        assert view is not None and np.array_equal(view, frame)
+        # the view aliases shared memory rather than copying it
+        assert not view.flags.owndata
+        assert ring.view(1, 6) is None
+        assert ring.view(0, 7) is None
+        del view
+        client.close()
+    finally:
+        ring.close()
+
+
+def test_rejects_oversized_frames_and_slots():
+    ring = FrameRing.create(64, 48, slots=2)
+    try:
+        with pytest.raises(ValueError):
+            ring.write(0, 1, np.zeros((100, 100, 3), dtype=np.uint8))
+        with pytest.raises(ValueError):
+            ring.view(2, 1)
+    finally:
+        ring.close()
+    with pytest.raises(ValueError):
+        FrameRing.create(0, 10)
+
+
+def test_shm_frames_over_websocket(monkeypatch):
+    monkeypatch.setattr(main, '_is_local_client', lambda ws: True)
+    frame = _chart()
+
+    with TestClient(app).websocket_connect('/ws') as ws:
+        ws.receive_json()  # session id
+        ws.send_json({'type': 'shm_attach', 'width': 320, 'height': 240, 'slots': 2})
+        attached = ws.receive_json()
+        assert attached['type'] == 'shm_attached' and attached['slots'] == 2
+
+        client = FrameRing.attach(attached['name'])
+        try:
+            for seq in (1, 2):
+                client.write(seq % 2, seq, frame)
+                ws.send_json({'type': 'shm_frame', 'slot': seq % 2, 'seq': seq})
+                received = []
+                while True:
+                    msg = ws.receive_json()
+                    if msg.get('message') == 'processed_frame':
+                        break
+                    received.append(msg)
+                assert {'type': 'shm_release', 'seq': seq} in received
+                if seq == 1:
+                    assert any(m.get('action') == 'draw_rect' for m in received)
+
+            # a slot whose seq does not match is refused, not analysed
+            ws.send_json({'type': 'shm_frame', 'slot': 0, 'seq': 99})
+            assert ws.receive_json() == {'type': 'shm_release', 'seq': 99}
+            assert ws.receive_json() == {'type': 'error', 'message': 'invalid shared-memory frame'}
+        finally:
+            client.close()
+
+
+def test_shm_attach_refused_for_remote_clients():
+    with TestClient(app).websocket_connect('/ws') as ws:
+        ws.receive_json()
+        ws.send_json({'type': 'shm_attach', 'width': 320, 'height': 240})
+        assert ws.receive_json()['message'] == 'shared-memory transport not available'
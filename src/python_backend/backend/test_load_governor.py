@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from . import load_governor, price_feed
+from .load_governor import LoadGovernor
+from .main import app
+
+
+def test_escalates_on_sustained_lag_and_recovers_with_hysteresis():
+    governor = LoadGovernor(lag_ms=(50, 150, 400), queue_depth=(32, 96, 192))
+    assert governor.observe(200, 0) == 0
+    assert governor.observe(200, 0) == 2
+    assert governor.latest_only and not governor.rejecting_sessions
+    # just under the threshold is not enough to recover
+    for _ in range(50):
+        governor.observe(100, 0)
+    assert governor.level == 2
+    for _ in range(load_governor._RECOVER_AFTER):
+        governor.observe(10, 0)
+    assert governor.level == 1
+    assert governor.skip_detectors
+
+
+def test_queue_depth_alone_triggers_shedding():
+    governor = LoadGovernor(lag_ms=(50, 150, 400), queue_depth=(32, 96, 192))
+    governor.observe(0, 500)
+    governor.observe(0, 500)
+    assert governor.rejecting_sessions
+    assert governor.stats()['state'] == 'reject_sessions'
+
+
+def test_overloaded_server_rejects_new_sessions_but_reports_state(monkeypatch):
+    governor = LoadGovernor()
+    governor.level = load_governor.REJECT_SESSIONS
+    monkeypatch.setattr(load_governor, '_governor', governor)
+    client = TestClient(app)
+    assert client.get('/health').json()['load']['state'] == 'reject_sessions'
+    with client.websocket_connect('/ws') as ws:
+        try:
+            ws.receive_json()
+            raise AssertionError('session was accepted')
+        except WebSocketDisconnect as e:
+            assert e.code == 1013
+            assert 'retry after' in e.reason
+    assert client.get('/metrics').json()['load_governor']['shed']['reject_sessions'] == 1
+
+
+def test_lifespan_starts_and_stops_the_lag_sampler(monkeypatch):
+    monkeypatch.setattr(price_feed, 'PRICE_FEED_ENABLED', False)
+    with TestClient(app):
+        task = load_governor.get_governor()._task
+        assert task is not None and not task.done()
+    assert task.cancelled() and load_governor.get_governor()._task is None
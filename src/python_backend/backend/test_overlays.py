@@ -0,0 +1,109 @@
+import numpy as np
+from . import overlays
+
+
+def _max_deviation(points, simplified):
+    # perpendicular distance from each original point to the simplified segment spanning its x
+    worst = 0.0
+    for a, b in zip(simplified, simplified[1:]):
+        inside = points[(points[:, 0] >= a[0]) & (points[:, 0] <= b[0])]
+        seg = b - a
+        dist = np.abs(seg[0] * (inside[:, 1] - a[1]) - seg[1] * (inside[:, 0] - a[0])) / np.hypot(*seg)
+        worst = max(worst, dist.max())
+    return worst
+
+
+def test_simplify_polyline_respects_tolerance():
+    xs = np.arange(0, 1000, 2.0)
+    pts = np.column_stack([xs, 200 + 50 * np.sin(xs / 80.0)])
+    simplified = overlays.simplify_polyline(pts, 1.0)
+    assert len(simplified) < len(pts) // 10
+    assert (simplified[0] == pts[0]).all() and (simplified[-1] == pts[-1]).all()
+    assert _max_deviation(pts, simplified) <= 1.0 + 1e-9
+
+
+def test_straight_line_collapses_to_end_points():
+    pts = np.column_stack([np.arange(100.0), np.arange(100.0) * 0.5])
+    assert len(overlays.simplify_polyline(pts, 0.5)) == 2
+
+
+def test_indicator_polylines_only_resent_when_shape_changes():
+    features = {'price_series': list(range(100)), 'sma_short': [float(v) for v in range(3, 100)],
+                'sma_long': [], 'series_step': 2}
+    commands = overlays.build_indicator_polylines(features)
+    assert [c['id'] for c in commands] == ['sma_short']
+    assert commands[0]['points'] == [[6, 3], [198, 99]]
+
+    tracker = overlays.KeyedOverlayTracker()
+    assert tracker.filter(commands, now=0.0) == commands
+    assert tracker.filter(commands, now=1.0) == []
+    # keep-alive once half the TTL has passed
+    assert tracker.filter(commands, now=commands[0]['ttl']) == commands
+
+    features['sma_short'][-1] = 120.0
+    assert len(tracker.filter(overlays.build_indicator_polylines(features), now=commands[0]['ttl'] + 0.1)) == 1
+
+
+def test_overlay_state_sends_snapshot_then_only_changes():
+    state = overlays.OverlayState()
+    features = {'poi': (200, 100)}
+    frame = overlays.build_frame_overlays(features, 'free')
+
+    first = state.diff(frame, now=0.0)
+    assert first['action'] == 'snapshot'
+    assert {c['id'] for c in first['items']} == {'poi_rect', 'poi_label'}
+
+    # static chart: nothing to send until the TTL needs refreshing
+    assert state.diff(frame, now=1.0) is None
+    assert state.diff(frame, now=3.0) == {"type": "overlay", "action": "delta",
+                                          "refresh": {'poi_rect': 5, 'poi_label': 5}}
+
+    moved = overlays.build_frame_overlays({'poi': (260, 100)}, 'free')
+    delta = state.diff(moved, now=3.5)
+    assert [c['id'] for c in delta['update']] == ['poi_rect', 'poi_label']
+
+    assert state.diff([], now=4.0) == {"type": "overlay", "action": "delta", "remove": ['poi_rect', 'poi_label']}
+
+    state.request_snapshot()
+    assert state.diff(moved, now=5.0)['action'] == 'snapshot'
+
+
+def test_signal_overlays_are_held_until_their_ttl():
+    state = overlays.OverlayState()
+    signal = {'side': 'BUY', 'price': 1000.0, 'sl': 998.0, 'tp1': 1006.0}
+    state.diff(overlays.build_frame_overlays({'poi': (200, 100)}, 'master', signal), now=0.0)
+
+    without_signal = overlays.build_frame_overlays({'poi': (200, 100)}, 'master')
+    assert state.diff(without_signal, now=1.0) is None
+    assert {c['id'] for c in state.items()} >= {'signal_text', 'signal_rect'}
+    state.diff(without_signal, now=9.0)
+    assert {c['id'] for c in state.items()} == {'poi_rect', 'poi_label'}
+
+
+def test_websocket_delta_clients_get_nothing_for_a_static_chart():
+    import base64
+    import cv2
+    from fastapi.testclient import TestClient
+    from .main import app
+    from .test_vision_cache import make_chart_frame
+
+    ok, buf = cv2.imencode('.png', make_chart_frame())
+    frame_msg = {'type': 'frame', 'data': base64.b64encode(buf.tobytes()).decode('ascii')}
+
+    def send_frame(ws):
+        ws.send_json(frame_msg)
+        received = []
+        while True:
+            msg = ws.receive_json()
+            if msg.get('message') == 'processed_frame':
+                return received
+            if msg.get('type') == 'overlay':
+                received.append(msg)
+
+    with TestClient(app).websocket_connect('/ws') as ws:
+        ws.receive_json()  # session id
+        ws.send_json({'type': 'hello', 'capabilities': ['overlay_delta', 'unknown']})
+        assert ws.receive_json()['capabilities'] == ['overlay_delta']
+        first = send_frame(ws)
+        assert [m['action'] for m in first] == ['snapshot']
+        assert send_frame(ws) == []
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from . import price_alerts, provider_client
+from .alert_index import AlertIndex
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import price_standin  # noqa: E402
+
+
+def with_standin(monkeypatch, body):
+    """Run `body(walk)` against a local price stand-in; `walk.requests` counts hits."""
+    async def run():
+        runner, base_url = await price_standin.start()
+        monkeypatch.setattr(provider_client, 'BINANCE_API_URL', base_url)
+        try:
+            return await body(runner.app[price_standin.WALK])
+        finally:
+            await provider_client.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_prices_share_one_pooled_session(monkeypatch):
+    async def body(walk):
+        first = await price_alerts.get_binance_price('BTC')
+        session = provider_client.get_session()
+        second = await price_alerts.get_binance_price('ETH')
+        assert provider_client.get_session() is session
+        return first, second
+
+    first, second = with_standin(monkeypatch, body)
+    assert first > 0 and second > 0
+    assert price_alerts.price_cache.get('ETH').price == second
+
+
+def test_check_alerts_fetches_each_symbol_once(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'active_alerts', {})
+    monkeypatch.setattr(price_alerts, 'alert_levels', AlertIndex())
+    monkeypatch.setattr(price_alerts.supabase, 'save_alert', lambda alert: None)
+    for i in range(300):
+        price_alerts.create_alert(f"user{i % 7}", ('BTC', 'ETH', 'SOL')[i % 3], 'above', 0.0 if i % 2 else 1e12)
+
+    async def body(walk):
+        return await price_alerts.check_alerts(), walk.requests
+
+    triggered, requests = with_standin(monkeypatch, body)
+    assert requests == 1
+    assert len(triggered) == 150
+    assert {t['symbol'] for t in triggered} == {'BTC', 'ETH', 'SOL'}
+
+
+def test_level_alert_without_a_price_is_rejected_before_storing(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'active_alerts', {})
+    monkeypatch.setattr(price_alerts, 'alert_levels', AlertIndex())
+    monkeypatch.setattr(price_alerts.supabase, 'save_alert', lambda alert: None)
+    for price in (None, 'soon'):
+        with pytest.raises(ValueError):
+            price_alerts.create_alert('u1', 'BTC', 'above', price)
+    assert price_alerts.get_user_alerts('u1') == [] and len(price_alerts.alert_levels) == 0
+    assert price_alerts.create_alert('u1', 'BTC', 'below', '100')['price'] == 100.0
+
+
+def test_alert_index_triggers_exactly_the_crossed_levels():
+    index = AlertIndex()
+    for i, level in enumerate((90, 100, 100, 110)):
+        index.add({'id': f"up{i}", 'symbol': 'BTC', 'condition': 'above', 'price': level})
+        index.add({'id': f"down{i}", 'symbol': 'BTC', 'condition': 'below', 'price': level})
+    index.add({'id': 'eth', 'symbol': 'ETH', 'condition': 'above', 'price': 1})
+    assert index.remove('up3') and not index.remove('up3')
+
+    assert sorted(a['id'] for a in index.trigger('BTC', 100)) == ['down1', 'down2', 'down3', 'up0', 'up1', 'up2']
+    assert index.trigger('BTC', 100) == []
+    assert [a['id'] for a in index.trigger('BTC', 50)] == ['down0']
+    assert len(index) == 1 and index.symbols() == {'ETH'}
+
+
+def test_alert_index_matches_linear_scan():
+    import random
+    rng = random.Random(3)
+    index, alerts = AlertIndex(), []
+    for i in range(2000):
+        alert = {'id': str(i), 'symbol': 'BTC', 'condition': rng.choice(('above', 'below')),
+                 'price': round(rng.uniform(0, 100), 1)}
+        alerts.append(alert)
+        index.add(alert)
+    for alert in alerts[::5]:
+        index.remove(alert['id'])
+    resting = [a for i, a in enumerate(alerts) if i % 5]
+    for price in (rng.uniform(0, 100) for _ in range(20)):
+        expected = {a['id'] for a in resting if (a['condition'] == 'above' and price >= a['price'])
+                    or (a['condition'] == 'below' and price <= a['price'])}
+        assert {a['id'] for a in index.trigger('BTC', price)} == expected
+        resting = [a for a in resting if a['id'] not in expected]
+
+
+def test_bulk_load_matches_single_inserts():
+    alerts = [{'id': str(i), 'symbol': 'ETH', 'condition': ('above', 'below')[i % 2], 'price': (i * 37) % 101}
+              for i in range(500)]
+    one_by_one, bulk = AlertIndex(), AlertIndex()
+    for alert in alerts[:100]:
+        one_by_one.add(alert)
+        bulk.add(alert)
+    for alert in alerts[100:]:
+        one_by_one.add(alert)
+    bulk.add_many(alerts[100:])
+    for price in (10, 50, 90):
+        assert {a['id'] for a in bulk.trigger('ETH', price)} == {a['id'] for a in one_by_one.trigger('ETH', price)}
@@ -0,0 +1,85 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from . import price_alerts
+from .main import app
+from .price_cache import PriceCache
+from .test_price_alerts import with_standin
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    calls = []
+
+    async def fetch_many(symbols):
+        calls.append(symbols)
+        await asyncio.sleep(0.01)
+        return {s: 10.0 for s in symbols}
+
+    async def run():
+        cache = PriceCache(ttl=5, max_stale=30)
+        results = await asyncio.gather(*(cache.get_many(['BTC'], fetch_many) for _ in range(50)))
+        return cache, results
+
+    cache, results = asyncio.run(run())
+    assert calls == [['BTC']]
+    assert all(r['BTC'].price == 10.0 for r in results)
+    assert cache.stats()['coalesced'] == 49
+
+
+def test_stale_prices_are_served_while_revalidating_and_expire():
+    clock = [0.0]
+    prices = iter([1.0, 2.0])
+    calls = []
+
+    async def fetch_many(symbols):
+        calls.append(symbols)
+        return {s: next(prices) for s in symbols}
+
+    async def run():
+        cache = PriceCache(ttl=2, max_stale=10, clock=lambda: clock[0])
+        first = (await cache.get_many(['ETH'], fetch_many))['ETH'].price
+        clock[0] = 5
+        stale = (await cache.get_many(['ETH'], fetch_many))['ETH'].price
+        await asyncio.sleep(0)  # background refresh
+        fresh = (await cache.get_many(['ETH'], fetch_many))['ETH'].price
+        clock[0] = 100
+        return first, stale, fresh, cache.get('ETH')
+
+    first, stale, fresh, expired = asyncio.run(run())
+    assert (first, stale, fresh) == (1.0, 1.0, 2.0)
+    assert len(calls) == 2
+    assert expired is None
+
+
+def test_known_symbols_come_from_cached_exchange_info(monkeypatch):
+    monkeypatch.setattr(price_alerts, '_exchange_symbols', None)
+    monkeypatch.setattr(price_alerts, '_exchange_checked', float('-inf'))
+
+    async def body(walk):
+        first = await asyncio.gather(*(price_alerts.known_symbols() for _ in range(5)))
+        again = await price_alerts.known_symbols()
+        return first, again, walk.requests
+
+    first, again, requests = with_standin(monkeypatch, body)
+    assert 'BTC' in again and 'NOTACOIN' not in again
+    assert all(known == again for known in first)
+    assert requests == 1
+
+
+def test_bulk_prices_endpoint_reports_unknown_symbols(monkeypatch):
+    async def fake_prices(symbols):
+        return {s: 3.0 for s in symbols}
+
+    async def listed():
+        return {'BTC', 'ETH'}
+
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fake_prices)
+    monkeypatch.setattr(price_alerts, 'known_symbols', listed)
+    client = TestClient(app)
+    body = client.get('/prices?symbols=btc,ETH,NOPE').json()
+    assert set(body['prices']) == {'BTC', 'ETH'}
+    assert body['prices']['BTC']['price'] == 3.0
+    assert body['unknown'] == ['NOPE']
+    assert client.get('/price/NOPE').json() == {'error': 'Unknown symbol NOPE'}
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from . import main, price_alerts, price_fanout, price_feed, provider_client
+from .main import app
+from .price_cache import PriceCache
+from .test_price_alerts import price_standin
+from .test_price_feed import wait_for
+
+
+def test_normalize_symbol():
+    assert [price_fanout.normalize_symbol(s) for s in ('btc', 'BTCUSDT', ' eth ', 'USDT')] == ['BTC', 'BTC', 'ETH', 'USDT']
+
+
+def test_coalesces_to_max_rate_and_keeps_newest(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+    fanout = price_fanout.PriceFanout(poll_interval=60)
+    fanout.upstream_live = lambda: True
+    batches = []
+
+    async def run():
+        sub = fanout.subscribe(batches.append, max_rate=10)
+        sub.update(add={'BTC', 'ETH'})
+        for i in range(50):
+            fanout.publish('BTC', 100.0 + i)
+            fanout.publish('ETH', 10.0 + i)
+            await asyncio.sleep(0.004)
+        await asyncio.sleep(0.15)
+        sub.close()
+        return sub
+
+    sub = asyncio.run(run())
+    # ~0.2s at 10 batches/s, each batch holding the newest price per symbol
+    assert 2 <= len(batches) <= 4
+    assert all(len(batch) == 2 for batch in batches)
+    assert {t['symbol']: t['price'] for t in batches[-1]} == {'BTC': 149.0, 'ETH': 59.0}
+    assert sub.coalesced > 90
+    assert fanout.symbols() == set()
+
+
+def test_publish_reaches_only_subscribers_of_the_symbol(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+    fanout = price_fanout.PriceFanout(poll_interval=60)
+    fanout.upstream_live = lambda: True
+    changes, got = [], {'a': [], 'b': []}
+    fanout.on_change = lambda: changes.append(fanout.symbols())
+
+    async def run():
+        a = fanout.subscribe(got['a'].extend, max_rate=1000)
+        b = fanout.subscribe(got['b'].extend, max_rate=1000)
+        a.update(add={'BTC'})
+        b.update(add={'BTC', 'ETH'})
+        fanout.publish('ETH', 2.0)
+        fanout.publish('SOL', 3.0)
+        await asyncio.sleep(0.01)
+        b.update(remove={'BTC'})
+        a.close()
+        b.close()
+
+    asyncio.run(run())
+    assert [t['symbol'] for t in got['a']] == []
+    assert [t['symbol'] for t in got['b']] == ['ETH']
+    # only changes to the set of watched symbols are reported upstream
+    assert changes == [{'BTC'}, {'BTC', 'ETH'}, {'ETH'}, set()]
+
+
+def test_many_viewers_share_one_upstream_subscription_per_symbol(monkeypatch):
+    """500 viewers of 3 symbols: the exchange stream carries 3 subscriptions."""
+    monkeypatch.setattr(price_feed, '_BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+    symbols = ('BTC', 'ETH', 'SOL')
+
+    async def run():
+        runner, base_url = await price_standin.start(tick_ms=10)
+        feed = price_feed.PriceFeed(url=base_url.replace('http', 'ws') + '/ws')
+        fanout = price_fanout.PriceFanout(poll_interval=60)
+        feed.add_source('viewers', fanout.symbols)
+        feed.add_listener(fanout.publish)
+        fanout.upstream_live = lambda: feed.connected
+        fanout.on_change = feed.refresh
+        received = [0] * 500
+        subs = []
+        for n in range(len(received)):
+            def deliver(ticks, n=n):
+                received[n] += len(ticks)
+            sub = fanout.subscribe(deliver, max_rate=20)
+            sub.update(add={symbols[n % len(symbols)]})
+            subs.append(sub)
+        try:
+            await feed.start()
+            await wait_for(lambda: all(received))
+            return feed.stats()['subscribed'], fanout.stats()
+        finally:
+            for sub in subs:
+                sub.close()
+            await feed.stop()
+            await provider_client.close()
+            await runner.cleanup()
+
+    subscribed, stats = asyncio.run(run())
+    assert subscribed == len(symbols)
+    assert stats['symbols'] == len(symbols) and stats['subscriptions'] == 500
+
+
+def test_polls_one_bulk_request_while_stream_is_down(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache(ttl=0))
+    calls = []
+
+    async def fake_prices(symbols):
+        calls.append(sorted(symbols))
+        return {s: 1.0 for s in symbols}
+
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fake_prices)
+    fanout = price_fanout.PriceFanout(poll_interval=0.02)
+    got = []
+
+    async def run():
+        subs = [fanout.subscribe(got.extend, max_rate=1000) for _ in range(20)]
+        for sub in subs:
+            sub.update(add={'BTC', 'ETH'})
+        await asyncio.sleep(0.1)
+        for sub in subs:
+            sub.close()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert calls and all(c == ['BTC', 'ETH'] for c in calls)
+    # ~5 polls for 20 viewers, not one per viewer
+    assert len(calls) <= 8
+    assert {t['symbol'] for t in got} == {'BTC', 'ETH'}
+
+
+def test_sse_stream_pushes_ticks(monkeypatch):
+    async def fake_prices(symbols):
+        return {s: 42.0 for s in symbols}
+
+    async def fake_known():
+        return {'BTC', 'ETH'}
+
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fake_prices)
+    monkeypatch.setattr(price_alerts, 'known_symbols', fake_known)
+
+    client = TestClient(app)
+    assert client.get('/prices/stream', params={'symbols': 'btc,DOGE'}).status_code == 400
+
+    async def run():
+        # The test client buffers whole bodies, so read the endless stream directly
+        request = Request({'type': 'http', 'method': 'GET', 'path': '/prices/stream', 'headers': [],
+                           'query_string': b'', 'client': ('127.0.0.1', 1)})
+        response = await main.stream_prices('btcusdt', request)
+        body = response.body_iterator
+        try:
+            async for chunk in body:
+                if chunk.startswith('data: '):
+                    event = json.loads(chunk[len('data: '):])
+                    break
+        finally:
+            await body.aclose()
+        return response.media_type, event
+
+    media_type, event = asyncio.run(run())
+    assert media_type == 'text/event-stream'
+    assert (event['symbol'], event['price']) == ('BTC', 42.0)
+    assert main.price_fanout.get_fanout().symbols() == set()
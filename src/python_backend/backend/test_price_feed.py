@@ -0,0 +1,107 @@
+import asyncio
+
+from . import price_alerts, price_feed, provider_client
+from .alert_index import AlertIndex
+from .test_price_alerts import price_standin
+
+
+async def wait_for(predicate, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+def run_feed(monkeypatch, body):
+    """Run `body(feed, app)` with a feed streaming from a local stand-in."""
+    monkeypatch.setattr(price_feed, '_BACKOFF_BASE', 0.01)
+
+    async def run():
+        runner, base_url = await price_standin.start(tick_ms=10)
+        feed = price_feed.PriceFeed(url=base_url.replace('http', 'ws') + '/ws')
+        try:
+            return await body(feed, runner.app)
+        finally:
+            await feed.stop()
+            await provider_client.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_ticks_trigger_alerts_and_follow_interest(monkeypatch):
+    monkeypatch.setattr(price_alerts, 'active_alerts', {})
+    monkeypatch.setattr(price_alerts, 'alert_levels', AlertIndex())
+    monkeypatch.setattr(price_alerts.supabase, 'save_alert', lambda alert: None)
+    alert = price_alerts.create_alert('u1', 'BTC', 'above', 1.0, 'app')
+    wanted = {'BTC'}
+    seen = []
+
+    async def body(feed, app):
+        feed.add_source('test', lambda: wanted)
+        feed.add_listener(lambda symbol, price: seen.append(symbol))
+        await feed.start()
+        await wait_for(lambda: alert['triggered'])
+        wanted.add('ETH')
+        feed.refresh()
+        await wait_for(lambda: 'ETH' in seen)
+        wanted.clear()
+        feed.refresh()
+        await asyncio.sleep(0.1)
+        count = len(seen)
+        await asyncio.sleep(0.1)
+        return count, len(seen)
+
+    before, after = run_feed(monkeypatch, body)
+    assert alert['triggered_price'] > 1.0
+    assert before == after
+
+
+def test_reconnects_and_resubscribes_after_drop(monkeypatch):
+    seen = []
+
+    async def body(feed, app):
+        feed.add_source('test', lambda: {'SOL'})
+        feed.add_listener(lambda symbol, price: seen.append(symbol))
+        await feed.start()
+        await wait_for(lambda: seen)
+        await price_standin.drop_streams(app)
+        seen.clear()
+        await wait_for(lambda: seen)
+        return app[price_standin.WALK].stream_connections, feed.stats()
+
+    connections, stats = run_feed(monkeypatch, body)
+    assert connections == 2
+    assert stats['connected'] and stats['subscribed'] == 1
+
+
+def test_bad_messages_and_failing_callbacks_keep_the_connection(monkeypatch):
+    apply_price = price_alerts.apply_price
+    calls = {'apply': 0, 'listener': 0}
+
+    def flaky_apply(symbol, price, volume=0.0):
+        calls['apply'] += 1
+        if calls['apply'] == 1:
+            raise ValueError('unreadable tick')
+        return [{'alert_id': 'a'}] if calls['apply'] == 2 else apply_price(symbol, price, volume)
+
+    def failing_listener(symbol, price):
+        calls['listener'] += 1
+        raise RuntimeError('listener bug')
+
+    async def failing_notify(triggered):
+        raise RuntimeError('notifier down')
+
+    monkeypatch.setattr(price_alerts, 'apply_price', flaky_apply)
+
+    async def body(feed, app):
+        feed.on_triggers = failing_notify
+        feed.add_source('test', lambda: {'BTC'})
+        feed.add_listener(failing_listener)
+        await feed.start()
+        await wait_for(lambda: calls['listener'] >= 5)
+        return feed.stats()
+
+    stats = run_feed(monkeypatch, body)
+    assert stats['connections'] == 1 and stats['connected']
+    assert stats['dropped'] == 1
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+from . import price_alerts, price_providers, provider_client
+from .price_cache import PriceCache
+from .price_providers import CircuitBreaker, HedgedFetcher, Provider
+from .test_price_alerts import price_standin
+
+
+def fixed(prices, delay=0.0, error=None):
+    calls = []
+
+    async def fetch_many(symbols):
+        calls.append(list(symbols))
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return {s: prices[s] for s in symbols if s in prices}
+
+    fetch_many.calls = calls
+    return fetch_many
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_slow_primary_is_hedged_and_secondary_wins():
+    primary = Provider('primary', fixed({'BTC': 1.0}, delay=1.0))
+    secondary = Provider('secondary', fixed({'BTC': 2.0}))
+    fetcher = HedgedFetcher([primary, secondary], max_delay_ms=30)
+
+    async def run():
+        started = time.perf_counter()
+        prices = await fetcher.fetch(['BTC'])
+        return prices, time.perf_counter() - started
+
+    prices, elapsed = asyncio.run(run())
+    assert prices == {'BTC': 2.0}
+    assert elapsed < 0.5
+    assert fetcher.hedges == 1 and secondary.wins == 1 and primary.wins == 0
+    # the losing request was cancelled, which is neither an error nor a breaker failure
+    assert primary.errors == 0 and primary.breaker.failures == 0
+
+
+def test_fast_primary_is_not_hedged():
+    primary_fetch, secondary_fetch = fixed({'BTC': 1.0}), fixed({'BTC': 2.0})
+    fetcher = HedgedFetcher([Provider('primary', primary_fetch), Provider('secondary', secondary_fetch)])
+    assert asyncio.run(fetcher.fetch(['BTC', 'BTC'])) == {'BTC': 1.0}
+    assert primary_fetch.calls == [['BTC']] and secondary_fetch.calls == []
+    assert fetcher.hedges == 0
+
+
+def test_failure_hands_over_without_waiting_for_the_hedge_delay():
+    fetcher = HedgedFetcher([Provider('primary', fixed({}, error=RuntimeError('down'))),
+                             Provider('secondary', fixed({'ETH': 3.0}))], max_delay_ms=5000)
+
+    async def run():
+        started = time.perf_counter()
+        return await fetcher.fetch(['ETH']), time.perf_counter() - started
+
+    prices, elapsed = asyncio.run(run())
+    assert prices == {'ETH': 3.0} and elapsed < 1.0
+    assert fetcher.providers[0].errors == 1
+
+
+def test_all_failing_returns_nothing():
+    fetcher = HedgedFetcher([Provider('a', fixed({}, error=RuntimeError('x'))),
+                             Provider('b', fixed({}, error=RuntimeError('y')))])
+    assert asyncio.run(fetcher.fetch(['BTC'])) == {}
+    assert fetcher.failures == 1
+
+
+def test_empty_or_partial_answers_hand_the_rest_to_the_next_provider():
+    empty, partial, full = fixed({}), fixed({'BTC': 1.0}), fixed({'BTC': 2.0, 'ETH': 3.0})
+    fetcher = HedgedFetcher([Provider('empty', empty), Provider('partial', partial), Provider('full', full)],
+                            max_delay_ms=5000)
+    assert asyncio.run(fetcher.fetch(['BTC', 'ETH'])) == {'BTC': 1.0, 'ETH': 3.0}
+    assert partial.calls == [['BTC', 'ETH']] and full.calls == [['ETH']]
+    assert fetcher.partials == 2 and fetcher.failures == 0 and fetcher.providers[2].wins == 1
+
+    lonely = HedgedFetcher([Provider('only', fixed({'BTC': 1.0}))])
+    assert asyncio.run(lonely.fetch(['BTC', 'NOPE'])) == {'BTC': 1.0}
+    assert lonely.failures == 0 and lonely.stats()['hedging'] is False
+
+
+def test_hedge_delay_follows_latency_quantile():
+    provider = Provider('p', fixed({}))
+    fetcher = HedgedFetcher([provider], quantile=0.95, min_delay_ms=20, max_delay_ms=500)
+    assert fetcher.hedge_delay(provider) == 0.5  # no history yet
+    provider.latencies.extend([0.1] * 95 + [0.3] * 5)
+    assert fetcher.hedge_delay(provider) == 0.3
+    provider.latencies.clear()
+    provider.latencies.extend([0.001] * 50)
+    assert fetcher.hedge_delay(provider) == 0.02
+
+
+def test_breaker_opens_skips_and_recovers_through_a_trial():
+    clock = FakeClock()
+    broken = {'down': True}
+
+    async def flaky(symbols):
+        if broken['down']:
+            raise RuntimeError('503')
+        return {s: 1.0 for s in symbols}
+
+    primary = Provider('primary', flaky, CircuitBreaker(failures=3, cooldown=30, clock=clock))
+    backup_fetch = fixed({'BTC': 2.0})
+    fetcher = HedgedFetcher([primary, Provider('backup', backup_fetch)])
+
+    async def run():
+        for _ in range(5):
+            assert await fetcher.fetch(['BTC']) == {'BTC': 2.0}
+        opened = (primary.breaker.state, primary.requests)
+        clock.now = 31
+        broken['down'] = False
+        recovered = await fetcher.fetch(['BTC'])
+        return opened, recovered
+
+    (state, requests), recovered = asyncio.run(run())
+    assert state == CircuitBreaker.OPEN
+    assert requests == 3  # skipped once open
+    assert recovered == {'BTC': 1.0}
+    assert primary.breaker.state == CircuitBreaker.CLOSED and primary.breaker.opens == 1
+
+
+def test_failed_trial_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=2, cooldown=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.allow() and not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opens == 2
+
+
+def test_hedging_cuts_tail_latency_against_stand_ins(monkeypatch):
+    """A primary with a slow tail (20% of requests +400 ms) next to a healthy mirror."""
+    monkeypatch.setattr(price_alerts, 'price_cache', PriceCache())
+
+    async def run():
+        slow, slow_url = await price_standin.start(slow_ratio=0.2, slow_ms=400)
+        mirror, mirror_url = await price_standin.start()
+        monkeypatch.setattr(provider_client, 'BINANCE_API_URL', slow_url)
+        monkeypatch.setattr(price_providers, 'BINANCE_MIRROR_URL', mirror_url)
+        fetcher = HedgedFetcher(price_providers.default_providers(), max_delay_ms=50)
+        monkeypatch.setattr(price_providers, '_fetcher', fetcher)
+        latencies = []
+        try:
+            for _ in range(40):
+                started = time.perf_counter()
+                prices = await price_alerts.fetch_prices(['BTC', 'ETH'])
+                latencies.append(time.perf_counter() - started)
+                assert set(prices) == {'BTC', 'ETH'}
+        finally:
+            await provider_client.close()
+            await slow.cleanup()
+            await mirror.cleanup()
+        return latencies, fetcher
+
+    latencies, fetcher = asyncio.run(run())
+    assert max(latencies) < 0.3
+    assert fetcher.hedges > 0
+    assert fetcher.providers[1].wins > 0
+    assert price_alerts.price_cache.get('ETH') is not None
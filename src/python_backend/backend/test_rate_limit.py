@@ -0,0 +1,124 @@
+from fastapi.testclient import TestClient
+
+from collections import OrderedDict
+
+from . import main, price_alerts, rate_limit, subscriptions, supabase
+from .main import app
+from .rate_limit import Limit, RateLimiter
+
+
+def test_bucket_refills_lazily_and_reports_retry_after():
+    clock = [0.0]
+    limiter = RateLimiter({'api': Limit(rate=2, burst=2)}, clock=lambda: clock[0])
+    assert limiter.check('u', 'api') == 0
+    assert limiter.check('u', 'api') == 0
+    assert limiter.check('u', 'api') == 0.5
+    clock[0] += 0.5
+    assert limiter.check('u', 'api') == 0
+    assert limiter.stats()['rejected'] == {'api': 1}
+
+
+def test_tier_scales_rate_and_burst():
+    limiter = RateLimiter({'api': Limit(rate=1, burst=1)}, clock=lambda: 0.0)
+    assert sum(limiter.check('free', 'api', 'free') == 0 for _ in range(20)) == 1
+    assert sum(limiter.check('pro', 'api', 'pro') == 0 for _ in range(20)) == 3
+    assert sum(limiter.check('master', 'api', 'master') == 0 for _ in range(20)) == 10
+
+
+def test_idle_and_excess_buckets_are_evicted():
+    clock = [0.0]
+    limiter = RateLimiter({'api': Limit(rate=1, burst=1)}, idle_seconds=10, max_buckets=2, clock=lambda: clock[0])
+    for client in ('a', 'b', 'c'):
+        limiter.check(client, 'api')
+    assert limiter.stats()['buckets'] == 2
+    clock[0] += 11
+    limiter.check('d', 'api')
+    assert limiter.stats()['buckets'] == 1
+    assert limiter.stats()['evicted'] == 3
+
+
+def test_http_endpoint_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'LIMITS', {**rate_limit.LIMITS, 'price': Limit(rate=0.01, burst=1)})
+    async def fake_prices(symbols):
+        return {s: 1.0 for s in symbols}
+
+    async def all_known():
+        return None
+
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fake_prices)
+    monkeypatch.setattr(price_alerts, 'known_symbols', all_known)
+    client = TestClient(app)
+    assert client.get('/price/BTCUSDT').json()['price'] == 1.0
+    res = client.get('/price/BTCUSDT')
+    assert res.status_code == 429
+    assert int(res.headers['Retry-After']) >= 1
+
+
+def test_websocket_frames_over_limit_are_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'LIMITS', {**rate_limit.LIMITS, 'ws_frame': Limit(rate=0.01, burst=1)})
+    client = TestClient(app)
+    with client.websocket_connect('/ws') as ws:
+        ws.receive_json()
+        ws.send_json({"type": "frame", "data": "not base64!"})
+        ws.send_json({"type": "frame", "data": "not base64!"})
+        messages = [ws.receive_json(), ws.receive_json()]
+    assert {"type": "error", "message": "invalid image"} in messages
+    assert any(m.get('message') == 'rate_limited' and m['retry_after'] > 0 for m in messages)
+
+
+def fake_tokens(monkeypatch, valid):
+    """Check access tokens against `valid` (token -> user id); returns the tokens checked."""
+    checked = []
+
+    async def verify_access_token(token):
+        checked.append(token)
+        return valid.get(token)
+
+    monkeypatch.setattr(supabase, 'verify_access_token', verify_access_token)
+    monkeypatch.setattr(main, '_verified_tokens', {})
+    monkeypatch.setattr(main, '_rejected_tokens', OrderedDict())
+    return checked
+
+
+def test_claimed_user_ids_neither_reset_nor_raise_limits(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'LIMITS', {**rate_limit.LIMITS, 'price': Limit(rate=0.01, burst=1)})
+    monkeypatch.setitem(subscriptions.MOCK_TIERS, 'user_alice', 'master')
+    fake_tokens(monkeypatch, {'token-alice': 'user_alice'})
+
+    async def fake_prices(symbols):
+        return {s: 1.0 for s in symbols}
+
+    async def all_known():
+        return None
+
+    monkeypatch.setattr(price_alerts, 'fetch_prices', fake_prices)
+    monkeypatch.setattr(price_alerts, 'known_symbols', all_known)
+    client = TestClient(app)
+    assert client.get('/price/BTCUSDT?user_id=a').status_code == 200
+    # another claimed id, even a master's, is the same anonymous client
+    for user_id in ('b', 'user_master'):
+        assert client.get(f'/price/BTCUSDT?user_id={user_id}').status_code == 429
+    # a signed-in master gets its own, larger bucket
+    signed_in = {'Authorization': 'Bearer token-alice'}
+    assert all(client.get('/price/BTCUSDT', headers=signed_in).status_code == 200 for _ in range(10))
+    assert client.get('/price/BTCUSDT', headers=signed_in).status_code == 429
+    assert client.get('/price/BTCUSDT', headers={'Authorization': 'Bearer forged'}).status_code == 429
+
+
+def test_unknown_tokens_are_checked_at_a_bounded_rate(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'LIMITS', {**rate_limit.LIMITS, 'auth_verify': Limit(rate=0.001, burst=3)})
+    checked = fake_tokens(monkeypatch, {'token-alice': 'user_alice'})
+    client = TestClient(app)
+    for n in range(10):
+        client.post('/snapshot', json={}, headers={'Authorization': f'Bearer forged-{n}'})
+    # a rejected token is remembered; fresh bogus ones past the budget are not checked at all
+    client.post('/snapshot', json={}, headers={'Authorization': 'Bearer forged-0'})
+    assert checked == ['forged-0', 'forged-1', 'forged-2']
+    assert list(main._rejected_tokens) == checked
+
+
+def test_snapshot_rendering_is_rate_limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'LIMITS', {**rate_limit.LIMITS, 'snapshot': Limit(rate=0.001, burst=2)})
+    client = TestClient(app)
+    # rejected before any rendering, even for a request that would fail anyway
+    assert [client.post('/snapshot', json={}).status_code for _ in range(3)] == [200, 200, 429]
@@ -0,0 +1,67 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from . import sessions
+from .main import app
+
+
+def test_detached_session_resumes_once_with_new_token():
+    session = sessions.open_session('user-1')
+    token = session.resume_token
+    sessions.detach_session(session.session_id)
+    assert sessions.get_session(session.session_id) is None
+
+    resumed = sessions.resume_session(token)
+    assert resumed is session
+    assert sessions.get_session(session.session_id) is session
+    assert resumed.resume_token != token
+    assert sessions.resume_session(token) is None
+    sessions.close_session(session.session_id)
+
+
+def test_expired_sessions_are_not_resumed(monkeypatch):
+    monkeypatch.setattr(sessions, 'SESSION_RESUME_TTL', 0.5)
+    clock = [100.0]
+    monkeypatch.setattr(sessions.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(sessions, '_detached', sessions.OrderedDict())
+    monkeypatch.setattr(sessions, '_detached_bytes', 0)
+    expired = sessions.resume_stats()['expired']
+    session = sessions.open_session()
+    sessions.detach_session(session.session_id)
+    clock[0] += 1.0
+    assert sessions.resume_session(session.resume_token) is None
+    assert sessions.resume_stats()['expired'] == expired + 1
+
+
+def test_memory_cap_evicts_least_recently_detached(monkeypatch):
+    first, second = sessions.open_session(), sessions.open_session()
+    for s in (first, second):
+        s.latest_frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    monkeypatch.setattr(sessions, 'SESSION_RESUME_MAX_BYTES', first.memory_bytes() + 1)
+    monkeypatch.setattr(sessions, '_detached', sessions.OrderedDict())
+    monkeypatch.setattr(sessions, '_detached_bytes', 0)
+    sessions.detach_session(first.session_id)
+    sessions.detach_session(second.session_id)
+    assert sessions.resume_session(first.resume_token) is None
+    assert sessions.resume_session(second.resume_token) is second
+    sessions.close_session(second.session_id)
+
+
+def test_websocket_reconnect_resumes_session():
+    client = TestClient(app)
+    with client.websocket_connect('/ws') as ws:
+        hello = ws.receive_json()
+        assert hello['resumed'] is False
+        tracker = sessions.get_session(hello['session_id']).trendlines
+
+    with client.websocket_connect(f"/ws?resume={hello['resume_token']}") as ws:
+        again = ws.receive_json()
+        assert again['resumed'] is True
+        assert again['session_id'] == hello['session_id']
+        assert again['resume_token'] != hello['resume_token']
+        assert sessions.get_session(again['session_id']).trendlines is tracker
+
+    with client.websocket_connect('/ws?resume=bogus') as ws:
+        fresh = ws.receive_json()
+        assert fresh['resumed'] is False
+        assert fresh['session_id'] != hello['session_id']
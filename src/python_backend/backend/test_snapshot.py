@@ -0,0 +1,57 @@
+import base64
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from . import snapshot
+from .main import app
+from .test_vision_cache import make_chart_frame
+
+
+COMMANDS = [
+    {"type": "overlay", "action": "draw_rect", "x": 10, "y": 10, "w": 60, "h": 30},
+    {"type": "overlay", "action": "draw_text", "x": 10, "y": 50, "text": "POI"},
+    {"type": "overlay", "action": "draw_line", "x1": 0, "y1": 0, "x2": 100, "y2": 100},
+]
+
+
+def test_render_overlays_draws_on_a_copy():
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    out = snapshot.render_overlays(frame, COMMANDS)
+    assert not frame.any()
+    assert out.any()
+
+
+def test_repeated_snapshot_is_served_from_cache():
+    frame = make_chart_frame()
+    first = snapshot.render_snapshot(frame, COMMANDS, 'jpeg', 80, frame_key='frame-a')
+    hits = snapshot.cache_stats()['hits']
+    second = snapshot.render_snapshot(frame, COMMANDS, 'jpeg', 80, frame_key='frame-a')
+    assert first == second
+    assert snapshot.cache_stats()['hits'] == hits + 1
+    assert cv2.imdecode(np.frombuffer(first, np.uint8), cv2.IMREAD_COLOR).shape == frame.shape
+
+
+def test_snapshot_endpoint_uses_session_latest_frame():
+    client = TestClient(app)
+    ok, buf = cv2.imencode('.png', make_chart_frame())
+    b64 = base64.b64encode(buf.tobytes()).decode('ascii')
+    with client.websocket_connect('/ws') as ws:
+        session_id = ws.receive_json()['session_id']
+        ws.send_json({'type': 'frame', 'data': b64})
+        while ws.receive_json().get('message') != 'processed_frame':
+            pass
+        resp = client.post('/snapshot', json={'session_id': session_id, 'format': 'webp', 'quality': 70})
+    payload = resp.json()
+    assert payload['ok'] is True
+    assert payload['format'] == 'webp'
+    assert base64.b64decode(payload['image_base64'])
+
+    resp = client.post('/snapshot', json={'image_base64': b64, 'overlays': COMMANDS})
+    assert resp.json()['ok'] is True
+    assert client.post('/snapshot', json={'session_id': 'missing'}).json()['ok'] is False
+
+
+def test_snapshot_endpoint_rejects_bad_quality():
+    client = TestClient(app)
+    for quality in ('high', None, 0, 101, [80]):
+        assert client.post('/snapshot', json={'session_id': 'missing', 'quality': quality}).status_code == 400
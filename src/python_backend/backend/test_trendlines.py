@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+from . import vision
+from .trendlines import TrendlineTracker, line_y
+
+
+def make_channel_frame():
+    img = np.full((300, 600, 3), 20, dtype=np.uint8)
+    cv2.line(img, (20, 250), (580, 60), (0, 200, 0), 2)
+    cv2.line(img, (20, 200), (580, 10), (0, 200, 0), 2)
+    # horizontal grid line must not become a trendline
+    cv2.line(img, (0, 150), (599, 150), (80, 80, 80), 1)
+    return img
+
+
+def test_detects_parallel_trendlines_as_channel():
+    features = vision.detect_chart_features(make_channel_frame())
+    lines = features['trendlines']
+    assert len(lines) == 2
+    assert all(-21 < line['angle'] < -17 for line in lines)
+    channel = features['channel']
+    assert channel is not None
+    assert lines[channel['upper']]['y1'] < lines[channel['lower']]['y1']
+    assert 40 < channel['width'] < 60
+
+
+def test_tracker_keeps_lines_until_price_breaks_them():
+    line = {'x1': 0, 'y1': 200, 'x2': 400, 'y2': 100, 'slope': -0.25, 'angle': -14.0, 'score': 400.0}
+    moved = dict(line, y1=205, y2=105)
+    tracker = TrendlineTracker(break_margin=4)
+
+    # price below the line (larger y) -> line acts as resistance
+    first = tracker.update({'poi': (200, 170), 'trendlines': [line]})
+    assert first['trendlines'] == [line] and first['trendline_break'] is None
+
+    # new detections are ignored while price stays on the same side
+    second = tracker.update({'poi': (210, 160), 'trendlines': [moved]})
+    assert second['trendlines'] == [line] and tracker.generation == 1
+
+    # price crosses above the line -> breakout up, lines are re-fitted
+    x = 220
+    third = tracker.update({'poi': (x, int(line_y(line, x)) - 10), 'trendlines': [moved]})
+    assert third['trendline_break'] == 'up'
+    assert third['trendlines'] == [moved] and tracker.generation == 2
+
+
+def test_tracker_replaces_lines_that_are_no_longer_detected():
+    line = {'x1': 0, 'y1': 200, 'x2': 400, 'y2': 100, 'slope': -0.25, 'angle': -14.0, 'score': 400.0}
+    other = {'x1': 0, 'y1': 50, 'x2': 400, 'y2': 250, 'slope': 0.5, 'angle': 26.6, 'score': 300.0}
+    tracker = TrendlineTracker(break_margin=4, stale_frames=3)
+    tracker.update({'poi': None, 'trendlines': [line]})
+
+    # detection flickering out for a frame or two keeps the line
+    for features in ({'trendlines': []}, {'trendlines': [dict(line, y1=203, y2=103)]}, {'trendlines': []}):
+        assert tracker.update({'poi': None, **features})['trendlines'] == [line]
+
+    # the chart scrolled / switched symbol: the old line is never seen again
+    # (the last flicker frame already counted as one miss)
+    results = [tracker.update({'poi': None, 'trendlines': [other]}) for _ in range(3)]
+    assert results[0]['trendlines'] == [line]
+    assert results[1]['trendlines'] == results[2]['trendlines'] == [other] and tracker.generation == 2
+
+    # and a chart without lines clears them
+    for _ in range(3):
+        result = tracker.update({'poi': (200, 300), 'trendlines': []})
+    assert result['trendlines'] == []
+
+
+def test_lines_adopted_without_price_can_still_break():
+    line = {'x1': 0, 'y1': 200, 'x2': 400, 'y2': 100, 'slope': -0.25, 'angle': -14.0, 'score': 400.0}
+    tracker = TrendlineTracker(break_margin=4)
+    tracker.update({'poi': None, 'trendlines': [line]})
+    assert tracker.update({'poi': (200, 170), 'trendlines': [line]})['trendline_break'] is None
+    assert tracker.update({'poi': (200, 130), 'trendlines': [line]})['trendline_break'] == 'up'
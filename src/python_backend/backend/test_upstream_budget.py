@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from . import price_alerts, price_providers, provider_client, upstream_budget
+from .price_providers import HedgedFetcher
+from .test_price_alerts import price_standin
+from .upstream_budget import ALERTS, BACKGROUND, INTERACTIVE, BudgetExhausted, WeightBudget
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_queued_calls_are_served_by_priority():
+    # 10 weight per second, at most 10 at once
+    budget = WeightBudget('test', limit=10, window=1, headroom=1.0, burst_seconds=1)
+    order = []
+
+    async def call(name, priority):
+        await budget.acquire(5, priority)
+        order.append(name)
+
+    async def run():
+        await budget.acquire(10, INTERACTIVE)  # drain the bucket
+        tasks = [asyncio.create_task(call('refresh', BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call('lookup', INTERACTIVE)))
+        await asyncio.sleep(0)
+        with upstream_budget.prioritized(ALERTS):
+            tasks.append(asyncio.create_task(call('alerts', None)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ['alerts', 'lookup', 'refresh']
+
+
+def test_exchange_count_and_bans_are_honoured():
+    clock = FakeClock()
+    budget = WeightBudget('test', limit=1000, window=60, headroom=0.8, burst_seconds=60, clock=clock)
+    assert budget.tokens == 800
+    budget.observe(200, {'X-MBX-USED-WEIGHT-1M': '700'})
+    assert budget.tokens == 100  # what the exchange says is left under the headroom
+    budget.observe(429, {'Retry-After': '30'})
+    stats = budget.stats()
+    assert stats['remaining'] == 0 and stats['blocked_for'] == 30 and stats['throttled'] == 1
+    assert not budget._take(1)
+    clock.now = 31
+    assert budget._take(1)
+
+
+def test_waits_longer_than_allowed_are_refused():
+    budget = WeightBudget('test', limit=60, window=60, headroom=1.0, burst_seconds=1, max_wait=1.5)
+
+    async def run():
+        await budget.acquire(1)
+        # one weight per second: the queued waiter is ~1s out, one more ~2s
+        queued = asyncio.create_task(budget.acquire(1))
+        await asyncio.sleep(0)
+        with pytest.raises(BudgetExhausted):
+            await budget.acquire(1, BACKGROUND)
+        queued.cancel()
+        budget.observe(429, {'Retry-After': '60'})
+        with pytest.raises(BudgetExhausted):
+            await budget.acquire(1, ALERTS)
+
+    asyncio.run(run())
+    assert budget.rejected == 2
+
+
+def test_cancelled_waiter_does_not_hold_up_the_queue():
+    budget = WeightBudget('test', limit=100, window=1, headroom=1.0, burst_seconds=0.1)
+
+    async def run():
+        await budget.acquire(10)
+        stuck = asyncio.create_task(budget.acquire(10, ALERTS))
+        await asyncio.sleep(0)
+        stuck.cancel()
+        started = time.perf_counter()
+        await budget.acquire(10, BACKGROUND)
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 0.5
+
+
+def test_hammering_the_stand_in_stays_under_its_weight_limit(monkeypatch):
+    """40 callers x 5 bulk requests (800 weight) against a 400-weight-per-second limit: paced, no 429."""
+    budget = WeightBudget('binance', limit=400, window=1, headroom=0.8, burst_seconds=0.1)
+    monkeypatch.setattr(upstream_budget, '_budgets', upstream_budget.UpstreamBudgets({'binance': budget}))
+
+    async def run():
+        runner, base_url = await price_standin.start(weight_limit=400, weight_window=1)
+        monkeypatch.setattr(provider_client, 'BINANCE_API_URL', base_url)
+        monkeypatch.setattr(price_providers, '_fetcher', HedgedFetcher(price_providers.default_providers()[:1]))
+        walk = runner.app[price_standin.WALK]
+
+        async def caller():
+            for _ in range(5):
+                assert set(await price_alerts.fetch_prices(['BTC', 'ETH'])) == {'BTC', 'ETH'}
+
+        try:
+            await asyncio.gather(*(caller() for _ in range(40)))
+            return walk.throttled
+        finally:
+            await provider_client.close()
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == 0
+    # every request was charged exactly once, none was refused, and most had to queue for it
+    assert budget.spent == 200 * upstream_budget.WEIGHTS[('binance', 'ticker_price_bulk')]
+    assert budget.rejected == 0 and budget.throttled == 0 and budget.waited > 0
@@ -0,0 +1,62 @@
+import json
+import cv2
+import pytest
+from . import video_ingest
+from .video_ingest import VIDEO_INGEST_MIN_SEGMENT_FRAMES, ingest_video, plan_segments
+from .test_vision_cache import make_chart_frame
+
+
+# long enough for two segments
+FRAMES = 2 * VIDEO_INGEST_MIN_SEGMENT_FRAMES + 20
+
+
+def write_video(path, frames=FRAMES, fps=30):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (320, 180))
+    for i in range(frames):
+        # chart only moves every 10th frame, so most frames are unchanged
+        writer.write(make_chart_frame(shift=(i // 10) * 15))
+    writer.release()
+
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    path = tmp_path_factory.mktemp('ingest') / 'session.avi'
+    write_video(path)
+    return path
+
+
+def test_plan_segments_covers_every_frame():
+    segments = plan_segments(1000, workers=3, min_frames=100)
+    assert segments[0][0] == 0 and segments[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+    assert len(segments) == 6
+
+
+def test_ingest_video_writes_time_indexed_log(video, tmp_path):
+    out = tmp_path / 'session.jsonl'
+
+    summary = ingest_video(str(video), str(out), workers=2)
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+
+    assert summary['frames'] == FRAMES and summary['segments'] == 2
+    assert summary['analysed'] == len(records)
+    assert summary['skipped'] > 0
+    assert summary['analysed'] + summary['skipped'] == FRAMES
+    assert [r['frame'] for r in records] == sorted(r['frame'] for r in records)
+    assert {'t', 'poi', 'slope', 'signal'} <= set(records[0])
+
+
+@pytest.mark.parametrize('reported', [0, -1, FRAMES * 3, VIDEO_INGEST_MIN_SEGMENT_FRAMES * 2])
+def test_unreliable_frame_counts_still_cover_every_frame(video, tmp_path, monkeypatch, reported):
+    probe = video_ingest.probe_video
+    monkeypatch.setattr(video_ingest, 'probe_video', lambda path: (reported, probe(path)[1]))
+    out = tmp_path / 'session.jsonl'
+
+    summary = ingest_video(str(video), str(out), workers=2)
+    frames = [json.loads(line)['frame'] for line in out.read_text().splitlines()]
+
+    assert summary['frames'] == FRAMES
+    assert summary['analysed'] + summary['skipped'] == FRAMES
+    assert frames == sorted(set(frames)) and frames[0] == 0
+    # too few frames reported: the last segment reads on; otherwise there is nothing to split
+    assert summary['segments'] == (2 if reported == VIDEO_INGEST_MIN_SEGMENT_FRAMES * 2 else 1)
@@ -0,0 +1,85 @@
+import asyncio
+import numpy as np
+from . import vision
+from .vision_batch import LoadShed, VisionBatcher
+from .test_vision_cache import make_chart_frame
+
+
+def test_batch_matches_single_frame_analysis():
+    frames = np.stack([make_chart_frame(shift=s) for s in range(5)])
+    batched = vision.detect_chart_features_batch(frames)
+    assert batched == [vision.detect_chart_features(f) for f in frames]
+
+
+def test_batcher_groups_by_shape_and_scatters_results():
+    small = [make_chart_frame(shift=s) for s in range(3)]
+    large = [make_chart_frame(width=400, height=200, shift=s) for s in range(2)]
+
+    async def run():
+        batcher = VisionBatcher(max_batch=8, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(f) for f in small + large))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert results == [vision.detect_chart_features(f) for f in small + large]
+    stats = batcher.stats()
+    assert stats['batches'] == 2
+    assert stats['frames'] == 5
+
+
+def test_batcher_flushes_when_batch_is_full():
+    frames = [make_chart_frame(shift=s) for s in range(4)]
+
+    async def run():
+        batcher = VisionBatcher(max_batch=2, max_wait_ms=10_000)
+        await asyncio.wait_for(asyncio.gather(*(batcher.submit(f) for f in frames)), timeout=5)
+        return batcher.stats()
+
+    stats = asyncio.run(run())
+    assert stats['batches'] == 2
+    assert stats['avg_batch_size'] == 2
+
+
+def test_weighted_fair_queuing_favours_higher_tiers():
+    frames = [make_chart_frame(shift=s) for s in range(9)]
+    finished = []
+
+    async def run():
+        batcher = VisionBatcher(max_batch=1, max_wait_ms=0, max_inflight=1)
+
+        async def submit(name, frame, session_id, tier):
+            await batcher.submit(frame, session_id=session_id, tier=tier)
+            finished.append(name)
+
+        jobs = [submit('warm', frames[0], 'w', 'free')]
+        jobs += [submit(f'free{i}', frames[1 + i], 'f', 'free') for i in range(4)]
+        jobs += [submit(f'master{i}', frames[5 + i], 'm', 'master') for i in range(4)]
+        await asyncio.gather(*jobs)
+        return batcher.stats()
+
+    stats = asyncio.run(run())
+    assert finished == ['warm'] + [f'master{i}' for i in range(4)] + [f'free{i}' for i in range(4)]
+    assert stats['latency_by_tier']['master']['count'] == 4
+    assert stats['latency_by_tier']['free']['count'] == 5
+    assert stats['latency_by_tier']['master']['p50_ms'] <= stats['latency_by_tier']['free']['p99_ms']
+
+
+def test_overload_sheds_lowest_tier_first():
+    frames = [make_chart_frame(shift=s) for s in range(4)]
+
+    async def run():
+        batcher = VisionBatcher(max_batch=1, max_wait_ms=0, max_inflight=1, max_pending=2)
+        results = await asyncio.gather(
+            batcher.submit(frames[0], session_id='w', tier='free'),
+            batcher.submit(frames[1], session_id='p', tier='pro'),
+            batcher.submit(frames[2], session_id='f', tier='free'),
+            batcher.submit(frames[3], session_id='p', tier='pro'),
+            return_exceptions=True,
+        )
+        return batcher.stats(), results
+
+    stats, results = asyncio.run(run())
+    assert isinstance(results[2], LoadShed)
+    assert not any(isinstance(r, Exception) for i, r in enumerate(results) if i != 2)
+    assert stats['shed'] == {'free': 1}
+    assert stats['frames'] == 3
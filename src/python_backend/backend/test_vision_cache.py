@@ -0,0 +1,68 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from . import vision
+from .vision_cache import ContentCache, frame_digest, get_features, get_shared_cache
+from .main import app
+
+
+def make_chart_frame(width=320, height=180, shift=0):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    xs = np.arange(width)
+    ys = (height // 2 + 40 * np.sin((xs + shift) / 25.0)).astype(int)
+    img[ys, xs] = (0, 255, 0)
+    return img
+
+
+def test_frame_digest_is_content_addressed():
+    a = make_chart_frame()
+    assert frame_digest(a) == frame_digest(a.copy())
+    assert frame_digest(a) != frame_digest(make_chart_frame(shift=30))
+    assert frame_digest(a) != frame_digest(make_chart_frame(width=321))
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ContentCache(max_entries=2, max_bytes=10_000)
+    cache.put('a', {'v': 1})
+    cache.put('b', {'v': 2})
+    assert cache.get('a') == {'v': 1}
+    cache.put('c', {'v': 3})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+
+    cache.put('big', {'v': 'x' * 9_000})
+    stats = cache.stats()
+    assert stats['bytes'] <= 10_000
+    assert stats['evictions'] >= 2
+
+
+def test_disk_tier_and_version_invalidation(tmp_path):
+    cache = ContentCache(disk_dir=str(tmp_path), version=1)
+    cache.put('k1', {'poi': (1, 2)})
+
+    fresh = ContentCache(disk_dir=str(tmp_path), version=1)
+    assert fresh.get('k1') == {'poi': (1, 2)}
+    assert fresh.stats()['disk_hits'] == 1
+
+    fresh.invalidate(version=2)
+    assert fresh.get('k1') is None
+    assert not (tmp_path / 'v1').exists()
+
+
+def test_get_features_reuses_result_and_reports_hit_rate():
+    frame = make_chart_frame()
+    get_shared_cache().invalidate()
+    calls = []
+
+    def compute(f):
+        calls.append(1)
+        return vision.detect_chart_features(f)
+
+    first = get_features(frame, compute, vision.VISION_VERSION)
+    second = get_features(frame.copy(), compute, vision.VISION_VERSION)
+    assert first == second
+    assert len(calls) == 1
+    assert get_shared_cache().stats()['hit_rate'] > 0
+
+    resp = TestClient(app).get('/metrics')
+    assert resp.status_code == 200
+    assert 'hit_rate' in resp.json()['vision_cache']
@@ -0,0 +1,120 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from . import main
+from .main import app
+from .price_cache import PriceCache
+from .ws_channels import CHANNELS, ChannelRouter, Mailbox
+from .ws_outbound import OutboundQueue
+
+
+def test_latest_only_mailbox_keeps_newest_frame():
+    async def run():
+        box = Mailbox(CHANNELS['chart'])
+        assert box.put({'n': 1}) is None
+        assert box.put({'n': 2}) == 'dropped'
+        return len(box), await box.get()
+
+    assert asyncio.run(run()) == (1, {'n': 2})
+
+
+def test_bounded_mailbox_rejects_when_full():
+    async def run():
+        box = Mailbox(CHANNELS['mentor'])
+        outcomes = [box.put({'n': i}) for i in range(CHANNELS['mentor'].mailbox + 1)]
+        return outcomes[-1], [await box.get() for _ in range(len(box))]
+
+    outcome, queued = asyncio.run(run())
+    assert outcome == 'rejected'
+    assert [m['n'] for m in queued] == list(range(CHANNELS['mentor'].mailbox))
+
+
+def test_slow_channel_does_not_block_others():
+    async def run():
+        handled = []
+        release = asyncio.Event()
+
+        async def slow(msg):
+            await release.wait()
+            handled.append(('chart', msg['n']))
+
+        async def fast(msg):
+            handled.append(('audio', msg['n']))
+
+        router = ChannelRouter({'chart': slow, 'audio': fast})
+        router.dispatch('chart', {'n': 1})
+        router.dispatch('audio', {'n': 2})
+        await asyncio.sleep(0.01)
+        before = list(handled)
+        release.set()
+        await asyncio.sleep(0.01)
+        router.close()
+        return before, handled
+
+    before, handled = asyncio.run(run())
+    assert before == [('audio', 2)]
+    assert handled == [('audio', 2), ('chart', 1)]
+
+
+def test_worker_failure_completes_failed_future():
+    async def run():
+        async def boom(msg):
+            raise RuntimeError('boom')
+
+        router = ChannelRouter({'webcam': boom})
+        router.dispatch('webcam', {})
+        try:
+            await asyncio.wait_for(router.failed, timeout=1)
+        except RuntimeError as e:
+            return str(e)
+
+    assert asyncio.run(run()) == 'boom'
+
+
+def test_outbound_sends_urgent_lane_first():
+    async def run():
+        queue = OutboundQueue()
+        queue.put({'n': 'overlay'}, priority=2)
+        queue.put({'n': 'mentor'}, priority=1)
+        queue.put({'n': 'tick'}, priority=0)
+        return [(await queue.get())['n'] for _ in range(3)]
+
+    assert asyncio.run(run()) == ['tick', 'mentor', 'overlay']
+
+
+def test_price_and_audio_channels_over_websocket(monkeypatch):
+    async def fake_prices(symbols):
+        return {s: 50000.0 for s in symbols if s == 'BTC'}
+
+    monkeypatch.setattr(main.price_alerts, 'fetch_prices', fake_prices)
+    monkeypatch.setattr(main.price_alerts, 'price_cache', PriceCache())
+    monkeypatch.setattr(main.speech, 'synthesize_text_to_audio_bytes', lambda text, **kw: b'x' * 40000)
+    monkeypatch.setattr(main, 'WS_AUDIO_CHUNK_BYTES', 16384)
+
+    with TestClient(app).websocket_connect('/ws') as ws:
+        ws.receive_json()  # session id
+        ws.send_json({'ch': 'prices', 'type': 'subscribe', 'symbols': ['btcusdt']})
+        assert ws.receive_json() == {'ch': 'prices', 'type': 'subscribed', 'symbols': ['BTC']}
+        tick = ws.receive_json()
+        assert (tick['ch'], tick['type'], tick['symbol'], tick['price']) == ('prices', 'tick', 'BTC', 50000.0)
+        ws.send_json({'ch': 'prices', 'type': 'unsubscribe', 'symbols': ['BTCUSDT']})
+
+        ws.send_json({'ch': 'audio', 'type': 'tts', 'text': 'hello'})
+        audio = []
+        while True:
+            msg = ws.receive_json()
+            if msg.get('ch') != 'audio':
+                continue
+            audio.append(msg)
+            if msg['type'] == 'tts_end':
+                break
+        assert [m['type'] for m in audio] == ['tts_chunk'] * 3 + ['tts_end']
+        assert [m['seq'] for m in audio[:3]] == [0, 1, 2]
+
+        ws.send_json({'ch': 'nope', 'type': 'x'})
+        while True:
+            msg = ws.receive_json()
+            if msg.get('type') == 'error':
+                assert 'unknown channel' in msg['message']
+                break
@@ -0,0 +1,82 @@
+import asyncio
+
+from . import ws_outbound
+from .ws_outbound import OutboundQueue, run_writer
+
+
+class _SlowSocket:
+    def __init__(self, delay):
+        self.delay = delay
+        self.sent = []
+
+    async def send_json(self, msg):
+        await asyncio.sleep(self.delay)
+        self.sent.append(msg)
+
+
+def test_keyed_messages_coalesce_in_place():
+    async def run():
+        queue = OutboundQueue(maxsize=3)
+        assert queue.put({'n': 1}, 'overlay')
+        assert queue.put({'n': 2})
+        assert queue.put({'n': 3}, 'overlay')
+        assert len(queue) == 2
+        return [await queue.get(), await queue.get()]
+
+    assert asyncio.run(run()) == [{'n': 3}, {'n': 2}]
+
+
+def test_full_queue_rejects_uncoalescable_message():
+    async def run():
+        queue = OutboundQueue(maxsize=2)
+        assert queue.put({'n': 1}, 'a')
+        assert queue.put({'n': 2})
+        # still coalescable while full
+        assert queue.put({'n': 3}, 'a')
+        return queue.put({'n': 4}), queue.put({'n': 5}, 'b')
+
+    assert asyncio.run(run()) == (False, False)
+
+
+def test_depth_counts_one_lane_only():
+    async def run():
+        queue = OutboundQueue()
+        for n in range(5):
+            queue.put({'tick': n}, priority=0)
+        queue.put({'overlay': 1}, 'overlay')
+        return queue.depth(), queue.depth(0), queue.depth(1), len(queue)
+
+    # a burst of price ticks is not a chart backlog
+    assert asyncio.run(run()) == (1, 5, 0, 6)
+
+
+def test_writer_drains_without_blocking_the_producer():
+    async def run():
+        ws = _SlowSocket(delay=0.01)
+        queue = OutboundQueue(maxsize=4)
+        writer = asyncio.create_task(run_writer(ws, queue))
+        accepted = 0
+        # the producer never awaits the socket; stale overlays collapse into one slot
+        for i in range(50):
+            if queue.put({'type': 'overlay', 'n': i}, 'overlay'):
+                accepted += 1
+            await asyncio.sleep(0)
+        queue.close()
+        await asyncio.wait_for(writer, timeout=2)
+        return accepted, ws.sent
+
+    accepted, sent = asyncio.run(run())
+    assert accepted == 50
+    assert len(sent) < 50
+    assert sent[-1]['n'] == 49
+
+
+def test_slow_consumer_counter_in_metrics():
+    from fastapi.testclient import TestClient
+    from .main import app
+
+    before = ws_outbound.stats()['slow_consumer_disconnects']
+    ws_outbound.record_slow_consumer()
+    client = TestClient(app)
+    stats = client.get('/metrics').json()['ws_outbound']
+    assert stats['slow_consumer_disconnects'] == before + 1
@@ -52,6 +52,17 @@ def evaluate(features: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
+    # A tracked trendline broken by price (see trendlines.TrendlineTracker) is a
+    # breakout signal on its own when the SMAs are undecided
+    reason = 'Prototype SMA crossover + slope'
+    if side is None:
+        breakout = features.get('trendline_break')
+        if breakout == 'up':
+            side = 'BUY'
+        elif breakout == 'down':
+            side = 'SELL'
+        reason = 'Trendline breakout'
+
     # Very small chance to avoid spamming signals
     if side is None or random.random() > 0.35:
         return None
@@ -72,6 +83,6 @@ def evaluate(features: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         'price': round(base_price, 2),
         'sl': sl,
         'tp1': tp1,
-        'reason': 'Prototype SMA crossover + slope'
+        'reason': reason
     }
     return signal
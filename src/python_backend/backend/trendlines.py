@@ -0,0 +1,203 @@
+"""Trendline and channel detection on the vision pipeline's edge map.
+
+`detect_trendlines` runs a probabilistic Hough transform on the Canny edge map
+already computed by `vision`, then clusters the segments into trendlines by
+binning their angle and their offset at the centre of the frame (all segments are
+binned at once with NumPy). Roughly parallel trendline pairs form a channel.
+
+`TrendlineTracker` keeps one session's lines stable across frames: detected lines
+are only adopted when there are none yet, when price breaks through one of the
+tracked lines, or when a tracked line has not been re-detected (at about the same
+place and angle) for `TRENDLINE_STALE_FRAMES` frames in a row, i.e. the chart
+scrolled or switched symbol. Lines are held steady this way, so overlays do not
+jitter from frame to frame.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+TRENDLINE_MAX_LINES = int(os.getenv('TRENDLINE_MAX_LINES', '4'))
+TRENDLINE_BREAK_MARGIN = float(os.getenv('TRENDLINE_BREAK_MARGIN', '4'))
+TRENDLINE_STALE_FRAMES = int(os.getenv('TRENDLINE_STALE_FRAMES', '10'))
+
+_HOUGH_THRESHOLD = 40
+_HOUGH_MAX_GAP = 8
+_MIN_ANGLE = 2.0       # flatter segments are treated as chart grid lines
+_MAX_ANGLE = 80.0      # steeper segments are candle wicks / bodies
+_ANGLE_BIN = 3.0       # degrees
+_OFFSET_BIN = 10.0     # pixels, measured at the frame's horizontal centre
+# A detection within these of a tracked line is the same line, re-detected
+_MATCH_ANGLE = 2 * _ANGLE_BIN
+_MATCH_OFFSET = 2 * _OFFSET_BIN
+
+
+def detect_line_segments(edges: np.ndarray) -> np.ndarray:
+    """Return Hough line segments (K, 4) as x1, y1, x2, y2 with x1 <= x2."""
+    h, w = edges.shape[:2]
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, _HOUGH_THRESHOLD,
+                            minLineLength=max(30, int(w * 0.08)), maxLineGap=_HOUGH_MAX_GAP)
+    if lines is None:
+        return np.empty((0, 4), dtype=np.float64)
+    seg = lines.reshape(-1, 4).astype(np.float64)
+    swap = seg[:, 0] > seg[:, 2]
+    seg[swap] = seg[swap][:, [2, 3, 0, 1]]
+    return seg
+
+
+def cluster_trendlines(segments: np.ndarray, width: int, height: int,
+                       max_lines: int = TRENDLINE_MAX_LINES) -> List[Dict[str, Any]]:
+    """Merge segments with similar angle and offset into fitted trendlines.
+
+    Each trendline is a dict with end points, screen-space slope (dy/dx), angle
+    in degrees and a score (total supporting segment length), strongest first.
+    """
+    if not len(segments):
+        return []
+    x1, y1, x2, y2 = segments.T
+    dx = x2 - x1
+    dy = y2 - y1
+    angle = np.degrees(np.arctan2(dy, dx))
+    usable = (dx > 0) & (np.abs(angle) >= _MIN_ANGLE) & (np.abs(angle) <= _MAX_ANGLE)
+    if not usable.any():
+        return []
+    x1, y1, x2, dx, dy, angle = x1[usable], y1[usable], x2[usable], dx[usable], dy[usable], angle[usable]
+
+    slope = dy / dx
+    length = np.hypot(dx, dy)
+    x_mid = width / 2.0
+    y_mid = y1 + slope * (x_mid - x1)
+
+    keys = np.stack([np.round(angle / _ANGLE_BIN), np.round(y_mid / _OFFSET_BIN)], axis=1)
+    _, cluster = np.unique(keys, axis=0, return_inverse=True)
+    cluster = cluster.ravel()
+    count = cluster.max() + 1
+
+    score = np.bincount(cluster, weights=length, minlength=count)
+    fit_slope = np.bincount(cluster, weights=length * slope, minlength=count) / score
+    fit_mid = np.bincount(cluster, weights=length * y_mid, minlength=count) / score
+    fit_angle = np.bincount(cluster, weights=length * angle, minlength=count) / score
+    x_lo = np.full(count, np.inf)
+    x_hi = np.full(count, -np.inf)
+    np.minimum.at(x_lo, cluster, x1)
+    np.maximum.at(x_hi, cluster, x2)
+
+    # Strongest first; a cluster close in angle and offset to an accepted one is the
+    # other edge of the same drawn line (or a neighbouring bin) and is absorbed by it.
+    order = np.argsort(-score)
+    min_score = 0.15 * width
+    accepted = []
+    for c in order:
+        if len(accepted) >= max_lines or score[c] < min_score:
+            break
+        if accepted:
+            prev = np.array(accepted)
+            near = (np.abs(fit_angle[prev] - fit_angle[c]) <= _ANGLE_BIN) & (np.abs(fit_mid[prev] - fit_mid[c]) <= _OFFSET_BIN)
+            if near.any():
+                continue
+        accepted.append(c)
+
+    lines = []
+    for c in accepted:
+        lines.append({
+            'x1': int(x_lo[c]),
+            'y1': int(round(fit_mid[c] + fit_slope[c] * (x_lo[c] - x_mid))),
+            'x2': int(x_hi[c]),
+            'y2': int(round(fit_mid[c] + fit_slope[c] * (x_hi[c] - x_mid))),
+            'slope': round(float(fit_slope[c]), 4),
+            'angle': round(float(fit_angle[c]), 2),
+            'score': round(float(score[c]), 1),
+        })
+    return lines
+
+
+def find_channel(lines: List[Dict[str, Any]], height: int) -> Optional[Dict[str, Any]]:
+    """Return the strongest pair of near-parallel trendlines as a channel, if any."""
+    if len(lines) < 2:
+        return None
+    angle = np.array([l['angle'] for l in lines])
+    mid = np.array([(l['y1'] + l['y2']) / 2.0 for l in lines])
+    score = np.array([l['score'] for l in lines])
+
+    parallel = np.abs(angle[:, None] - angle[None, :]) <= _ANGLE_BIN
+    gap = np.abs(mid[:, None] - mid[None, :])
+    valid = parallel & (gap >= 15) & (gap <= height * 0.5) & np.triu(np.ones_like(parallel), k=1)
+    if not valid.any():
+        return None
+    pair_score = np.where(valid, score[:, None] + score[None, :], -1.0)
+    i, j = np.unravel_index(int(np.argmax(pair_score)), pair_score.shape)
+    upper, lower = (i, j) if mid[i] < mid[j] else (j, i)
+    return {'upper': int(upper), 'lower': int(lower), 'width': round(float(gap[i, j]), 1)}
+
+
+def detect_trendlines(edges: np.ndarray) -> Dict[str, Any]:
+    """Trendline features for one edge map: {'trendlines': [...], 'channel': {...} | None}."""
+    h, w = edges.shape[:2]
+    lines = cluster_trendlines(detect_line_segments(edges), w, h)
+    return {'trendlines': lines, 'channel': find_channel(lines, h)}
+
+
+def line_y(line: Dict[str, Any], x: float) -> float:
+    """y of the (extended) trendline at screen x."""
+    return line['y1'] + line['slope'] * (x - line['x1'])
+
+
+def same_line(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Whether two detections are (about) the same line: similar angle and position mid-way along `a`."""
+    x = (a['x1'] + a['x2']) / 2.0
+    return abs(a['angle'] - b['angle']) <= _MATCH_ANGLE and abs(line_y(a, x) - line_y(b, x)) <= _MATCH_OFFSET
+
+
+class TrendlineTracker:
+    """Keeps a session's trendlines stable until price breaks one of them or they go stale."""
+
+    def __init__(self, break_margin: float = TRENDLINE_BREAK_MARGIN, stale_frames: int = TRENDLINE_STALE_FRAMES):
+        self.break_margin = break_margin
+        self.stale_frames = max(1, stale_frames)
+        self.lines: List[Dict[str, Any]] = []
+        self.channel: Optional[Dict[str, Any]] = None
+        self.generation = 0
+        self._sides: List[int] = []
+        # Frames in a row each tracked line went without being re-detected
+        self._missed: List[int] = []
+
+    def update(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold one frame's detections into the tracked set.
+
+        Returns {'trendlines', 'channel', 'trendline_break'} where the break is
+        'up', 'down' or None. Screen y grows downwards, so price breaking *up*
+        through a line means its y moved above (below in value) the line.
+        """
+        poi = features.get('poi')
+        broken = None
+        if self.lines and poi:
+            px, py = poi
+            # lines adopted without a price point get their side from the first one seen
+            self._sides = [side or (1 if py - line_y(line, px) >= 0 else -1)
+                           for line, side in zip(self.lines, self._sides)]
+            for line, side in zip(self.lines, self._sides):
+                offset = py - line_y(line, px)
+                if side > 0 and offset < -self.break_margin:
+                    broken = 'up'
+                    break
+                if side < 0 and offset > self.break_margin:
+                    broken = 'down'
+                    break
+
+        detected = features.get('trendlines') or []
+        self._missed = [0 if any(same_line(line, d) for d in detected) else missed + 1
+                        for line, missed in zip(self.lines, self._missed)]
+        stale = any(missed >= self.stale_frames for missed in self._missed)
+        if broken or stale or (detected and not self.lines):
+            self.lines = detected
+            self.channel = features.get('channel')
+            self.generation += 1
+            self._missed = [0] * len(detected)
+            if poi:
+                px, py = poi
+                self._sides = [1 if py - line_y(l, px) >= 0 else -1 for l in detected]
+            else:
+                self._sides = [0] * len(detected)
+
+        return {'trendlines': self.lines, 'channel': self.channel, 'trendline_break': broken}
@@ -0,0 +1,251 @@
+"""Request-weight budgets for upstream price providers, shared by every call.
+
+Exchanges limit each IP by request weight per window (Binance: 6000 per minute,
+with every endpoint costing a fixed weight) and ban IPs that keep going after a
+429. Every upstream call therefore takes its weight from the provider's budget
+first:
+  - a token bucket refilling at `headroom * limit / window`, holding at most
+    `UPSTREAM_BURST_SECONDS` worth of weight, so even without feedback no window
+    can see more than the limit
+  - reconciled with the exchange's own count when responses carry it
+    (`X-MBX-USED-WEIGHT-1M`): the bucket never holds more than the exchange says
+    is left under the headroom
+  - a 429/418 blocks the budget for `Retry-After` seconds and empties it
+Callers that cannot be served at once wait in a priority queue: alert checks
+first, then interactive lookups, then background refreshes. A caller whose wait
+would exceed `UPSTREAM_MAX_WAIT` gets `BudgetExhausted` instead.
+
+The priority of a call comes from the context (`prioritized(...)`), so it reaches
+loads started deep inside the price cache or the hedged fetcher unchanged.
+
+Tunables (environment):
+  - BINANCE_WEIGHT_LIMIT / BINANCE_WEIGHT_WINDOW: request weight per window in
+    seconds (default 6000 / 60)
+  - COINMARKETCAP_CALL_LIMIT: CoinMarketCap calls per minute (default 30)
+  - UPSTREAM_WEIGHT_HEADROOM: share of each limit used (default 0.8)
+  - UPSTREAM_BURST_SECONDS: seconds of weight that may be spent at once (default 10)
+  - UPSTREAM_MAX_WAIT: longest wait for budget in seconds (default 10)
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Mapping, Optional
+
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT', '6000'))
+BINANCE_WEIGHT_WINDOW = float(os.getenv('BINANCE_WEIGHT_WINDOW', '60'))
+COINMARKETCAP_CALL_LIMIT = int(os.getenv('COINMARKETCAP_CALL_LIMIT', '30'))
+UPSTREAM_WEIGHT_HEADROOM = float(os.getenv('UPSTREAM_WEIGHT_HEADROOM', '0.8'))
+UPSTREAM_BURST_SECONDS = float(os.getenv('UPSTREAM_BURST_SECONDS', '10'))
+UPSTREAM_MAX_WAIT = float(os.getenv('UPSTREAM_MAX_WAIT', '10'))
+
+# Priorities, most urgent first
+ALERTS, INTERACTIVE, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {ALERTS: 'alerts', INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+# Request weight per (provider, endpoint)
+WEIGHTS: Dict[tuple, int] = {
+    ('binance', 'ticker_price'): 2,
+    ('binance', 'ticker_price_bulk'): 4,
+    ('binance', 'exchange_info'): 20,
+    ('coinmarketcap', 'quotes'): 1,
+}
+
+USED_WEIGHT_HEADER = 'X-MBX-USED-WEIGHT-1M'
+_BAN_STATUSES = (418, 429)
+_DEFAULT_RETRY_AFTER = 60.0
+
+_priority: contextvars.ContextVar = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def prioritized(priority: int):
+    """Upstream calls made inside (including tasks started inside) use `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class BudgetExhausted(Exception):
+    """Waiting for upstream budget would take longer than allowed."""
+
+
+class WeightBudget:
+    """One provider's request-weight allowance, with a priority queue of waiting calls."""
+
+    def __init__(self, name: str, limit: float, window: float, headroom: float = UPSTREAM_WEIGHT_HEADROOM,
+                 burst_seconds: float = UPSTREAM_BURST_SECONDS, max_wait: float = UPSTREAM_MAX_WAIT,
+                 clock=time.monotonic):
+        self.name = name
+        self.limit = limit
+        self.allowed = limit * headroom
+        self.rate = self.allowed / window
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.max_wait = max_wait
+        self.clock = clock
+        self.tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = float('-inf')
+        self._queue = []  # heap of (priority, seq, weight, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop = None
+        self.spent = 0
+        self.waited = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.reported_used: Optional[int] = None
+
+    def _refill(self) -> float:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def _take(self, weight: float) -> bool:
+        now = self._refill()
+        # a call heavier than the whole bucket goes once the bucket is full
+        if now < self._blocked_until or self.tokens < min(weight, self.capacity):
+            return False
+        self.tokens -= weight
+        self.spent += weight
+        return True
+
+    def _eta(self, weight: float, priority: int) -> float:
+        """Rough seconds until a new call of `weight` at `priority` would be served."""
+        now = self._refill()
+        ahead = sum(w for p, _, w, f in self._queue if p <= priority and not f.done())
+        return max(self._blocked_until - now, 0.0) + max(0.0, ahead + min(weight, self.capacity) - self.tokens) / self.rate
+
+    async def acquire(self, weight: float, priority: Optional[int] = None):
+        """Wait until `weight` may be spent; raises BudgetExhausted if that is too far off."""
+        priority = _priority.get() if priority is None else priority
+        if not self._queue and self._take(weight):
+            return
+        if self._eta(weight, priority) > self.max_wait:
+            self.rejected += 1
+            raise BudgetExhausted(f"{self.name} request budget exhausted")
+        self.waited += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), weight, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.tokens += weight  # granted just as the caller went away
+                self.spent -= weight
+            raise
+
+    def _schedule(self):
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer_loop is loop:
+            return
+        while self._queue and self._queue[0][3].done():
+            heapq.heappop(self._queue)
+        if not self._queue:
+            self._timer = None
+            return
+        now = self._refill()
+        need = min(self._queue[0][2], self.capacity)
+        delay = max(self._blocked_until - now, (need - self.tokens) / self.rate, 0.0)
+        self._timer, self._timer_loop = loop.call_later(delay, self._drain), loop
+
+    def _drain(self):
+        self._timer = None
+        while self._queue:
+            _, _, weight, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if not self._take(weight):
+                break
+            heapq.heappop(self._queue)
+            future.set_result(None)
+        self._schedule()
+
+    def observe(self, status: int, headers: Mapping[str, str]):
+        """Reconcile with the exchange's view from a response's status and headers."""
+        now = self._refill()
+        used = headers.get(USED_WEIGHT_HEADER)
+        if used is not None:
+            try:
+                self.reported_used = int(used)
+                self.tokens = min(self.tokens, self.allowed - self.reported_used)
+            except ValueError:
+                pass
+        if status in _BAN_STATUSES:
+            self.throttled += 1
+            try:
+                retry_after = float(headers.get('Retry-After', _DEFAULT_RETRY_AFTER))
+            except ValueError:
+                retry_after = _DEFAULT_RETRY_AFTER
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.tokens = min(self.tokens, 0.0)
+
+    def stats(self) -> Dict:
+        now = self._refill()
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            'limit': self.limit,
+            'allowed': self.allowed,
+            'remaining': round(max(0.0, self.tokens), 1),
+            'reported_used': self.reported_used,
+            'spent': self.spent,
+            'waiting': waiting,
+            'waited': self.waited,
+            'rejected': self.rejected,
+            'throttled': self.throttled,
+            'blocked_for': round(max(0.0, self._blocked_until - now), 1),
+        }
+
+
+class UpstreamBudgets:
+    """Budgets by provider, charged by endpoint weight."""
+
+    def __init__(self, budgets: Dict[str, WeightBudget]):
+        self.budgets = budgets
+
+    async def spend(self, provider: str, endpoint: str, priority: Optional[int] = None):
+        budget = self.budgets.get(provider)
+        if budget is not None:
+            await budget.acquire(WEIGHTS.get((provider, endpoint), 1), priority)
+
+    def observe(self, provider: str, status: int, headers: Mapping[str, str]):
+        budget = self.budgets.get(provider)
+        if budget is not None:
+            budget.observe(status, headers)
+
+    def stats(self) -> Dict:
+        return {name: budget.stats() for name, budget in self.budgets.items()}
+
+
+_budgets: Optional[UpstreamBudgets] = None
+
+
+def get_budgets() -> UpstreamBudgets:
+    global _budgets
+    if _budgets is None:
+        _budgets = UpstreamBudgets({
+            # Binance limits per IP, so the mirror hosts draw on the same budget
+            'binance': WeightBudget('binance', BINANCE_WEIGHT_LIMIT, BINANCE_WEIGHT_WINDOW),
+            'coinmarketcap': WeightBudget('coinmarketcap', COINMARKETCAP_CALL_LIMIT, 60.0),
+        })
+    return _budgets
+
+
+async def spend(provider: str, endpoint: str, priority: Optional[int] = None):
+    """Wait for the weight of one `endpoint` call to `provider`."""
+    await get_budgets().spend(provider, endpoint, priority)
+
+
+def observe(provider: str, status: int, headers: Mapping[str, str]):
+    get_budgets().observe(provider, status, headers)
@@ -0,0 +1,200 @@
+"""Offline ingestion of recorded trading-session videos.
+
+Runs the same vision + advisor pipeline used for live frames over a local video
+file and writes a compact, time-indexed JSON Lines log (one record per analysed
+frame) for review and model tuning.
+
+The video is split into contiguous frame segments that are decoded and analysed
+in parallel worker processes. Within a segment, frames can be sub-sampled
+(`sample_fps`) and frames that did not visibly change since the last analysed
+one are skipped with `vision.FrameChangeDetector`.
+
+Splitting relies on the container's frame count and on seeking by frame index. When
+the count is missing (<= 0, common for streamed or variable-frame-rate recordings) or
+turns out to be wrong (a segment cannot seek to its start or runs out of frames before
+its end), the video is decoded once more from the start in a single process instead.
+
+Usage:
+    python -m backend.video_ingest session.mp4 -o session.jsonl [--workers 8] [--sample-fps 5]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from . import vision
+from . import trading_advisor
+from . import trendlines
+
+VIDEO_INGEST_MIN_SEGMENT_FRAMES = 300
+
+
+def probe_video(path: str) -> Tuple[int, float]:
+    """Return (frame_count, fps) for a video file."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"cannot open video: {path}")
+    try:
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        cap.release()
+    return frame_count, fps
+
+
+def plan_segments(frame_count: int, workers: int, min_frames: int = VIDEO_INGEST_MIN_SEGMENT_FRAMES) -> List[Tuple[int, int]]:
+    """Split [0, frame_count) into up to `workers * 2` contiguous segments.
+
+    Using a couple of segments per worker keeps all processes busy when some
+    segments are cheaper than others (e.g. long static stretches).
+    """
+    if frame_count <= 0:
+        return []
+    count = max(1, min(workers * 2, frame_count // max(1, min_frames)))
+    bounds = [round(i * frame_count / count) for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(count) if bounds[i + 1] > bounds[i]]
+
+
+def _record(frame_index: int, fps: float, features: Dict, signal: Optional[Dict]) -> Dict:
+    sma_short = features.get('sma_short') or []
+    sma_long = features.get('sma_long') or []
+    return {
+        't': round(frame_index / fps, 3),
+        'frame': frame_index,
+        'poi': list(features['poi']) if features.get('poi') else None,
+        'slope': round(float(features.get('slope', 0.0)), 4),
+        'sma_short': round(sma_short[-1], 2) if sma_short else None,
+        'sma_long': round(sma_long[-1], 2) if sma_long else None,
+        'trendlines': len(features.get('trendlines') or []),
+        'trendline_break': features.get('trendline_break'),
+        'signal': signal,
+    }
+
+
+def process_segment(path: str, start: int, end: Optional[int], fps: float, stride: int = 1,
+                    skip_unchanged: bool = True, change_threshold: float = 1.5) -> Dict:
+    """Analyse frames [start, end) of `path` (to the last frame if `end` is None). Runs inside a worker process.
+
+    The result's `read` is how many frames were actually decoded and `seeked` whether
+    the capture landed on `start`; together they tell whether the segment was complete.
+    """
+    # Deterministic advisor output per segment so repeated runs produce the same log
+    random.seed(start)
+    detector = vision.FrameChangeDetector(threshold=change_threshold) if skip_unchanged else None
+    tracker = trendlines.TrendlineTracker()
+    records = []
+    skipped = 0
+    read = 0
+    seeked = True
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            seeked = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start
+        index = start - 1
+        while seeked and (end is None or index + 1 < end):
+            # grab() advances without converting the frame; retrieve() only when analysed
+            if not cap.grab():
+                break
+            index += 1
+            read += 1
+            if (index - start) % stride:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            if detector is not None and not detector.changed(frame):
+                skipped += 1
+                continue
+            features = vision.detect_chart_features(frame)
+            features.update(tracker.update(features))
+            try:
+                signal = trading_advisor.evaluate(features)
+            except Exception:
+                signal = None
+            records.append(_record(index, fps, features, signal))
+    finally:
+        cap.release()
+
+    return {'start': start, 'end': end, 'records': records, 'skipped': skipped, 'read': read, 'seeked': seeked}
+
+
+def _complete(results: List[Dict]) -> bool:
+    """Whether parallel segments decoded every frame exactly once."""
+    return all(r['seeked'] and (r['end'] is None or r['read'] == r['end'] - r['start']) for r in results)
+
+
+def ingest_video(path: str, output_path: str, workers: Optional[int] = None, sample_fps: Optional[float] = None,
+                 skip_unchanged: bool = True, change_threshold: float = 1.5) -> Dict:
+    """Run the vision + advisor pipeline over a video and write a JSON Lines log.
+
+    Returns a summary with frame counts, wall time and the speed relative to real time.
+    """
+    frame_count, fps = probe_video(path)
+    workers = workers or os.cpu_count() or 1
+    stride = max(1, round(fps / sample_fps)) if sample_fps else 1
+    # The last segment reads on to the real end, in case the count is short
+    segments = plan_segments(frame_count, workers)[:-1]
+    segments.append((segments[-1][1] if segments else 0, None))
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def run(planned):
+            futures = [pool.submit(process_segment, path, start, end, fps, stride, skip_unchanged, change_threshold)
+                       for start, end in planned]
+            return [f.result() for f in futures]
+
+        results = run(segments)
+        if not _complete(results):
+            print(f"Frame count or seeking is unreliable for {path}; decoding it sequentially")
+            segments = [(0, None)]
+            results = run(segments)
+    elapsed = time.perf_counter() - started
+    frame_count = sum(r['read'] for r in results)
+
+    analysed = 0
+    skipped = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for result in sorted(results, key=lambda r: r['start']):
+            skipped += result['skipped']
+            for record in result['records']:
+                out.write(json.dumps(record, separators=(',', ':')) + '\n')
+                analysed += 1
+
+    duration = frame_count / fps if fps else 0.0
+    return {
+        'frames': frame_count,
+        'fps': fps,
+        'segments': len(segments),
+        'analysed': analysed,
+        'skipped': skipped,
+        'video_seconds': round(duration, 2),
+        'wall_seconds': round(elapsed, 2),
+        'realtime_factor': round(duration / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the chart vision + advisor pipeline over a recorded video.')
+    parser.add_argument('video')
+    parser.add_argument('-o', '--output', help='JSON Lines output path (default: <video>.signals.jsonl)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sample-fps', type=float, default=None, help='analyse at most this many frames per second')
+    parser.add_argument('--no-skip', action='store_true', help='analyse frames even if unchanged')
+    parser.add_argument('--change-threshold', type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.video)[0] + '.signals.jsonl'
+    summary = ingest_video(args.video, output, workers=args.workers, sample_fps=args.sample_fps,
+                           skip_unchanged=not args.no_skip, change_threshold=args.change_threshold)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,117 +1,208 @@
 import cv2
 import numpy as np
 
-# Vision pipeline simple implementation (prototype)
-# - Finds the largest contour in the screenshot and returns its center as a POI
-# - Later replacements will include candle parsing, liquidity, BOS/CHoCH, etc.
+from . import trendlines
 
 
-def detect_chart_features(frame):
-    """Run a basic OpenCV analysis on BGR frame and return detected features.
+# Vision pipeline extended prototype
+# - Extracts a rough "price series" by finding strong edge/contrast rows per x-column
+# - Computes simple indicators: short/long SMA, linear regression slope (trend)
+# - Detects trendlines/channels with a Hough transform on the same edge map
+# - Returns features useful for the prototype trading advisor
 
-    Returns a dict with keys: 'poi' (x,y) or None, 'candles' list, 'zones' list
-    """
-    h, w = frame.shape[:2]
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    edges = cv2.Canny(blur, 50, 150)
+# Bump whenever the output of `detect_chart_features` changes for the same input,
+# so cached results computed by an older algorithm are invalidated.
+VISION_VERSION = 3
+
+# Columns sampled per price-series point; series index i maps to screen x = i * SERIES_STEP
+SERIES_STEP = 2
 
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    if not contours:
-        return {'poi': (w // 2, h // 2), 'candles': [], 'zones': []}
+# Optional detectors; the price series and indicators are always computed
+DETECTORS = ('trendlines',)
 
-    import cv2
-    import numpy as np
+# Analysis quality levels used under load, cheapest last:
+# (pyramid level, optional detectors). Pyramid level p analyses the frame at 1/2**p
+# of its size; results are mapped back to full-frame screen coordinates.
+# Pyramid level 2 is not offered: one-pixel chart lines fade below the edge
+# thresholds at a quarter of the resolution.
+QUALITY_LEVELS = (
+    (0, DETECTORS),
+    (1, DETECTORS),
+    (1, ()),
+)
 
 
-    # Vision pipeline extended prototype
-    # - Extracts a rough "price series" by finding strong edge/contrast rows per x-column
-    # - Computes simple indicators: short/long SMA, linear regression slope (trend)
-    # - Returns features useful for the prototype trading advisor
+def _edge_maps(frames, blur=True):
+    """Return Canny edge maps (N, H, W) for a stack of BGR frames (N, H, W, 3).
 
+    `blur=False` skips the smoothing pass for frames that are already low-passed
+    (pyramid levels), where another blur would wash thin lines out.
+    """
+    n, h, w = frames.shape[:3]
+    # Colour conversion is per-pixel, so the whole stack converts in one call
+    gray = cv2.cvtColor(frames.reshape(n * h, w, 3), cv2.COLOR_BGR2GRAY).reshape(n, h, w)
+    edges = np.empty_like(gray)
+    for i in range(n):
+        # Enhance edges (neighbourhood ops must not bleed across frame boundaries)
+        smooth = cv2.GaussianBlur(gray[i], (5, 5), 0) if blur else gray[i]
+        edges[i] = cv2.Canny(smooth, 50, 150)
+    return edges
+
+
+def _extract_price_series(edges, downsample=1):
+    """For each sampled x-column, return the y of the strongest edge response.
+
+    Works on a single edge map (H, W) or a stack (N, H, W); ties resolve to the
+    topmost row.
+    """
+    return np.argmax(edges[..., ::downsample], axis=-2)
+
+
+def _sma(series, period):
+    """Simple moving averages along the last axis (aligned to index period-1)."""
+    if series.shape[-1] < period:
+        return np.empty(series.shape[:-1] + (0,))
+    cum = np.cumsum(series, axis=-1, dtype=np.float64)
+    cum = np.concatenate([np.zeros(series.shape[:-1] + (1,)), cum], axis=-1)
+    return (cum[..., period:] - cum[..., :-period]) / period
+
+
+def _linear_slope(series):
+    # Compute slope of each series along the last axis using linear regression (y ~ ax + b)
+    n = series.shape[-1]
+    if n < 2:
+        return np.zeros(series.shape[:-1])
+    x = np.arange(n)
+    y = series.astype(np.float64)
+    x_mean = x.mean()
+    y_mean = y.mean(axis=-1, keepdims=True)
+    num = ((x - x_mean) * (y - y_mean)).sum(axis=-1)
+    den = ((x - x_mean) ** 2).sum()
+    if den == 0:
+        return np.zeros(series.shape[:-1])
+    return num / den
+
+
+def _pyramid_down(frames, levels):
+    """Halve a frame stack's resolution `levels` times (Gaussian pyramid)."""
+    for _ in range(levels):
+        frames = np.stack([cv2.pyrDown(frame) for frame in frames])
+    return frames
+
+
+def _rescale(features, scale):
+    """Map features computed on a downscaled frame back to full-frame coordinates.
+
+    The series is `scale` times shorter, so each sample covers `scale` times as
+    many screen columns. Slope (screen y per series sample) needs no rescaling:
+    y and the sample spacing grow by the same factor.
+    """
+    features['poi'] = (features['poi'][0] * scale, features['poi'][1] * scale)
+    features['price_series'] = [y * scale for y in features['price_series']]
+    features['sma_short'] = [y * scale for y in features['sma_short']]
+    features['sma_long'] = [y * scale for y in features['sma_long']]
+    features['series_step'] *= scale
+    for line in features['trendlines']:
+        for key in ('x1', 'y1', 'x2', 'y2'):
+            line[key] *= scale
+        line['score'] = round(line['score'] * scale, 1)
+    if features['channel']:
+        features['channel']['width'] = round(features['channel']['width'] * scale, 1)
+    return features
+
+
+def detect_chart_features_batch(frames, pyramid=0, detectors=DETECTORS):
+    """Analyze a stack of same-sized BGR frames (N, H, W, 3) in one vectorized pass.
+
+    Returns a list with one features dict per frame, identical to what
+    `detect_chart_features` returns for that frame on its own.
+
+    `pyramid` and `detectors` trade accuracy for speed under load (see
+    `QUALITY_LEVELS`); detectors left out report empty results.
+    """
+    frames = np.asarray(frames)
+    scale = 2 ** pyramid
+    if pyramid:
+        frames = _pyramid_down(frames, pyramid)
+    n, h, w = frames.shape[:3]
+    edges = _edge_maps(frames, blur=not pyramid)
+    series = _extract_price_series(edges, downsample=SERIES_STEP)
+    length = series.shape[-1]
+    if not length:
+        return [_rescale({'poi': (w // 2, h // 2), 'price_series': [], 'sma_short': [], 'sma_long': [], 'slope': 0.0,
+                          'series_step': SERIES_STEP, 'trendlines': [], 'channel': None}, scale) for _ in range(n)]
+
+    # Normalize series length
+    # Map series x index to screen x
+    last_x = (length - 1) * SERIES_STEP
+
+    # Simple SMAs on the series (use period in samples)
+    sma_short = _sma(series, max(3, int(length * 0.03)))
+    sma_long = _sma(series, max(8, int(length * 0.10)))
+
+    # Regress over the same screen width at every pyramid level
+    slope = _linear_slope(series[:, -min(length, max(2, 60 // scale)):])
+
+    results = []
+    for i in range(n):
+        trend = trendlines.detect_trendlines(edges[i]) if 'trendlines' in detectors else {'trendlines': [], 'channel': None}
+        results.append({
+            'poi': (int(last_x), int(series[i, -1])),
+            'price_series': series[i].tolist(),
+            'sma_short': sma_short[i].tolist(),
+            'sma_long': sma_long[i].tolist(),
+            'slope': float(slope[i]),
+            'series_step': SERIES_STEP,
+            'trendlines': trend['trendlines'],
+            'channel': trend['channel'],
+        })
+    if scale > 1:
+        results = [_rescale(features, scale) for features in results]
+    return results
+
+
+def detect_chart_features(frame, pyramid=0, detectors=DETECTORS):
+    """Analyze frame and return prototype features.
+
+    Returned dict keys:
+      - 'poi': (x,y) last visible price location
+      - 'price_series': list of y positions (int)
+      - 'sma_short': list of SMA values (aligned to series index period-1)
+      - 'sma_long': list of SMA values
+      - 'slope': linear slope of the recent series
+      - 'series_step': screen x distance between consecutive series samples
+      - 'trendlines': fitted trendlines (see `trendlines.cluster_trendlines`)
+      - 'channel': strongest parallel trendline pair or None
+    """
+    return detect_chart_features_batch(frame[np.newaxis], pyramid, detectors)[0]
 
-    def _extract_price_series(frame, downsample=1):
+
+class FrameChangeDetector:
+    """Cheap check for whether a frame differs visibly from the last accepted one.
+
+    Frames are reduced to a small grayscale thumbnail and compared by mean absolute
+    difference (in gray levels) against the last frame that was reported as changed.
+    """
+
+    def __init__(self, threshold=1.5, thumb_width=64):
+        self.threshold = threshold
+        self.thumb_width = thumb_width
+        self._last = None
+
+    def _thumbnail(self, frame):
         h, w = frame.shape[:2]
+        thumb_h = max(1, round(h * self.thumb_width / w))
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        # Enhance edges
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blur, 50, 150)
-
-        series = []
-        # For each x, find the y with the strongest edge response (sum over small vertical window)
-        for x in range(0, w, downsample):
-            column = edges[:, x]
-            # smooth column to avoid noise
-            col_blur = cv2.GaussianBlur(column.reshape(-1, 1), (7, 1), 0).flatten()
-            # take index of maximum response
-            idx = int(np.argmax(col_blur))
-            series.append(idx)
-
-        return series
-
-
-    def _sma(series, period):
-        if len(series) < period:
-            return []
-        res = []
-        cum = 0.0
-        for i, v in enumerate(series):
-            cum += v
-            if i >= period:
-                cum -= series[i - period]
-            if i >= period - 1:
-                res.append(cum / period)
-        return res
-
-
-    def _linear_slope(series):
-        # Compute slope of series using linear regression (y ~ ax + b)
-        n = len(series)
-        if n < 2:
-            return 0.0
-        x = np.arange(n)
-        y = np.array(series)
-        x_mean = x.mean()
-        y_mean = y.mean()
-        num = ((x - x_mean) * (y - y_mean)).sum()
-        den = ((x - x_mean) ** 2).sum()
-        if den == 0:
-            return 0.0
-        a = num / den
-        return float(a)
-
-
-    def detect_chart_features(frame):
-        """Analyze frame and return prototype features.
-
-        Returned dict keys:
-          - 'poi': (x,y) last visible price location
-          - 'price_series': list of y positions (int)
-          - 'sma_short': list of SMA values (aligned to series index period-1)
-          - 'sma_long': list of SMA values
-          - 'slope': linear slope of the recent series
-        """
-        h, w = frame.shape[:2]
-        series = _extract_price_series(frame, downsample=2)
-        if not series:
-            return {'poi': (w // 2, h // 2), 'price_series': [], 'sma_short': [], 'sma_long': [], 'slope': 0.0}
-
-        # Normalize series length
-        # Map series x index to screen x
-        last_x = (len(series) - 1) * 2
-        last_y = series[-1]
-
-        # Simple SMAs on the series (use period in samples)
-        sma_short = _sma(series, max(3, int(len(series) * 0.03)))
-        sma_long = _sma(series, max(8, int(len(series) * 0.10)))
-
-        slope = _linear_slope(series[-min(len(series), 60):])
-
-        features = {
-            'poi': (int(last_x), int(last_y)),
-            'price_series': series,
-            'sma_short': sma_short,
-            'sma_long': sma_long,
-            'slope': slope,
-        }
-        return features
+        return cv2.resize(gray, (self.thumb_width, thumb_h), interpolation=cv2.INTER_AREA)
+
+    def changed(self, frame):
+        """Return True (and remember the frame) if it differs from the last accepted one."""
+        thumb = self._thumbnail(frame)
+        if self._last is not None and self._last.shape == thumb.shape:
+            if float(cv2.absdiff(thumb, self._last).mean()) < self.threshold:
+                return False
+        self._last = thumb
+        return True
+
+    def reset(self):
+        self._last = None
@@ -0,0 +1,216 @@
+"""Micro-batching and tier-aware scheduling of chart frames from many sessions.
+
+Sessions `await batcher.submit(frame, quality, session_id=..., tier=...)`. Frames
+wait in the batcher (not in the worker pool's FIFO), at most `max_inflight` batches
+run at a time, and whenever a worker is free the next batch is chosen by weighted
+fair queuing across sessions:
+
+  - every frame gets a virtual finish tag `start + 1 / weight`, where `start` is the
+    later of the scheduler's virtual time and the session's previous finish tag, and
+    the weight comes from the session's subscription tier (`TIER_WEIGHTS`)
+  - the frame with the smallest tag leads the next batch, which is filled with other
+    waiting frames of the same shape and quality level in tag order
+
+A batch is started once its lead frame has waited `max_wait_ms` or `max_batch`
+frames of its group are waiting. When more than `max_pending` frames are waiting,
+the lowest-tier, oldest frame is shed (its caller gets `LoadShed`), so free-tier
+frames go first under overload. Per-tier queueing + processing latency is reported
+as p50/p99 in `stats()`.
+
+Tunables (environment):
+  - VISION_BATCH_WINDOW_MS: how long the first frame of a batch may wait (default 5)
+  - VISION_BATCH_MAX_FRAMES: flush as soon as this many frames share a group (default 16)
+  - VISION_WORKERS: threads in the vision worker pool (default: CPU count)
+  - VISION_MAX_PENDING: frames allowed to wait before shedding (default 256)
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import vision
+
+VISION_BATCH_WINDOW_MS = float(os.getenv('VISION_BATCH_WINDOW_MS', '5'))
+VISION_BATCH_MAX_FRAMES = int(os.getenv('VISION_BATCH_MAX_FRAMES', '16'))
+VISION_WORKERS = int(os.getenv('VISION_WORKERS', str(os.cpu_count() or 2)))
+VISION_MAX_PENDING = int(os.getenv('VISION_MAX_PENDING', '256'))
+
+# Share of vision capacity per session by subscription tier
+TIER_WEIGHTS = {'free': 1.0, 'pro': 4.0, 'master': 8.0}
+
+# Latency samples kept per tier for the percentiles in stats()
+_LATENCY_SAMPLES = 1024
+
+# OpenCV and NumPy release the GIL for the heavy work, so threads are enough.
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=VISION_WORKERS, thread_name_prefix='vision')
+    return _executor
+
+
+class LoadShed(Exception):
+    """The frame was dropped because the vision pool is overloaded."""
+
+
+class _Job:
+    __slots__ = ('frame', 'future', 'group', 'tier', 'weight', 'finish', 'seq', 'enqueued')
+
+    def __init__(self, frame, future, group, tier, weight, finish, seq, enqueued):
+        self.frame = frame
+        self.future = future
+        self.group = group
+        self.tier = tier
+        self.weight = weight
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = enqueued
+
+
+class VisionBatcher:
+    """Schedules frames from many sessions onto the vision engine in batches."""
+
+    def __init__(self, max_batch: int = VISION_BATCH_MAX_FRAMES, max_wait_ms: float = VISION_BATCH_WINDOW_MS,
+                 executor: Optional[ThreadPoolExecutor] = None, max_inflight: Optional[int] = None,
+                 max_pending: int = VISION_MAX_PENDING):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor or get_executor()
+        self.max_inflight = max(1, max_inflight or VISION_WORKERS)
+        self.max_pending = max(1, max_pending)
+        self.loop = asyncio.get_running_loop()
+        self._jobs: List[_Job] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Any, float] = {}
+        self._inflight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._latency: Dict[str, deque] = {}
+        self.batches = 0
+        self.frames = 0
+        self.shed: Dict[str, int] = {}
+        self.busy_seconds = 0.0
+
+    async def submit(self, frame: np.ndarray, quality: int = 0, session_id: Any = None, tier: str = 'free') -> Dict:
+        """Queue `frame` and wait for its features.
+
+        `quality` indexes `vision.QUALITY_LEVELS` (0 is full quality). Frames of the
+        same `session_id` share one fair-queuing flow weighted by `tier`. Raises
+        `LoadShed` if the frame is dropped under overload.
+        """
+        weight = TIER_WEIGHTS.get(tier, 1.0)
+        flow = session_id if session_id is not None else object()
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        if session_id is not None:
+            self._last_finish[session_id] = finish
+        job = _Job(frame, self.loop.create_future(), frame.shape + (quality,), tier, weight, finish,
+                   next(self._seq), time.perf_counter())
+        self._jobs.append(job)
+        if len(self._jobs) > self.max_pending:
+            self._shed_one()
+        self._pump()
+        return await job.future
+
+    def queue_depth(self) -> int:
+        """Frames waiting for a worker."""
+        return len(self._jobs)
+
+    def forget(self, session_id: Any):
+        """Drop a closed session's fair-queuing state."""
+        self._last_finish.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        latency = {}
+        for tier, samples in self._latency.items():
+            ms = np.fromiter(samples, dtype=np.float64) * 1000.0
+            latency[tier] = {
+                'count': len(ms),
+                'p50_ms': round(float(np.percentile(ms, 50)), 2),
+                'p99_ms': round(float(np.percentile(ms, 99)), 2),
+            }
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'avg_batch_size': round(self.frames / self.batches, 2) if self.batches else 0.0,
+            'pending': len(self._jobs),
+            'inflight': self._inflight,
+            'shed': dict(self.shed),
+            'latency_by_tier': latency,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'max_batch': self.max_batch,
+            'window_ms': self.max_wait * 1000.0,
+        }
+
+    def _shed_one(self):
+        # Lowest tier first, then the oldest frame of that tier
+        victim = min(self._jobs, key=lambda j: (j.weight, j.seq))
+        self._jobs.remove(victim)
+        self.shed[victim.tier] = self.shed.get(victim.tier, 0) + 1
+        if not victim.future.done():
+            victim.future.set_exception(LoadShed())
+
+    def _pump(self):
+        """Start batches while workers are free and a batch is due."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._jobs and self._inflight < self.max_inflight:
+            self._jobs.sort(key=lambda j: (j.finish, j.seq))
+            lead = self._jobs[0]
+            batch = [j for j in self._jobs if j.group == lead.group][:self.max_batch]
+            waited = time.perf_counter() - lead.enqueued
+            if len(batch) < self.max_batch and waited < self.max_wait:
+                self._timer = self.loop.call_later(self.max_wait - waited, self._pump)
+                return
+            taken = set(id(j) for j in batch)
+            self._jobs = [j for j in self._jobs if id(j) not in taken]
+            self._virtual_time = max(self._virtual_time, lead.finish - 1.0 / lead.weight)
+            self._inflight += 1
+            self.loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[_Job]):
+        frames = np.stack([job.frame for job in batch])
+        pyramid, detectors = vision.QUALITY_LEVELS[batch[0].group[-1]]
+        started = time.perf_counter()
+        try:
+            results = await self.loop.run_in_executor(self.executor, vision.detect_chart_features_batch,
+                                                      frames, pyramid, detectors)
+        except Exception as e:
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self._inflight -= 1
+            self._pump()
+        self.batches += 1
+        self.frames += len(batch)
+        done = time.perf_counter()
+        for job, features in zip(batch, results):
+            samples = self._latency.get(job.tier)
+            if samples is None:
+                samples = self._latency[job.tier] = deque(maxlen=_LATENCY_SAMPLES)
+            samples.append(done - job.enqueued)
+            if not job.future.done():
+                job.future.set_result(features)
+
+
+_batcher: Optional[VisionBatcher] = None
+
+
+def get_batcher() -> VisionBatcher:
+    """Return the process-wide batcher bound to the running event loop."""
+    global _batcher
+    if _batcher is None or _batcher.loop is not asyncio.get_running_loop():
+        _batcher = VisionBatcher()
+    return _batcher
@@ -0,0 +1,234 @@
+"""Content-addressed cache of vision results shared across sessions.
+
+Frames are keyed by a fast hash of a small thumbnail plus the original frame
+dimensions, so identical chart layouts (the same user reconnecting, or many users
+watching the same popular chart) reuse the features computed for the first one.
+
+The cache is process-wide, LRU ordered and bounded both by entry count and by the
+approximate serialized size of the stored values. An optional on-disk tier
+(`VISION_CACHE_DIR`) keeps results across restarts; it is namespaced by the vision
+algorithm version so results from an older algorithm are never served.
+
+Cached values are shared between sessions and must be treated as read-only.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    xxhash = None
+    HAS_XXHASH = False
+
+VISION_CACHE_MAX_ENTRIES = int(os.getenv('VISION_CACHE_MAX_ENTRIES', '2048'))
+VISION_CACHE_MAX_BYTES = int(os.getenv('VISION_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+VISION_CACHE_THUMB_WIDTH = int(os.getenv('VISION_CACHE_THUMB_WIDTH', '160'))
+VISION_CACHE_DIR = os.getenv('VISION_CACHE_DIR') or None
+
+
+def frame_digest(frame: np.ndarray, thumb_width: int = VISION_CACHE_THUMB_WIDTH) -> str:
+    """Return a hex digest identifying the content of a decoded frame.
+
+    The frame is downscaled to `thumb_width` pixels wide (area interpolation, so
+    every source pixel contributes) and hashed together with its original shape.
+    """
+    h, w = frame.shape[:2]
+    if w > thumb_width:
+        thumb_h = max(1, round(h * thumb_width / w))
+        thumb = cv2.resize(frame, (thumb_width, thumb_h), interpolation=cv2.INTER_AREA)
+    else:
+        thumb = frame
+    thumb = np.ascontiguousarray(thumb)
+
+    hasher = xxhash.xxh3_128() if HAS_XXHASH else hashlib.blake2b(digest_size=16)
+    hasher.update(repr(frame.shape).encode('ascii'))
+    hasher.update(memoryview(thumb).cast('B'))
+    return hasher.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    """Exact content digest of raw bytes (e.g. an encoded frame)."""
+    if HAS_XXHASH:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ContentCache:
+    """Thread-safe LRU cache keyed by content digest with an optional disk tier."""
+
+    def __init__(self, max_entries: int = VISION_CACHE_MAX_ENTRIES, max_bytes: int = VISION_CACHE_MAX_BYTES,
+                 disk_dir: Optional[str] = None, version: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.version = version
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        blob = self._disk_read(key)
+        if blob is not None:
+            try:
+                value = pickle.loads(blob)
+            except Exception:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, len(blob))
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any):
+        """Store `value` under `key` in memory (and on disk when enabled)."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store(key, value, len(blob))
+        self._disk_write(key, blob)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, version: Optional[int] = None):
+        """Drop every cached result, e.g. because the vision algorithm changed.
+
+        When `version` is given it becomes the new cache version; on-disk entries
+        written under any other version are removed.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if version is not None:
+                self.version = version
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            current = f"v{self.version}"
+            for name in os.listdir(self.disk_dir):
+                if name != current:
+                    shutil.rmtree(os.path.join(self.disk_dir, name), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'disk_tier': bool(self.disk_dir),
+            }
+
+    # Internal helpers; callers of _store must hold the lock.
+
+    def _store(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"v{self.version}", key[:2], f"{key}.pkl")
+
+    def _disk_read(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _disk_write(self, key: str, blob: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(blob)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Vision cache disk write failed: {e}")
+
+
+_shared_cache: Optional[ContentCache] = None
+
+
+def get_shared_cache() -> ContentCache:
+    """Return the process-wide cache, creating it from the environment on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ContentCache(disk_dir=VISION_CACHE_DIR)
+    return _shared_cache
+
+
+def get_features(frame: np.ndarray, compute: Callable[[np.ndarray], Dict], version: int, variant: str = '') -> Dict:
+    """Return features for `frame`, computing them with `compute` on a cache miss.
+
+    `version` is the vision algorithm version; a change invalidates the cache.
+    `variant` distinguishes results computed differently for the same frame (e.g.
+    a reduced analysis quality level) so they never stand in for each other.
+    """
+    cache = get_shared_cache()
+    if cache.version != version:
+        cache.invalidate(version)
+    key = frame_digest(frame) + variant
+    return cache.get_or_compute(key, lambda: compute(frame))
+
+
+async def get_features_async(frame: np.ndarray, compute: Callable[[np.ndarray], Awaitable[Dict]], version: int,
+                             variant: str = '') -> Dict:
+    """Like `get_features`, but `compute` is a coroutine function (e.g. the batcher)."""
+    cache = get_shared_cache()
+    if cache.version != version:
+        cache.invalidate(version)
+    key = frame_digest(frame) + variant
+    features = cache.get(key)
+    if features is None:
+        features = await compute(frame)
+        if features is not None:
+            cache.put(key, features)
+    return features
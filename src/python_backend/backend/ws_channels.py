@@ -0,0 +1,132 @@
+"""Channel multiplexing on the `/ws` connection.
+
+Messages that carry a `"ch"` field belong to a channel; messages without one are
+chart messages, so existing clients keep working unchanged. Every channel has:
+  - an inbound mailbox drained by its own worker task, so slow work on one channel
+    (analysing a large chart frame) never holds up another (an audio chunk)
+  - a flow-control policy: `latest_only` channels keep just the newest pending
+    message (a newer video frame makes the waiting one stale), other channels
+    queue up to `mailbox` messages and reject the rest
+  - an outbound priority lane in the connection's `OutboundQueue`
+
+Channels:
+  - chart:  chart frames, overlays (priority 2, latest frame wins)
+  - webcam: webcam frames and their analysis (priority 2, latest frame wins)
+  - audio:  audio chunks for transcription and TTS audio back (priority 0)
+  - prices: price subscriptions and ticks (priority 0)
+  - mentor: streamed mentor replies (priority 1)
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+
+class ChannelSpec(NamedTuple):
+    priority: int
+    mailbox: int
+    latest_only: bool
+
+
+CHANNELS: Dict[str, ChannelSpec] = {
+    'chart': ChannelSpec(priority=2, mailbox=1, latest_only=True),
+    'webcam': ChannelSpec(priority=2, mailbox=1, latest_only=True),
+    'audio': ChannelSpec(priority=0, mailbox=64, latest_only=False),
+    'prices': ChannelSpec(priority=0, mailbox=16, latest_only=False),
+    'mentor': ChannelSpec(priority=1, mailbox=4, latest_only=False),
+}
+
+_stats: Dict[str, Dict[str, int]] = {name: {'received': 0, 'dropped': 0, 'rejected': 0} for name in CHANNELS}
+
+
+class Mailbox:
+    """Inbound messages for one channel, bounded according to its spec."""
+
+    def __init__(self, spec: ChannelSpec):
+        self.spec = spec
+        self._items: deque = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, msg: Dict[str, Any]) -> Optional[str]:
+        """Queue `msg`; return 'dropped' if it replaced a stale message, 'rejected' if full."""
+        outcome = None
+        if len(self._items) >= self.spec.mailbox:
+            if not self.spec.latest_only:
+                return 'rejected'
+            self._items.popleft()
+            outcome = 'dropped'
+        self._items.append(msg)
+        self._ready.set()
+        return outcome
+
+    async def get(self) -> Dict[str, Any]:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ChannelRouter:
+    """Routes one connection's inbound messages to per-channel worker tasks.
+
+    Workers and background tasks (`spawn`) are started lazily. If any of them fails,
+    `failed` completes with the exception so the connection can be torn down.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler]):
+        self.handlers = handlers
+        self.loop = asyncio.get_running_loop()
+        self.failed: asyncio.Future = self.loop.create_future()
+        self._mailboxes: Dict[str, Mailbox] = {}
+        self._tasks: set = set()
+
+    def dispatch(self, channel: str, msg: Dict[str, Any]) -> Optional[str]:
+        """Hand `msg` to `channel`'s worker; returns the mailbox outcome (see `Mailbox.put`)."""
+        mailbox = self._mailboxes.get(channel)
+        if mailbox is None:
+            mailbox = self._mailboxes[channel] = Mailbox(CHANNELS[channel])
+            self.spawn(self._worker(channel, mailbox))
+        outcome = mailbox.put(msg)
+        stats = _stats[channel]
+        stats['received'] += 1
+        if outcome:
+            stats[outcome] += 1
+        return outcome
+
+    def pending(self, channel: str) -> int:
+        """Messages waiting in `channel`'s mailbox."""
+        mailbox = self._mailboxes.get(channel)
+        return len(mailbox) if mailbox is not None else 0
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a background coroutine for this connection; cancelled by `close`."""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _worker(self, channel: str, mailbox: Mailbox):
+        handler = self.handlers[channel]
+        while True:
+            await handler(await mailbox.get())
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None and not self.failed.done():
+            self.failed.set_exception(exc)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {name: dict(counts) for name, counts in _stats.items()}
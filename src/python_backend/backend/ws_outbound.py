@@ -0,0 +1,141 @@
+"""Bounded outbound message queue and writer task for WebSocket connections.
+
+Each `/ws` connection runs a reader (receive, analyse, enqueue) and a writer task
+(`run_writer`) that drains an `OutboundQueue`, so a client on a slow network only
+delays its own sends and never the frame ingestion loop.
+
+Messages are queued in priority lanes (0 is most urgent) and may carry a
+coalescing key. A keyed message that is still waiting in the queue is stale once a
+newer one with the same key arrives: the newer one takes its place instead of
+growing the queue. When a lane is full and the new message cannot be coalesced, the
+client is not keeping up and `put` returns False; the connection is then closed as
+a slow consumer.
+
+Tunables (environment):
+  - WS_OUTBOUND_QUEUE: maximum queued messages per lane and connection (default 64)
+"""
+import asyncio
+import itertools
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+WS_OUTBOUND_QUEUE = int(os.getenv('WS_OUTBOUND_QUEUE', '64'))
+
+# Lane for messages that do not ask for one (chart overlays and replies)
+DEFAULT_PRIORITY = 2
+
+# Close code sent to clients dropped for not reading fast enough
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+_stats = {
+    'slow_consumer_disconnects': 0,
+    'coalesced': 0,
+    'sent': 0,
+}
+
+
+class OutboundQueue:
+    """Priority lanes of outgoing messages with per-key coalescing and a size bound.
+
+    Lane 0 is the most urgent. The writer always sends from the most urgent
+    non-empty lane, so a backlog of large chart messages never delays a price
+    tick or an audio chunk. Each lane is bounded on its own.
+    """
+
+    def __init__(self, maxsize: int = WS_OUTBOUND_QUEUE):
+        self.maxsize = max(1, maxsize)
+        self._lanes: Dict[int, "OrderedDict[Hashable, Dict[str, Any]]"] = {}
+        self._key_lane: Dict[Hashable, int] = {}
+        self._seq = itertools.count()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self.closed = False
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def depth(self, priority: int = DEFAULT_PRIORITY) -> int:
+        """Messages waiting in one priority lane."""
+        return len(self._lanes.get(priority, ()))
+
+    def pending(self, key: Hashable) -> bool:
+        """True if a message with this coalescing key is still waiting to be sent."""
+        return key in self._key_lane
+
+    def put(self, msg: Dict[str, Any], key: Optional[Hashable] = None, priority: int = DEFAULT_PRIORITY) -> bool:
+        """Enqueue `msg`; return False if its lane is full (slow consumer).
+
+        A keyed message replaces a queued message with the same key in place, so it
+        keeps the older message's position and never grows the queue.
+        """
+        if self.closed:
+            return True
+        if key is not None and key in self._key_lane:
+            self._lanes[self._key_lane[key]][key] = msg
+            _stats['coalesced'] += 1
+            return True
+        lane = self._lanes.get(priority)
+        if lane is None:
+            lane = self._lanes[priority] = OrderedDict()
+        if len(lane) >= self.maxsize:
+            return False
+        if key is None:
+            key = ('_seq', next(self._seq))
+        else:
+            self._key_lane[key] = priority
+        lane[key] = msg
+        self._ready.set()
+        return True
+
+    async def put_wait(self, msg: Dict[str, Any], priority: int = DEFAULT_PRIORITY):
+        """Enqueue `msg`, waiting for room in its lane instead of failing.
+
+        For bulk streams (audio, mentor text) whose producer can simply slow down.
+        """
+        while not self.put(msg, priority=priority):
+            self._space.clear()
+            await self._space.wait()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Wait for the most urgent queued message; None once the queue is closed."""
+        while True:
+            for priority in sorted(self._lanes):
+                lane = self._lanes[priority]
+                if lane:
+                    key, msg = lane.popitem(last=False)
+                    self._key_lane.pop(key, None)
+                    self._space.set()
+                    return msg
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+
+    def close(self):
+        """Stop the writer after it has no more messages to send."""
+        self.closed = True
+        self._ready.set()
+        self._space.set()
+
+
+async def run_writer(ws, queue: OutboundQueue):
+    """Send queued messages until the queue is closed or the socket fails."""
+    try:
+        while True:
+            msg = await queue.get()
+            if msg is None:
+                return
+            await ws.send_json(msg)
+            _stats['sent'] += 1
+    except Exception:
+        # The reader sees the disconnect on its next receive
+        queue.close()
+
+
+def record_slow_consumer():
+    _stats['slow_consumer_disconnects'] += 1
+
+
+def stats() -> Dict[str, Any]:
+    return {**_stats, 'max_queue': WS_OUTBOUND_QUEUE}
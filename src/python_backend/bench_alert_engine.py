@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Alerts evaluated per second by the vectorized condition engine.
+
+Loads a mix of pct_move, range_breakout, cross_above_ma and volume_spike alerts
+spread over a few symbols, then feeds random-walk ticks (with bars closing along
+the way so moving averages are live) and reports per-tick latency and alert
+evaluations per second. Compare with a plain Python loop over the same alerts.
+
+Usage: python bench_alert_engine.py [--alerts 1000000] [--symbols 4] [--ticks 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.alert_engine import AlertEngine
+
+
+def make_alerts(count, symbols, rng):
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        kind = i % 4
+        if kind == 0:
+            params = {'percent': rng.choice((-1, 1)) * rng.uniform(5, 50), 'reference_price': 100.0}
+            condition = 'pct_move'
+        elif kind == 1:
+            low = rng.uniform(40, 90)
+            params = {'low': low, 'high': low + rng.uniform(30, 100)}
+            condition = 'range_breakout'
+        elif kind == 2:
+            params = {'period': rng.choice((5, 20, 50))}
+            condition = 'cross_above_ma'
+        else:
+            params = {'multiplier': rng.uniform(3, 10), 'period': 20}
+            condition = 'volume_spike'
+        yield {'id': str(i), 'symbol': symbol, 'condition': condition, 'price': None, 'params': params}
+
+
+def python_loop(alerts, price):
+    """The per-alert dict evaluation the engine replaces (pct_move and range only)."""
+    hits = 0
+    for alert in alerts:
+        p = alert['params']
+        if alert['condition'] == 'range_breakout':
+            hits += price < p['low'] or price > p['high']
+        elif alert['condition'] == 'pct_move':
+            move = (price - p['reference_price']) / p['reference_price'] * 100.0
+            hits += move >= p['percent'] if p['percent'] > 0 else move <= p['percent']
+    return hits
+
+
+def main(args):
+    rng = random.Random(1)
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    alerts = list(make_alerts(args.alerts, symbols, rng))
+    engine = AlertEngine(bar_seconds=1.0)
+    started = time.perf_counter()
+    engine.add_many(alerts)
+    print(f"loaded {args.alerts} alerts on {args.symbols} symbols in {time.perf_counter() - started:.2f}s")
+
+    prices = {s: 100.0 for s in symbols}
+    latencies, triggered = [], 0
+    started = time.perf_counter()
+    for n in range(args.ticks):
+        symbol = symbols[n % len(symbols)]
+        prices[symbol] *= 1.0 + rng.gauss(0, 0.002)
+        tick_started = time.perf_counter()
+        triggered += len(engine.tick(symbol, prices[symbol], volume=rng.expovariate(1.0), now=n * 0.05))
+        latencies.append(time.perf_counter() - tick_started)
+    elapsed = time.perf_counter() - started
+    lat = np.array(latencies) * 1000.0
+    print(f"engine: {engine.evaluated / elapsed / 1e6:.1f}M alert evaluations/s, "
+          f"tick p50 {np.percentile(lat, 50):.2f} ms p99 {np.percentile(lat, 99):.2f} ms, {triggered} triggered")
+
+    sample = [a for a in alerts if a['symbol'] == symbols[0]]
+    started = time.perf_counter()
+    python_loop(sample, 100.0)
+    elapsed = time.perf_counter() - started
+    print(f"python loop: {len(sample) / elapsed / 1e6:.1f}M alert evaluations/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Alert evaluation throughput against the number of shard worker processes.
+
+Loads the same alerts (pct_move and range_breakout, spread over many symbols) into
+1, 2, 4, ... shards, sends every symbol the same stream of ticks and reports alert
+evaluations per second across all workers. Throughput grows with the shard count
+only as far as the machine has free cores.
+
+Usage: python bench_alert_shards.py [--alerts 1000000] [--symbols 64] [--rounds 40] [--shards 1,2,4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.alert_shards import AlertShards
+
+
+def make_alerts(count, symbols, rng):
+    alerts = []
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        if i % 2:
+            low = rng.uniform(10, 90)
+            params = {'low': low, 'high': low + rng.uniform(100, 200)}
+            condition = 'range_breakout'
+        else:
+            params = {'percent': rng.choice((-1, 1)) * rng.uniform(60, 90), 'reference_price': 100.0}
+            condition = 'pct_move'
+        alerts.append({'id': str(i), 'user_id': 'bench', 'symbol': symbol, 'condition': condition,
+                       'price': None, 'params': params, 'notification_type': 'app'})
+    return alerts
+
+
+async def measure(shards, alerts, symbols, rounds, rng):
+    async def on_triggers(triggered):
+        pass
+
+    pool = AlertShards(shards, on_triggers, lambda: alerts, feed=False)
+    await pool.start()
+    try:
+        await pool.flush()
+        before = sum(w['evaluated'] for w in (await pool.stats())['workers'])
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for symbol in symbols:
+                pool.tick(symbol, 100.0 + rng.uniform(-5, 5))
+        await pool.flush()
+        elapsed = time.perf_counter() - started
+        after = sum(w['evaluated'] for w in (await pool.stats())['workers'])
+    finally:
+        await pool.stop()
+    return (after - before) / elapsed
+
+
+def main(args):
+    rng = random.Random(1)
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    alerts = make_alerts(args.alerts, symbols, rng)
+    print(f"{args.alerts} alerts on {args.symbols} symbols, {args.rounds} ticks per symbol, "
+          f"{os.cpu_count()} CPUs")
+    baseline = None
+    for shards in (int(n) for n in args.shards.split(',')):
+        rate = asyncio.run(measure(shards, alerts, symbols, args.rounds, rng))
+        baseline = baseline or rate
+        print(f"{shards} shard(s): {rate / 1e6:.1f}M alert evaluations/s ({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=64)
+    parser.add_argument('--rounds', type=int, default=40)
+    parser.add_argument('--shards', default='1,2,4')
+    main(parser.parse_args())
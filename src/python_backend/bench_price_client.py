@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Requests/sec and latency of price fetches: a session per call vs the shared client.
+
+Starts the local price stand-in (price_standin.py) and fetches prices from many
+concurrent callers, first the old way (a new aiohttp.ClientSession per call), then
+through `price_alerts.get_binance_price` on the shared pooled client.
+
+Usage: python bench_price_client.py [--callers 50] [--requests 20] [--delay-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import price_standin
+from backend import price_alerts, provider_client
+
+SYMBOLS = ('BTC', 'ETH', 'SOL', 'BNB', 'XRP', 'ADA', 'DOGE', 'AVAX')
+
+
+async def run_callers(callers, per_caller, fetch):
+    latencies = []
+
+    async def caller(idx):
+        for n in range(per_caller):
+            started = time.perf_counter()
+            price = await fetch(SYMBOLS[(idx + n) % len(SYMBOLS)])
+            if price is None:
+                raise RuntimeError('price fetch failed')
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller(i) for i in range(callers)))
+    elapsed = time.perf_counter() - started
+    lat = np.array(latencies) * 1000.0
+    return len(latencies) / elapsed, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+async def main(args):
+    runner, base_url = await price_standin.start(delay_ms=args.delay_ms)
+    provider_client.BINANCE_API_URL = base_url
+
+    async def session_per_call(symbol):
+        # What get_binance_price did before the shared client
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/api/v3/ticker/price", params={'symbol': f"{symbol}USDT"},
+                                   timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                return float((await resp.json())['price'])
+
+    print(f"{args.callers} callers x {args.requests} requests against {base_url} (+{args.delay_ms} ms)")
+    print(f"{'mode':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        for label, fetch in (('session per call', session_per_call), ('shared client', price_alerts.get_binance_price)):
+            rps, p50, p99 = await run_callers(args.callers, args.requests, fetch)
+            print(f"{label:<22}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}")
+    finally:
+        await provider_client.close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--delay-ms', type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
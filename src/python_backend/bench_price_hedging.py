@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Latency of price lookups from a provider with a slow tail: plain vs hedged.
+
+Starts two price stand-ins (price_standin.py): a primary where a fraction of
+requests is slow, and a healthy mirror. Fetches prices from many concurrent
+callers, first from the primary alone, then through the hedged fetcher racing
+the mirror when the primary is slower than its usual p95.
+
+Usage: python bench_price_hedging.py [--callers 20] [--requests 50] [--slow-ratio 0.05] [--slow-ms 1000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import price_standin
+from backend import price_providers, provider_client
+
+SYMBOLS = ('BTC', 'ETH', 'SOL', 'BNB', 'XRP', 'ADA', 'DOGE', 'AVAX')
+
+
+async def run_callers(callers, per_caller, fetch):
+    latencies = []
+
+    async def caller(idx):
+        for n in range(per_caller):
+            started = time.perf_counter()
+            prices = await fetch([SYMBOLS[(idx + n) % len(SYMBOLS)]])
+            if not prices:
+                raise RuntimeError('price fetch failed')
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(caller(i) for i in range(callers)))
+    lat = np.array(latencies) * 1000.0
+    return np.percentile(lat, 50), np.percentile(lat, 99), lat.max()
+
+
+async def main(args):
+    primary, primary_url = await price_standin.start(delay_ms=args.delay_ms, slow_ratio=args.slow_ratio,
+                                                     slow_ms=args.slow_ms)
+    mirror, mirror_url = await price_standin.start(delay_ms=args.delay_ms)
+    provider_client.BINANCE_API_URL = primary_url
+    price_providers.BINANCE_MIRROR_URL = mirror_url
+    plain = price_providers.HedgedFetcher(price_providers.default_providers()[:1])
+    hedged = price_providers.HedgedFetcher(price_providers.default_providers())
+
+    print(f"{args.callers} callers x {args.requests} requests; "
+          f"{args.slow_ratio:.0%} of primary requests +{args.slow_ms:.0f} ms")
+    print(f"{'mode':<16}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    try:
+        for label, fetcher in (('primary only', plain), ('hedged', hedged)):
+            p50, p99, worst = await run_callers(args.callers, args.requests, fetcher.fetch)
+            print(f"{label:<16}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}")
+        print(f"hedges sent: {hedged.hedges} of {hedged.fetches} fetches")
+    finally:
+        await provider_client.close()
+        await primary.cleanup()
+        await mirror.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--delay-ms', type=float, default=2.0)
+    parser.add_argument('--slow-ratio', type=float, default=0.05)
+    parser.add_argument('--slow-ms', type=float, default=1000.0)
+    asyncio.run(main(parser.parse_args()))
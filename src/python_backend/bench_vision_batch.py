@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Throughput vs latency benchmark for the vision micro-batcher.
+
+Simulates many sessions each sending same-sized chart regions and compares
+per-frame `detect_chart_features` calls on the worker pool with micro-batched
+calls at several window/size settings.
+
+Usage: python bench_vision_batch.py [--sessions 200] [--frames 5] [--width 480] [--height 270]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend import vision
+from backend.vision_batch import VisionBatcher, get_executor
+
+
+def make_frames(count, width, height):
+    rng = np.random.default_rng(7)
+    frames = []
+    xs = np.arange(width)
+    for i in range(count):
+        img = np.full((height, width, 3), 18, dtype=np.uint8)
+        walk = np.cumsum(rng.normal(0, 2, width)) + height / 2 + i
+        ys = np.clip(walk, 0, height - 1).astype(int)
+        img[ys, xs] = (80, 220, 80)
+        frames.append(img)
+    return frames
+
+
+async def run_sessions(frames, sessions, per_session, analyse):
+    latencies = []
+
+    async def session(idx):
+        for n in range(per_session):
+            frame = frames[(idx + n) % len(frames)]
+            started = time.perf_counter()
+            await analyse(frame)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    lat = np.array(latencies) * 1000.0
+    return len(latencies) / elapsed, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+async def main(args):
+    frames = make_frames(32, args.width, args.height)
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    async def unbatched(frame):
+        return await loop.run_in_executor(executor, vision.detect_chart_features, frame)
+
+    print(f"{args.sessions} sessions x {args.frames} frames, {args.width}x{args.height}")
+    print(f"{'mode':<28}{'frames/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    fps, p50, p99 = await run_sessions(frames, args.sessions, args.frames, unbatched)
+    print(f"{'per-frame':<28}{fps:>10.0f}{p50:>10.1f}{p99:>10.1f}")
+
+    for window_ms, max_batch in ((1, 8), (5, 16), (10, 32), (20, 64)):
+        batcher = VisionBatcher(max_batch=max_batch, max_wait_ms=window_ms, executor=executor)
+        fps, p50, p99 = await run_sessions(frames, args.sessions, args.frames, batcher.submit)
+        label = f"batched {window_ms}ms / {max_batch}"
+        print(f"{label:<28}{fps:>10.0f}{p50:>10.1f}{p99:>10.1f}  avg batch {batcher.stats()['avg_batch_size']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--frames', type=int, default=5)
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--height', type=int, default=270)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""Local stand-in for the Binance price API, for benchmarks and offline development.
+
+Serves GET /api/v3/ticker/price?symbol=BTCUSDT (and the bulk form
+?symbols=["BTCUSDT","ETHUSDT"]) with a random-walk price per symbol, optionally
+after an artificial delay and with a slow tail (a fraction `slow_ratio` of ticker
+requests takes `slow_ms` longer); /api/v3/exchangeInfo listing `LISTED`. REST
+responses carry Binance's X-MBX-USED-WEIGHT-1M header; with a `weight_limit`, weight
+past the limit within a `weight_window` is answered with 429. And a market
+stream at /ws that accepts Binance-style
+{"method": "SUBSCRIBE" | "UNSUBSCRIBE", "params": ["btcusdt@miniTicker"], "id": n}
+and pushes an event per subscribed stream every `tick_ms`. Point the backend at it
+with BINANCE_API_URL=http://127.0.0.1:<port> and
+PRICE_FEED_URL=ws://127.0.0.1:<port>/ws.
+
+Usage: python price_standin.py [--port 8900] [--delay-ms 0] [--tick-ms 100]
+                               [--slow-ratio 0] [--slow-ms 0] [--weight-limit 0]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class PriceWalk:
+    """Random-walk prices per symbol, seeded so runs are repeatable."""
+
+    def __init__(self, seed=7):
+        self.rng = random.Random(seed)
+        self.prices = {}
+        self.requests = 0
+        # Request weight in the current window, and requests answered with 429
+        self.used_weight = 0
+        self.window_start = time.monotonic()
+        self.throttled = 0
+        # Open market streams and how many have ever connected
+        self.streams = set()
+        self.stream_connections = 0
+
+    def next(self, symbol):
+        price = self.prices.get(symbol) or 100.0 + self.rng.random() * 1000.0
+        price = max(0.01, price * (1.0 + self.rng.gauss(0, 0.001)))
+        self.prices[symbol] = price
+        return price
+
+
+WALK = web.AppKey('walk', PriceWalk)
+
+# Base assets listed in /api/v3/exchangeInfo (tickers are served for any symbol)
+LISTED = ('BTC', 'ETH', 'SOL', 'BNB', 'XRP', 'ADA', 'DOGE', 'AVAX')
+
+
+async def drop_streams(app):
+    """Close every open market stream, as an exchange does on maintenance."""
+    for ws in list(app[WALK].streams):
+        await ws.close()
+
+
+def _event(stream, price):
+    symbol = stream.split('@')[0].upper()
+    now_ms = int(time.time() * 1000)
+    if stream.endswith(('@trade', '@aggTrade')):
+        return {'e': stream.split('@')[1], 'E': now_ms, 's': symbol, 'p': f"{price:.8f}"}
+    return {'e': '24hrMiniTicker', 'E': now_ms, 's': symbol, 'c': f"{price:.8f}"}
+
+
+def make_app(delay_ms=0.0, tick_ms=100.0, slow_ratio=0.0, slow_ms=0.0, weight_limit=0, weight_window=60.0):
+    walk = PriceWalk()
+    tail = random.Random(11)
+
+    def charge(weight):
+        """Count a request's weight; returns (headers, 429 response or None)."""
+        now = time.monotonic()
+        if now - walk.window_start >= weight_window:
+            walk.window_start = now
+            walk.used_weight = 0
+        walk.used_weight += weight
+        headers = {'X-MBX-USED-WEIGHT-1M': str(walk.used_weight)}
+        if weight_limit and walk.used_weight > weight_limit:
+            walk.throttled += 1
+            retry_after = max(1, int(walk.window_start + weight_window - now + 1))
+            return headers, web.json_response({'code': -1003, 'msg': 'Too much request weight used'}, status=429,
+                                              headers={**headers, 'Retry-After': str(retry_after)})
+        return headers, None
+
+    async def ticker_price(request):
+        delay = delay_ms + (slow_ms if tail.random() < slow_ratio else 0.0)
+        if delay:
+            await asyncio.sleep(delay / 1000.0)
+        walk.requests += 1
+        symbols = request.query.get('symbols')
+        headers, throttled = charge(4 if symbols else 2)
+        if throttled is not None:
+            return throttled
+        if symbols:
+            # Bulk form: symbols=["BTCUSDT","ETHUSDT"]
+            try:
+                names = json.loads(symbols)
+            except ValueError:
+                return web.json_response({'code': -1100, 'msg': 'invalid symbols'}, status=400, headers=headers)
+            return web.json_response([{'symbol': s, 'price': f"{walk.next(s):.8f}"} for s in names], headers=headers)
+        symbol = request.query.get('symbol')
+        if not symbol:
+            return web.json_response({'code': -1102, 'msg': 'symbol required'}, status=400, headers=headers)
+        return web.json_response({'symbol': symbol, 'price': f"{walk.next(symbol):.8f}"}, headers=headers)
+
+    async def market_stream(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        walk.streams.add(ws)
+        walk.stream_connections += 1
+        subscribed = set()
+
+        async def push():
+            while True:
+                await asyncio.sleep(tick_ms / 1000.0)
+                for stream in sorted(subscribed):
+                    await ws.send_json(_event(stream, walk.next(stream.split('@')[0].upper())))
+
+        pusher = asyncio.create_task(push())
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                req = json.loads(msg.data)
+                method, params = req.get('method'), req.get('params') or []
+                if method == 'SUBSCRIBE':
+                    subscribed.update(params)
+                    await ws.send_json({'result': None, 'id': req.get('id')})
+                elif method == 'UNSUBSCRIBE':
+                    subscribed.difference_update(params)
+                    await ws.send_json({'result': None, 'id': req.get('id')})
+                elif method == 'LIST_SUBSCRIPTIONS':
+                    await ws.send_json({'result': sorted(subscribed), 'id': req.get('id')})
+        finally:
+            pusher.cancel()
+            walk.streams.discard(ws)
+        return ws
+
+    async def exchange_info(request):
+        walk.requests += 1
+        headers, throttled = charge(20)
+        if throttled is not None:
+            return throttled
+        return web.json_response({'symbols': [
+            {'symbol': f"{base}USDT", 'baseAsset': base, 'quoteAsset': 'USDT', 'status': 'TRADING'}
+            for base in LISTED
+        ]}, headers=headers)
+
+    app = web.Application()
+    app[WALK] = walk
+    app.router.add_get('/api/v3/ticker/price', ticker_price)
+    app.router.add_get('/api/v3/exchangeInfo', exchange_info)
+    app.router.add_get('/ws', market_stream)
+    return app
+
+
+async def start(port=0, delay_ms=0.0, host='127.0.0.1', tick_ms=100.0, slow_ratio=0.0, slow_ms=0.0,
+                weight_limit=0, weight_window=60.0):
+    """Start the stand-in in the running loop; returns (runner, base_url)."""
+    runner = web.AppRunner(make_app(delay_ms, tick_ms, slow_ratio, slow_ms, weight_limit, weight_window))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--delay-ms', type=float, default=0.0)
+    parser.add_argument('--tick-ms', type=float, default=100.0)
+    parser.add_argument('--slow-ratio', type=float, default=0.0)
+    parser.add_argument('--slow-ms', type=float, default=0.0)
+    parser.add_argument('--weight-limit', type=int, default=0)
+    args = parser.parse_args()
+    web.run_app(make_app(args.delay_ms, args.tick_ms, args.slow_ratio, args.slow_ms, args.weight_limit),
+                host='127.0.0.1', port=args.port)
@@ -9,8 +9,12 @@ async def send_image(path, uri='ws://127.0.0.1:8000/ws'):
     b64 = base64.b64encode(b).decode('ascii')
     async with websockets.connect(uri) as ws:
         await ws.send(json.dumps({'type':'frame','data':b64}))
-        resp = await ws.recv()
-        print('Response:', resp)
+        # Print everything sent for this frame (session id, overlays) up to the heartbeat
+        while True:
+            resp = await ws.recv()
+            print('Response:', resp)
+            if json.loads(resp).get('message') == 'processed_frame':
+                break
 
 if __name__ == '__main__':
     import sys